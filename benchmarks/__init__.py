@@ -0,0 +1,7 @@
+"""
+Performance benchmarks for lenatu. Not part of the installed package.
+
+Run from the root of the repository::
+
+    python -m benchmarks --help
+"""
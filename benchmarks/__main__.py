@@ -0,0 +1,164 @@
+"""
+Times the phases of lenatu on several workloads and compares them against
+a saved baseline.
+
+Usage::
+
+    python -m benchmarks [workload ...] [--save FILE] [--compare FILE]
+"""
+import argparse
+import ast
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+import lenatu
+from lenatu import tools
+
+from benchmarks import workloads
+
+
+#: npath queries timed on every tree.
+QUERIES = (".**{FunctionDef}", ".**{Name}")
+
+PHASES = ("parse", "blocks", "scopes", "npath")
+
+
+def _npath_all(node, path):
+    try:
+        return tools.npath(node, path)
+    except ValueError:
+        return None # no match
+
+
+def run_once(sources):
+    """
+    Runs all phases once. Returns phase -> seconds.
+    """
+    times = {}
+    
+    start = time.perf_counter()
+    trees = [ast.parse(source) for _, source in sources]
+    times["parse"] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for tree in trees:
+        lenatu.augment_blocks(tree)
+    times["blocks"] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for tree in trees:
+        lenatu.augment_scopes(tree.defined_block)
+    times["scopes"] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for tree in trees:
+        for query in QUERIES:
+            _npath_all(tree, query)
+    times["npath"] = time.perf_counter() - start
+    return times
+
+
+def peak_memory(sources):
+    """
+    Returns the peak of memory allocated while parsing and augmenting.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        trees = [ast.parse(source) for _, source in sources]
+        for tree in trees:
+            lenatu.augment(tree)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(sources, repeat):
+    """
+    Returns the results for one workload: node count, the best time of each
+    phase, nodes per second, and peak memory.
+    """
+    nodes = sum(sum(1 for _ in ast.walk(ast.parse(source))) for _, source in sources)
+    best = {}
+    for _ in range(repeat):
+        gc.collect()
+        for phase, seconds in run_once(sources).items():
+            best[phase] = min(seconds, best.get(phase, seconds))
+    return {
+        "files": len(sources),
+        "nodes": nodes,
+        "seconds": best,
+        "nodes_per_second": dict((p, nodes / s if s else None) for p, s in best.items()),
+        "peak_memory": peak_memory(sources),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns (workload, phase, baseline seconds, seconds) for all phases
+    that got slower by more than `threshold` (a fraction).
+    """
+    slower = []
+    for workload, result in sorted(results.items()):
+        base = baseline.get(workload)
+        if base is None:
+            continue
+        for phase in PHASES:
+            old, new = base["seconds"].get(phase), result["seconds"].get(phase)
+            if old and new and new > old * (1 + threshold):
+                slower.append((workload, phase, old, new))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("workloads", nargs="*", metavar="workload",
+                        help="one of %s (default: all)" % ", ".join(sorted(workloads.WORKLOADS)))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per workload, the best is reported")
+    parser.add_argument("--max-files", type=int, default=None, help="limit the files of the stdlib workload")
+    parser.add_argument("--save", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare against results saved earlier")
+    parser.add_argument("--threshold", type=float, default=0.1, 
+                        help="fraction a phase may be slower than the baseline (default: 0.1)")
+    args = parser.parse_args(argv)
+    for name in args.workloads:
+        if name not in workloads.WORKLOADS:
+            parser.error("unknown workload %r" % name)
+    
+    results = {}
+    print("%-12s %6s %9s %-7s %9s %12s %10s" % ("workload", "files", "nodes", "phase", "seconds", "nodes/s", "peak MiB"))
+    for name in args.workloads or sorted(workloads.WORKLOADS):
+        if name == "stdlib":
+            sources = workloads.stdlib(args.max_files)
+        else:
+            sources = workloads.WORKLOADS[name]()
+        result = results[name] = measure(sources, args.repeat)
+        for i, phase in enumerate(PHASES):
+            print("%-12s %6s %9s %-7s %9.4f %12.0f %10s" % (
+                name if i == 0 else "", 
+                result["files"] if i == 0 else "",
+                result["nodes"] if i == 0 else "",
+                phase, result["seconds"][phase], result["nodes_per_second"][phase] or 0,
+                "%.1f" % (result["peak_memory"] / 2.0**20) if i == 0 else ""))
+        
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        slower = compare(results, baseline, args.threshold)
+        for workload, phase, old, new in slower:
+            print("SLOWER %s/%s: %.4f s -> %.4f s (%+.0f%%)" % (workload, phase, old, new, 100 * (new / old - 1)))
+        if slower:
+            return 1
+        print("No phase is more than %.0f%% slower than the baseline." % (100 * args.threshold))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Time of the def-use chains, compared to the augmentation they build on.
+
+Computes the chains of every block in the standard library, then of one
+generated function of growing size to show how the time scales with the
+length of a function.
+
+Usage::
+
+    python -m benchmarks.bench_dataflow [max-files]
+"""
+import ast
+import sys
+import timeit
+
+import lenatu
+
+from benchmarks import workloads
+
+
+def function(statements, variables=50):
+    """
+    A single function with loops and branches, assigning and reading a
+    fixed set of variables over and over. Each use is reached by a few
+    definitions only, so the number of chains grows linearly.
+    """
+    lines = ["def f(%s):" % ", ".join("v%i" % v for v in range(variables))]
+    for i in range(0, statements, 4):
+        a, b = "v%i" % (i % variables), "v%i" % ((i * 7 + 3) % variables)
+        lines.append("    for i%i in range(%s):" % (i, a))
+        lines.append("        if i%i > %s:" % (i, b))
+        lines.append("            %s = %s + i%i" % (b, a, i))
+        lines.append("        %s += %s" % (a, b))
+        lines.append("    %s, %s = %s, %s" % (a, b, b, a))
+    lines.append("    return %s" % " + ".join("v%i" % v for v in range(variables)))
+    return "\n".join(lines) + "\n"
+
+
+def blocks(tree):
+    stack = [tree.defined_block]
+    while stack:
+        block = stack.pop()
+        stack.extend(block._children)
+        yield block
+
+
+def main(argv):
+    max_files = int(argv[1]) if len(argv) > 1 else None
+    trees = [ast.parse(source) for _, source in workloads.stdlib(max_files)]
+    
+    def augment():
+        for tree in trees:
+            lenatu.augment(tree)
+    
+    def chains():
+        for tree in trees:
+            for block in blocks(tree):
+                lenatu.def_use(block)
+    
+    print("%i files" % len(trees))
+    for name, run in (("augment", augment), ("def-use", chains)):
+        seconds = min(timeit.repeat(run, number=1, repeat=3))
+        print("%-10s %8.3f s" % (name, seconds))
+    
+    print()
+    print("%10s %10s %10s %14s" % ("statements", "events", "seconds", "us per event"))
+    for statements in (1000, 2000, 4000, 8000, 16000):
+        tree = ast.parse(function(statements))
+        lenatu.augment(tree)
+        block = tree.body[0].defined_block
+        events = sum(len(bb.events) for bb in lenatu.control_flow_graph(block).basic_blocks)
+        seconds = min(timeit.repeat(lambda: lenatu.def_use(block), number=1, repeat=3))
+        print("%10i %10i %10.3f %14.2f" % (statements, events, seconds, seconds / events * 1e6))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,56 @@
+"""
+Scaling of the parallel scope resolution of a single, huge module.
+
+Resolves the scopes of a generated module (the `wide` workload with nested
+functions) with 1 to N workers, with a thread pool and a process pool.
+Threads only scale on free-threaded builds of CPython.
+
+Usage::
+
+    python -m benchmarks.bench_parallel_scopes [max-workers] [functions]
+"""
+import ast
+import os
+import sys
+import timeit
+
+import lenatu
+
+
+def source(functions):
+    """
+    A module with many top-level functions, each with a nested function.
+    """
+    return "".join("def f%i(a, b=%i):\n"
+                   "    c = a + b\n"
+                   "    def g(d):\n"
+                   "        return c + d + a\n"
+                   "    return g(c)\n" % (i, i) for i in range(functions))
+
+
+def main(argv):
+    max_workers = int(argv[1]) if len(argv) > 1 else (os.cpu_count() or 1)
+    functions = int(argv[2]) if len(argv) > 2 else 20000
+
+    tree = ast.parse(source(functions))
+    lenatu.augment_blocks(tree)
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print("%i functions, %i CPUs, GIL %s" % (functions, os.cpu_count() or 1,
+                                              "enabled" if gil else "disabled"))
+
+    def run(workers, processes):
+        return min(timeit.repeat(lambda: lenatu.augment_scopes(tree.defined_block, workers=workers,
+                                                               processes=processes),
+                                 number=1, repeat=3))
+
+    serial = run(None, False)
+    print("%-10s %3s %8.3f s" % ("serial", 1, serial))
+    for processes in (False, True):
+        for workers in range(2, max_workers + 1):
+            seconds = run(workers, processes)
+            print("%-10s %3i %8.3f s  %5.2fx" % ("processes" if processes else "threads",
+                                                 workers, seconds, serial / seconds))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
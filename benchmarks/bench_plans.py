@@ -0,0 +1,76 @@
+"""
+Micro-benchmark for the per-type field plans of the block pass.
+
+Compares `lenatu._block._visit`, which does one plan lookup per node, with
+a reference traversal that looks up `CHILD_BLOCK` for every field returned
+by `ast.iter_fields` (the way the block pass worked before the plans).
+Both are run over the Python files of the standard library.
+
+Usage::
+
+    python -m benchmarks.bench_plans [max-files]
+"""
+import ast
+import sys
+import timeit
+
+from lenatu import _block
+from lenatu._facts import CHILD_BLOCK, DEFINER, DEFINED, EXEC, MIXED, NAME_FIELDS
+
+from benchmarks import workloads
+
+
+def per_field_visit(node):
+    """
+    Block pass that looks up the kind of every field, as `_visit` did
+    before it used plans.
+    """
+    stack = [(node, None, None)]
+    while stack:
+        node, executed_in, defined_block = stack.pop()
+        if executed_in is not None:
+            node.executed_in = executed_in
+        if isinstance(node, DEFINER):
+            defined_block = _block.Block(node)
+            if executed_in is not None:
+                executed_in._children.append(defined_block)
+        if defined_block is not None:
+            node.defined_block = defined_block
+        f = NAME_FIELDS.get(type(node))
+        if f is not None:
+            for attribute, usage, which_block in f(node):
+                accessed_block = defined_block if which_block == DEFINED else executed_in
+                if accessed_block is not None:
+                    accessed_block._accesses.append((node, attribute, getattr(node, attribute), usage))
+        children = []
+        for field, value in ast.iter_fields(node):
+            kind = CHILD_BLOCK.get((type(node), field), EXEC)
+            if kind == EXEC:
+                child = (executed_in, None)
+            elif kind == DEFINED:
+                child = (defined_block, None)
+            elif kind == MIXED:
+                child = (executed_in, defined_block)
+            if isinstance(value, list):
+                for v in value:
+                    if isinstance(v, ast.AST):
+                        children.append((v,) + child)
+            elif isinstance(value, ast.AST):
+                children.append((value,) + child)
+        children.reverse()
+        stack.extend(children)
+
+
+def main(argv):
+    max_files = int(argv[1]) if len(argv) > 1 else None
+    trees = [ast.parse(source) for _, source in workloads.stdlib(max_files)]
+    nodes = sum(sum(1 for _ in ast.walk(t)) for t in trees)
+    print("%i files, %i nodes" % (len(trees), nodes))
+    
+    for name, visit in (("per-field lookup", per_field_visit), ("plans", _block._visit)):
+        seconds = min(timeit.repeat(lambda: [visit(t) for t in trees], number=1, repeat=3))
+        print("%-18s %8.3f s %8.1f ns/node" % (name, seconds, seconds * 1e9 / nodes))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,67 @@
+"""
+Cost of the position index: the time it adds to the block pass, and the 
+time of a query compared to scanning all accesses of the tree.
+
+Usage::
+
+    python -m benchmarks.bench_positions [max-files]
+"""
+import ast
+import sys
+import timeit
+
+import lenatu
+
+from benchmarks import workloads
+
+
+def scan(root, lineno, col_offset):
+    """
+    Finds the innermost access at the position without an index.
+    """
+    best = None
+    stack = [root]
+    while stack:
+        block = stack.pop()
+        stack.extend(block._children)
+        for n, attribute, value, usage in block._accesses:
+            if getattr(n, "lineno", None) != lineno or n.end_lineno != lineno:
+                continue
+            if n.col_offset <= col_offset < n.end_col_offset and (best is None or n.col_offset > best[0]):
+                best = (n.col_offset, n, attribute, value)
+    return best
+
+
+def main(argv):
+    max_files = int(argv[1]) if len(argv) > 1 else None
+    sources = [source for _, source in workloads.stdlib(max_files)]
+    
+    def blocks(positions):
+        trees = [ast.parse(source) for source in sources]
+        def run():
+            for tree in trees:
+                lenatu.augment_blocks(tree, positions=positions)
+        return run
+    
+    print("%i files" % len(sources))
+    plain = min(timeit.repeat(blocks(False), number=1, repeat=3))
+    indexed = min(timeit.repeat(blocks(True), number=1, repeat=3))
+    print("blocks %.3f s, with positions %.3f s (%+.0f%%)" % (plain, indexed, 100 * (indexed / plain - 1)))
+    
+    print()
+    print("%8s %10s %12s %12s" % ("copies", "names", "index us", "scan us"))
+    source = sorted(sources, key=len)[len(sources) // 2]
+    for copies in (1, 10, 100):
+        tree = ast.parse(source * copies)
+        lenatu.augment_blocks(tree, positions=True)
+        root = tree.defined_block
+        names = [n for n in ast.walk(tree) if isinstance(n, ast.Name)]
+        queries = [(n.lineno, n.col_offset) for n in names[::max(1, len(names) // 200)]]
+        index = timeit.timeit(lambda: [root.positions.name_at(*q) for q in queries], number=10)
+        linear = timeit.timeit(lambda: [scan(root, *q) for q in queries[:20]], number=1)
+        print("%8i %10i %12.2f %12.1f" % (copies, len(names), index / 10 / len(queries) * 1e6,
+                                          linear / min(20, len(queries)) * 1e6))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
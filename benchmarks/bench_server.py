@@ -0,0 +1,81 @@
+"""
+Round-trip time of the queries of the analysis server.
+
+Starts a server in a thread, loads files of the standard library into it,
+then times `name` and `locals` queries over one connection, and the same
+queries on the `ModuleStore` directly (without the socket and JSON).
+
+Usage::
+
+    python -m benchmarks.bench_server [max-files]
+"""
+import ast
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import lenatu
+
+
+def queries(path, limit=200):
+    """
+    Positions of names and the names of functions in the file.
+    """
+    with open(path, "rb") as f:
+        tree = ast.parse(f.read())
+    names, functions = [], []
+    for n in ast.walk(tree):
+        if isinstance(n, ast.Name) and len(names) < limit:
+            names.append((n.lineno, n.col_offset))
+        elif isinstance(n, ast.FunctionDef) and len(functions) < limit:
+            functions.append(n.name)
+    return names, functions
+
+
+def timed(calls):
+    start = time.perf_counter()
+    for call in calls:
+        call()
+    return (time.perf_counter() - start) / len(calls) * 1e6
+
+
+def main(argv):
+    max_files = int(argv[1]) if len(argv) > 1 else 50
+    root = os.path.dirname(ast.__file__)
+    paths = sorted(os.path.join(root, f) for f in os.listdir(root) if f.endswith(".py"))[:max_files]
+    directory = tempfile.mkdtemp()
+    server = lenatu.Server(os.path.join(directory, "socket"))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with lenatu.Client(os.path.join(directory, "socket")) as client:
+            start = time.perf_counter()
+            for path in paths:
+                client.request("blocks", path=path)
+            print("%i files loaded in %.3f s" % (len(paths), time.perf_counter() - start))
+            
+            names, functions = [], []
+            for path in paths:
+                n, f = queries(path)
+                names.extend((path, line, col) for line, col in n)
+                functions.extend((path, name) for name in f)
+            store = server.store
+            print("%-8s %8s %14s %14s" % ("query", "count", "socket us", "in-process us"))
+            for query, args, remote, local in (
+                    ("name", names, client.name, store.name),
+                    ("locals", functions, client.locals, store.locals)):
+                remote_us = timed([lambda a=a: remote(*a) for a in args])
+                local_us = timed([lambda a=a: local(*a) for a in args])
+                print("%-8s %8i %14.1f %14.1f" % (query, len(args), remote_us, local_us))
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,42 @@
+"""
+Compares the scope pass with and without the `symtable` backend.
+
+Both start from trees that went through the block pass. For the backend,
+the time includes compiling the symbol tables from the source.
+
+Usage::
+
+    python -m benchmarks.bench_symtable [max-files]
+"""
+import ast
+import sys
+import timeit
+
+from lenatu import _block, _scope
+
+from benchmarks import workloads
+
+
+def main(argv):
+    max_files = int(argv[1]) if len(argv) > 1 else None
+    sources = [source for _, source in workloads.stdlib(max_files)]
+    trees = [ast.parse(source) for source in sources]
+    for tree in trees:
+        _block.augment_blocks(tree)
+    print("%i files" % len(trees))
+
+    def pure():
+        for tree in trees:
+            _scope.augment_scopes(tree.defined_block)
+
+    def backend():
+        for tree, source in zip(trees, sources):
+            _scope.augment_scopes(tree.defined_block, source=source)
+
+    for name, run in (("pure", pure), ("symtable", backend)):
+        seconds = min(timeit.repeat(run, number=1, repeat=3))
+        print("%-10s %8.3f s" % (name, seconds))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,88 @@
+"""
+Source code the benchmarks run on.
+
+Each workload is a function returning a list of `(name, source)` pairs.
+"""
+import ast
+import os
+
+
+def stdlib(max_files=None):
+    """
+    The Python files of the standard library (without tests).
+    """
+    root = os.path.dirname(ast.__file__)
+    sources = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in ("site-packages", "test", "tests", "idlelib"))
+        for filename in sorted(filenames):
+            if not filename.endswith(".py"):
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path, "rb") as f:
+                source = f.read()
+            try:
+                ast.parse(source)
+            except (SyntaxError, ValueError):
+                continue
+            sources.append((os.path.relpath(path, root), source))
+            if max_files is not None and len(sources) >= max_files:
+                return sources
+    return sources
+
+
+def deep(depth=90, copies=10, parentheses=100):
+    """
+    Deeply nested functions, each with a deeply nested expression.
+    
+    The parser limits indentation to 100 levels and parentheses to 200.
+    """
+    lines = []
+    for c in range(copies):
+        for d in range(depth):
+            indent = "    " * d
+            lines.append("%sdef f%i_%i(a%i):" % (indent, c, d, d))
+            lines.append("%s    x%i = %sa%i%s" % (indent, d, "(" * parentheses, d, " + 1)" * parentheses))
+        lines.append("    " * depth + "return " + " + ".join("a%i" % d for d in range(depth)))
+    return [("deep", "\n".join(lines) + "\n")]
+
+
+def wide(functions=20000):
+    """
+    A module with many small top-level functions.
+    """
+    source = "".join("def f%i(a, b=%i):\n    c = a + b\n    return c\n" % (i, i) 
+                     for i in range(functions))
+    return [("wide", source)]
+
+
+def identifiers(names=5000, readers=200):
+    """
+    Many module-level variables, read by functions that each use all of them.
+    """
+    lines = ["v%i = %i" % (i, i) for i in range(names)]
+    for r in range(readers):
+        lines.append("def reader%i():" % r)
+        lines.append("    return [%s]" % ", ".join("v%i" % ((i * 7 + r) % names) for i in range(100)))
+    return [("identifiers", "\n".join(lines) + "\n")]
+
+
+def lambdas(count=10000):
+    """
+    Many lambdas and generator expressions.
+    """
+    lines = []
+    for i in range(count):
+        lines.append("g%i = (lambda x: (y * x for y in range(x)))(%i)" % (i, i))
+        lines.append("h%i = sum(z for z in (lambda: [1, 2, %i])())" % (i, i))
+    return [("lambdas", "\n".join(lines) + "\n")]
+
+
+#: Name -> workload function.
+WORKLOADS = {
+    "stdlib": stdlib,
+    "deep": deep,
+    "wide": wide,
+    "identifiers": identifiers,
+    "lambdas": lambdas,
+}
@@ -1,7 +1,85 @@
+__version__ = "0.1.0"
+
+import sys
+
 from lenatu._block import Block, augment_blocks
-from lenatu._scope import augment_scopes
+from lenatu._scope import augment_scopes, defer_scopes
+from lenatu._augmentation import Augmentation
+from lenatu._summary import ModuleSummary, BlockSummary, NameSummary, summarize
+from lenatu._parallel import augment_paths, augment_many
+from lenatu._cache import SummaryCache
+from lenatu._incremental import reaugment
+from lenatu._profile import Profile, profile
+from lenatu._serialize import serialize, deserialize
+from lenatu._dataflow import ControlFlowGraph, BasicBlock, DefUse, control_flow_graph, def_use
+from lenatu._callgraph import CallGraph, CallSite, ModuleCalls, module_calls
+from lenatu._resolver import Resolver, ModuleTable, Binding, module_table
+from lenatu._positions import PositionIndex
 
-def augment(node):
-    augment_blocks(node)
-    augment_scopes(node.defined_block)
+#: Names exported from modules that are slow to import (`asyncio`, sockets),
+#: mapped to their module. They are imported on first use, to keep
+#: `import lenatu` and the command line fast.
+_LAZY = {}
+if sys.version_info >= (3, 5):
+    _LAZY["augment_async"] = "lenatu._async"
+if sys.platform != "win32":
+    _LAZY.update((name, "lenatu._server") for name in ("ModuleStore", "Server", "Client"))
+    
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name not in _LAZY:
+            raise AttributeError("module %r has no attribute %r" % (__name__, name))
+        import importlib
+        value = globals()[name] = getattr(importlib.import_module(_LAZY[name]), name)
+        return value
+else:
+    if sys.version_info >= (3, 5):
+        from lenatu._async import augment_async
+    if sys.platform != "win32":
+        from lenatu._server import ModuleStore, Server, Client
+
+def augment(node, inplace=True, lazy=False, index=False, source=None, workers=None, processes=False,
+            positions=False):
+    """
+    Adds block and scope information to the tree.
+    
+    By default the information is stored as attributes of the nodes. With
+    `inplace=False` the nodes are left untouched and an `Augmentation` holding
+    the information is returned instead.
+    
+    With `lazy=True` (requires `inplace=False`) only the blocks are computed
+    up front. The scopes of a block are resolved when they are first queried
+    through the `Augmentation` or the block's `local_variables`.
+    
+    With `index=True` each block gets the `bindings`, `reads` and 
+    `declarations` of the variables bound to it. This requires all blocks 
+    to be resolved, so it cannot be combined with `lazy=True`.
+    
+    If the `source` the tree was parsed from is given, the scopes are 
+    computed with the `symtable` backend (see `augment_scopes`). It is
+    ignored with `lazy=True`.
+    
+    `workers` and `processes` resolve the scopes of the blocks in parallel,
+    as described for `augment_scopes`. This only pays off for very large 
+    modules.
     
+    With `positions=True` the top-level block gets a `PositionIndex` (as 
+    `positions`) to find the block and the name at a source position.
+    """
+    if lazy and inplace:
+        raise ValueError("Lazy scope resolution requires inplace=False")
+    if lazy and index:
+        raise ValueError("The index cannot be built lazily")
+    if inplace:
+        augment_blocks(node, positions=positions)
+        augment_scopes(node.defined_block, index=index, source=source, 
+                       workers=workers, processes=processes)
+    else:
+        augmentation = Augmentation(node)
+        augment_blocks(node, augmentation, positions)
+        if lazy:
+            defer_scopes(augmentation.block, augmentation)
+        else:
+            augment_scopes(augmentation.block, augmentation=augmentation, index=index, source=source,
+                           workers=workers, processes=processes)
+        return augmentation
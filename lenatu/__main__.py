@@ -0,0 +1,5 @@
+import sys
+
+from lenatu._cli import main
+
+sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Augmentation that does not block an `asyncio` event loop.
+
+Only imported on Python 3.5 and newer.
+"""
+import ast
+import asyncio
+from concurrent import futures
+
+from lenatu._augmentation import Augmentation
+from lenatu._block import _traverse, _walk, augment_blocks
+from lenatu._scope import _assign_scopes, _close, augment_scopes
+
+
+#: Default number of nodes visited (by the block pass) or accesses resolved
+#: (by the scope pass) between two yields to the event loop.
+SLICE_SIZE = 5000
+
+#: Returns the loop the coroutine runs in (`get_event_loop` before 3.7).
+_running_loop = getattr(asyncio, "get_running_loop", asyncio.get_event_loop)
+
+
+async def augment_async(node, inplace=True, slice_size=SLICE_SIZE, timeout=None, executor=None):
+    """
+    Coroutine doing the same as `lenatu.augment(node, inplace)`, without
+    blocking the event loop for long.
+    
+    The tree is augmented in slices of `slice_size` nodes, yielding to the
+    event loop in between. If an `executor` (a
+    `concurrent.futures.ThreadPoolExecutor`) is given, the work is handed to
+    it instead. Other executors raise `ValueError`: the tables of an 
+    `Augmentation` are keyed by the ids of the nodes, so it cannot be 
+    computed in another process.
+    
+    The information is collected in an `Augmentation` first. With
+    `inplace=True` it is written to the nodes in a final step that is not
+    interrupted. So if the coroutine is cancelled, or the `timeout` (in
+    seconds) expires (raising `asyncio.TimeoutError`), the tree is left
+    untouched: it is either completely augmented or not at all. Work handed
+    to an executor cannot be stopped, but its result is dropped.
+    """
+    if not isinstance(node, ast.mod):
+        raise ValueError("Expected top-level node (one of the ast.mod types)")
+    if executor is not None and not isinstance(executor, futures.ThreadPoolExecutor):
+        raise ValueError("augment_async requires a ThreadPoolExecutor, not %r" % executor)
+    if timeout is not None:
+        return await asyncio.wait_for(augment_async(node, inplace, slice_size, None, executor),
+                                      timeout)
+    
+    if executor is not None:
+        loop = _running_loop()
+        augmentation = await loop.run_in_executor(executor, _augment, node)
+    else:
+        augmentation = Augmentation(node)
+        stack = [(node, None, None)]
+        while stack:
+            _traverse(stack, augmentation, slice_size)
+            await asyncio.sleep(0)
+        
+        root = augmentation.block
+        stack = [(root, [])]
+        done = 0
+        while stack:
+            block, enclosing_blocks = stack.pop()
+            _assign_scopes(block, enclosing_blocks, augmentation)
+            candidate_blocks = enclosing_blocks + [block]
+            for child_block in reversed(block._children):
+                stack.append((child_block, candidate_blocks))
+            done += len(block._accesses) + 1
+            if done >= slice_size:
+                done = 0
+                await asyncio.sleep(0)
+        _close(root)
+    
+    if inplace:
+        nodes = {}
+        for i, n in enumerate(_walk(node)):
+            nodes[id(n)] = n
+            if i % slice_size == 0:
+                await asyncio.sleep(0)
+        # No more yields from here on, so the tree is never seen half-augmented.
+        augmentation._apply(nodes)
+        return None
+    return augmentation
+
+
+def _augment(node):
+    augmentation = Augmentation(node)
+    augment_blocks(node, augmentation)
+    augment_scopes(augmentation.block, augmentation=augmentation)
+    return augmentation
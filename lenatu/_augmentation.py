@@ -0,0 +1,116 @@
+from lenatu._block import _walk
+from lenatu._scope import resolve_pending
+
+
+class Augmentation(object):
+    """
+    Block and scope information of a tree, kept in tables instead of as 
+    attributes of the nodes.
+    
+    Returned by `lenatu.augment(node, inplace=False)`. The nodes of the tree are
+    left untouched, the information is available through the methods of this
+    object instead. Dropping the augmentation releases all the analysis data 
+    while the tree itself can live on (and be shared).
+    
+    The tables are keyed by `id(node)`. The augmentation holds a reference 
+    to the root node so that the ids stay valid. Modifying the tree after
+    it has been augmented invalidates the augmentation.
+    
+    .. attribute:: node
+    
+        Root node of the augmented tree (one of the `ast.mod` types).
+    """
+    
+    __slots__ = ("node", "_executed_in", "_defined_block", "_name_blocks")
+    
+    def __init__(self, node):
+        self.node = node
+        
+        #: id(node) -> block the node is executed in.
+        self._executed_in = {}
+        
+        #: id(node) -> block the node defines (or helps to define).
+        self._defined_block = {}
+        
+        #: attribute -> id(node) -> block (or list of blocks) the identifier 
+        #: stored in that attribute of the node is bound to.
+        self._name_blocks = {}
+        
+    @property
+    def block(self):
+        """
+        The block defined by the root node.
+        """
+        return self._defined_block[id(self.node)]
+        
+    def executed_in(self, node):
+        """
+        Returns the block the node is executed in, the same as the `executed_in`
+        attribute in-place augmentation would have set. `None` if the node has
+        no such block.
+        """
+        return self._executed_in.get(id(node))
+    
+    def defined_block(self, node):
+        """
+        Returns the block the node defines, the same as the `defined_block`
+        attribute in-place augmentation would have set. `None` if the node does
+        not define a block.
+        """
+        return self._defined_block.get(id(node))
+    
+    def name_block(self, node, attribute):
+        """
+        Returns the block the identifier in the given attribute of the node
+        is bound to, the same as the `<attribute>_block` attribute in-place 
+        augmentation would have set. A list of blocks if the attribute holds 
+        a list of identifiers. `None` if the attribute does not refer to a
+        variable.
+        
+        If the scopes are resolved lazily, this resolves the block the node
+        is executed in (or defines) first.
+        """
+        key = id(node)
+        blocks = self._name_blocks.get(attribute)
+        if blocks is not None and key in blocks:
+            return blocks[key]
+        
+        # Not found, maybe the block is still pending (see `defer_scopes`).
+        pending = False
+        for table in (self._executed_in, self._defined_block):
+            block = table.get(key)
+            if block is not None and block._pending is not None:
+                resolve_pending(block)
+                pending = True
+        if not pending:
+            return None
+        blocks = self._name_blocks.get(attribute)
+        if blocks is None:
+            return None
+        return blocks.get(key)
+    
+    def apply(self):
+        """
+        Sets the attributes of in-place augmentation on the nodes of the tree.
+        """
+        blocks = [self.block]
+        while blocks:
+            block = blocks.pop()
+            resolve_pending(block)
+            blocks.extend(block._children)
+            
+        self._apply(dict((id(node), node) for node in _walk(self.node)))
+        
+    def _apply(self, nodes):
+        """
+        Sets the attributes, given all nodes of the tree by their `id`. The
+        scopes must be resolved.
+        """
+        for key, block in self._executed_in.items():
+            nodes[key].executed_in = block
+        for key, block in self._defined_block.items():
+            nodes[key].defined_block = block
+        for attribute, blocks in self._name_blocks.items():
+            name = attribute + "_block"
+            for key, block in blocks.items():
+                setattr(nodes[key], name, block)
@@ -1,4 +1,7 @@
+import itertools
+
 from lenatu._facts import *  # @UnusedWildImport
+from lenatu import _profile
 
 class Block(object):
     """
@@ -15,23 +18,210 @@ class Block(object):
         
     .. attribute:: local_variables
     
-        Identifiers of variables local to this block.
+        Identifiers of variables local to this block (a `frozenset`). `None`
+        until the scopes have been augmented. If the scopes are resolved lazily
+        (see `lenatu.augment`), reading it resolves the block.
+        
+    .. attribute:: ordered_local_variables
+    
+        Same identifiers as `local_variables`, as a tuple in the order
+        in which they are first used within the block.
+        
+    .. attribute:: is_class
+    
+        `True` if the block is defined by a `ast.ClassDef`. The local variables
+        of class blocks are not visible to the blocks nested inside them.
+        
+    .. attribute:: parent
+    
+        The block in which `defined_by` is executed, `None` for the top-level
+        block.
+        
+    .. attribute:: free_variables
+    
+        Identifiers of variables used in this block, or in blocks nested 
+        inside it, that are bound to an enclosing block other than the module
+        (a `frozenset`). Includes variables that are only passed through to
+        nested blocks.
+        
+    .. attribute:: cell_variables
+    
+        Identifiers of variables local to this block that are free variables
+        of blocks nested inside it (a `frozenset`).
+        
+    .. attribute:: global_variables
+    
+        Identifiers of variables used in this block that are bound to the 
+        module block, whether declared `global` or not (a `frozenset`). 
+        Empty for the module block itself.
+        
+    .. attribute:: nonlocal_variables
+    
+        Identifiers of variables declared `nonlocal` in this block (a 
+        `frozenset`).
+        
+        These four are `None` until the scopes have been augmented. If the 
+        scopes are resolved lazily, reading `free_variables` or 
+        `cell_variables` resolves the block and all blocks nested inside it.
+        
+    .. attribute:: bindings
+    
+        Only if the scopes were augmented with `index=True`, otherwise `None`.
+        Maps the identifiers of variables bound to this block to the list of
+        nodes that assign them, including nodes in nested blocks.
+        
+    .. attribute:: reads
+    
+        Like `bindings`, for the nodes that read the variables.
+        
+    .. attribute:: declarations
+    
+        Like `bindings`, for the `ast.Global` and `ast.Nonlocal` nodes that
+        declare the variables.
+        
+    .. attribute:: positions
+    
+        Only for the top-level block, if the blocks were augmented with 
+        `positions=True`, otherwise `None`. The `PositionIndex` finding the
+        block and the name at a source position.
     """
     
-    def __init__(self, defined_by):
+    __slots__ = ("defined_by", "is_class", "parent", 
+                 "bindings", "reads", "declarations", "positions",
+                 "_local_variables", "_ordered_local_variables", 
+                 "_free_variables", "_cell_variables", "_global_variables",
+                 "_nonlocal_variables", "_own_free_variables",
+                 "_accesses", "_children", "_pending")
+    
+    def __init__(self, defined_by, parent=None):
         self.defined_by = defined_by
-        self.local_variables = None
+        self.parent = parent
+        self.is_class = isinstance(defined_by, ast.ClassDef)
+        self.bindings = None
+        self.reads = None
+        self.declarations = None
+        self.positions = None
+        self._local_variables = None
+        self._ordered_local_variables = None
+        self._free_variables = None
+        self._cell_variables = None
+        self._global_variables = None
+        self._nonlocal_variables = None
+        
+        #: Free variables used by the code executed in this block itself, the 
+        #: `free_variables` without the ones of nested blocks.
+        self._own_free_variables = None
+        
+        #: (node, attribute, identifier, usage) tuples for all accesses to
+        #: variables by code executed in this block. Collected by `augment_blocks`.
+        self._accesses = []
+        
+        #: Blocks directly defined by code executed in this block.
+        self._children = []
+        
+        #: The `Augmentation` the scopes of this block are stored in, once
+        #: they are resolved lazily. `None` if not pending.
+        self._pending = None
+        
+    def references(self, identifier):
+        """
+        Returns all nodes that refer to the variable bound to this block (requires 
+        `index=True`): the nodes in `bindings`, `reads` and `declarations`.
+        """
+        return (self.bindings.get(identifier, []) + self.reads.get(identifier, []) + 
+                self.declarations.get(identifier, []))
+        
+    @property
+    def local_variables(self):
+        if self._pending is not None:
+            from lenatu._scope import resolve_pending
+            resolve_pending(self)
+        return self._local_variables
+    
+    @property
+    def ordered_local_variables(self):
+        if self._pending is not None:
+            from lenatu._scope import resolve_pending
+            resolve_pending(self)
+        return self._ordered_local_variables
+    
+    @property
+    def free_variables(self):
+        if self._free_variables is None:
+            from lenatu._scope import resolve_closures
+            resolve_closures(self)
+        return self._free_variables
+    
+    @property
+    def cell_variables(self):
+        if self._cell_variables is None:
+            from lenatu._scope import resolve_closures
+            resolve_closures(self)
+        return self._cell_variables
+    
+    @property
+    def global_variables(self):
+        if self._pending is not None:
+            from lenatu._scope import resolve_pending
+            resolve_pending(self)
+        return self._global_variables
+    
+    @property
+    def nonlocal_variables(self):
+        if self._pending is not None:
+            from lenatu._scope import resolve_pending
+            resolve_pending(self)
+        return self._nonlocal_variables
 
         
     def __repr__(self):
         return "Block(%r)" % self.defined_by
 
 
-def _visit(node, executed_in=None, defined_block=None):
+def _compile_plan(node_type):
+    """
+    Returns the plan `_visit` follows for nodes of the given type.
+    
+    A plan is a `(is_definer, name_fields, fields)` tuple. `name_fields` is the
+    entry of `NAME_FIELDS` for that type (or `None`) and `fields` is a tuple
+    of `(field, kind)` pairs, one for each field that may hold child nodes,
+    with `kind` being one of EXEC, DEFINED, or MIXED.
+    """
+    fields = tuple((field, CHILD_BLOCK.get((node_type, field), EXEC))
+                   for field in node_type._fields
+                   if (node_type, field) not in LEAF_FIELDS)
+    return (issubclass(node_type, DEFINER), NAME_FIELDS.get(node_type), fields)
+
+
+def _all_node_types(node_type=ast.AST):
+    types = [node_type]
+    for subtype in node_type.__subclasses__():
+        types.extend(_all_node_types(subtype))
+    return types
+
+
+#: Maps node-type to its plan (see `_compile_plan`). Types unknown at import
+#: time are added on first use.
+_PLANS = dict((t, _compile_plan(t)) for t in _all_node_types())
+
+
+def _plan(node_type):
+    """
+    Returns the plan for the given node type.
+    """
+    plan = _PLANS.get(node_type)
+    if plan is None:
+        plan = _PLANS[node_type] = _compile_plan(node_type)
+    return plan
+
+
+def _visit(node, executed_in=None, defined_block=None, augmentation=None):
     """
     :param node: The node we visit
     :param executed_in The block this node is executed in
     :param defined_block The block this node helps to define.
+    :param augmentation If not `None`, the `Augmentation` the blocks are stored
+        in instead of setting attributes on the nodes.
     
     We differentiate between three types of AST nodes:
     
@@ -65,39 +255,199 @@ def _visit(node, executed_in=None, defined_block=None):
     if executed_in is None and not isinstance(node, ast.mod):
         raise ValueError("Expected top-level node (one of the ast.mod types)")
     
-    if executed_in is not None:
-        node.executed_in = executed_in
-        
-    if isinstance(node, DEFINER):
-        defined_block = Block(node)
-        
-    if defined_block is not None:
-        node.defined_block = defined_block
+    _traverse([(node, executed_in, defined_block)], augmentation)
+    
+    
+#: Endless iterator for `_traverse` without a limit.
+_FOREVER = itertools.repeat(None)
+
+
+def _traverse(stack, augmentation, limit=None):
+    """
+    Visits the `(node, executed_in, defined_block)` entries on the stack (last
+    one first) and all the nodes below them, as described in `_visit`.
+    
+    With a `limit`, returns after visiting that many nodes. The nodes left
+    to visit stay on the stack, so calling it again continues where it
+    stopped.
+    """
+    # Explicit stack instead of recursion, so that the depth of the tree is
+    # not limited by the interpreter's stack. Children are pushed in reverse
+    # to keep the depth-first, field order.
+    if augmentation is not None:
+        executed_table = augmentation._executed_in
+        defined_table = augmentation._defined_block
+    
+    # Counting with the loop itself is as fast as `while stack`.
+    pop = stack.pop
+    for _ in (_FOREVER if limit is None else range(limit)):
+        if not stack:
+            return
+        node, executed_in, defined_block = pop()
         
-    for field, value in ast.iter_fields(node):
-        kind = CHILD_BLOCK.get((type(node), field), EXEC)
+        is_definer, name_fields, fields = _PLANS.get(type(node)) or _plan(type(node))
         
-        if kind == EXEC:
-            _visit_helper(value, executed_in=executed_in, defined_block=None)
-        elif kind == DEFINED:
-            _visit_helper(value, executed_in=defined_block, defined_block=None)
-        elif kind == MIXED:
-            _visit_helper(value, executed_in=executed_in, defined_block=defined_block)
-        else:
-            raise ValueError("unexpected field kind %r" % kind)
+        if executed_in is not None:
+            if augmentation is None:
+                node.executed_in = executed_in
+            else:
+                executed_table[id(node)] = executed_in
+            
+        if is_definer:
+            defined_block = Block(node, executed_in)
+            if executed_in is not None:
+                executed_in._children.append(defined_block)
+            
+        if defined_block is not None:
+            if augmentation is None:
+                node.defined_block = defined_block
+            else:
+                defined_table[id(node)] = defined_block
+            
+        if name_fields is not None:
+            for attribute, usage, which_block in name_fields(node):
+                accessed_block = defined_block if which_block == DEFINED else executed_in
+                if accessed_block is not None:
+                    accessed_block._accesses.append((node, attribute, getattr(node, attribute), usage))
+            
+        children = []
+        for field, kind in fields:
+            value = getattr(node, field, None)
+            
+            if kind is EXEC:
+                child = (executed_in, None)
+            elif kind is DEFINED:
+                child = (defined_block, None)
+            else:
+                child = (executed_in, defined_block)
+            
+            if isinstance(value, list):
+                for v in value:
+                    if isinstance(v, ast.AST):
+                        children.append((v,) + child)
+            elif isinstance(value, ast.AST):
+                children.append((value,) + child)
+                
+        children.reverse()
+        stack.extend(children)
 
 
-def _visit_helper(value, executed_in=None, defined_block=None):
-    if isinstance(value, list):
-        for v in value:
-            _visit_helper(v, executed_in=executed_in, defined_block=defined_block)
+def _revisit_block(block, augmentation=None):
+    """
+    Repeats the block pass for the nodes executed in the given block, after
+    they have been modified.
     
+    `block._accesses` and `block._children` are collected again, nodes
+    executed in the block get their attributes (or `augmentation` entries) 
+    and new blocks are created for all blocks nested inside. The block itself
+    is kept, as are the nodes of the definer that are executed in the 
+    enclosing block.
+    """
+    block._accesses = []
+    block._children = []
+    
+    # Stack of (node, kind) with kind being DEFINED or MIXED. Of MIXED nodes, 
+    # only the parts that belong to `block` are visited again (for example 
+    # the parameter names in `ast.arguments`), the rest is executed in the 
+    # enclosing block and remains as it is.
+    stack = []
+    _push_fields(stack, block.defined_by)
+    while stack:
+        node, kind = stack.pop()
+        if kind is DEFINED:
+            _traverse([(node, block, None)], augmentation)
+        else:
+            name_fields = _plan(type(node))[1]
+            if name_fields is not None:
+                for attribute, usage, which_block in name_fields(node):
+                    if which_block == DEFINED:
+                        block._accesses.append((node, attribute, getattr(node, attribute), usage))
+            _push_fields(stack, node)
+            
+            
+def _push_fields(stack, node):
+    """
+    Pushes `(child, kind)` for the children of the node in DEFINED or MIXED fields,
+    such that they are popped in field order.
+    """
+    children = []
+    for field, kind in _plan(type(node))[2]:
+        if kind is not EXEC:
+            children.extend((n, kind) for n in _nodes_in(getattr(node, field, None)))
+    children.reverse()
+    stack.extend(children)
+                        
+
+def _nodes_in(value):
+    """
+    Returns the nodes in a field value as a list.
+    """
+    if isinstance(value, list):
+        return [v for v in value if isinstance(v, ast.AST)]
     elif isinstance(value, ast.AST):
-        _visit(value, executed_in=executed_in, defined_block=defined_block)
+        return [value]
+    else:
+        return []
 
 
-def augment_blocks(node):
+def augment_blocks(node, augmentation=None, positions=False):
     """
     Analyze the AST add/overwrite the attributes described in the documentation.
+    
+    If an `Augmentation` is given, the blocks are stored in it instead and
+    the nodes are left untouched.
+    
+    With `positions=True` the top-level block gets a `PositionIndex` as 
+    `positions`.
+    """
+    if not _profile.active:
+        _visit(node, augmentation=augmentation)
+    else:
+        start = _profile.timer()
+        _visit(node, augmentation=augmentation)
+        seconds = _profile.timer() - start
+        nodes, blocks = _count(node)
+        _profile.add(block_seconds=seconds, nodes_visited=nodes, blocks_created=blocks)
+        
+    if positions:
+        from lenatu._positions import PositionIndex
+        root = node.defined_block if augmentation is None else augmentation.block
+        root.positions = PositionIndex(root)
+        
+        
+def _count(node):
+    """
+    Returns the number of nodes the block pass visits in the tree and the
+    number of definers among them.
+    """
+    nodes = blocks = 0
+    for n in _walk(node):
+        nodes += 1
+        blocks += _plan(type(n))[0]
+    return nodes, blocks
+
+
+def _walk(node):
+    """
+    Yields the nodes the block pass visits in the tree, in depth-first order.
+    
+    The order only depends on the structure of the tree, so it numbers the
+    nodes of two trees parsed from the same source the same way.
     """
-    _visit(node)
+    AST = ast.AST
+    stack = [node]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        node = pop()
+        yield node
+        # Push the children in reverse, so they are popped in field order.
+        fields = (_PLANS.get(type(node)) or _plan(type(node)))[2]
+        for i in range(len(fields) - 1, -1, -1):
+            value = getattr(node, fields[i][0], None)
+            if isinstance(value, list):
+                for j in range(len(value) - 1, -1, -1):
+                    if isinstance(value[j], AST):
+                        push(value[j])
+            elif isinstance(value, AST):
+                push(value)
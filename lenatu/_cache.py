@@ -0,0 +1,219 @@
+import errno
+import hashlib
+import marshal
+import os
+import sys
+
+from lenatu import _summary
+
+
+#: Version of the format of the cache entries. Part of the key.
+_FORMAT = 2
+
+_SUFFIX = ".lenatu"
+
+#: directory -> (size of the entries as far as this process knows, bytes this
+#: process added since it last scanned the directory). Shared by all caches of 
+#: the process, so that worker processes only scan a directory once in a while.
+_sizes = {}
+
+#: Atomic rename that also replaces an existing file on Windows (Python 3.3+).
+_replace = getattr(os, "replace", os.rename)
+
+
+class SummaryCache(object):
+    """
+    Persistent cache of `ModuleSummary` results, stored in a directory.
+    
+    Entries are keyed by a hash of the source code, the Python implementation
+    and version (its grammar decides what the AST looks like) and the version
+    of lenatu. A hit skips parsing and augmenting the source entirely.
+    
+    The cache can be shared by concurrent processes: entries are written to a
+    temporary file first and then renamed into place, so readers either see a
+    complete entry or none. Unreadable entries count as misses.
+    
+    The size of the directory is bounded by `max_bytes`. Once it is exceeded
+    the least recently used entries are removed (a hit updates the modification
+    time of the entry). Each process only scans the directory again after it
+    added a sixteenth of `max_bytes`, so with several processes writing at the
+    same time the directory can exceed `max_bytes` by up to that much per
+    process until the next scan.
+    
+    .. attribute:: hits
+    
+        Number of lookups in this process that found an entry.
+        
+    .. attribute:: misses
+    
+        Number of lookups in this process that did not find an entry.
+        
+    .. attribute:: evictions
+    
+        Number of entries this process removed to stay within `max_bytes`.
+    """
+    
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        # Imported here, as they are slow to import and only needed with a cache.
+        import platform
+        from lenatu import __version__
+        
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._salt = ("%s %s %s %s\0" % (_FORMAT, platform.python_implementation(), 
+                                         "%s.%s" % sys.version_info[:2], __version__)).encode("ascii")
+    
+    def key(self, source):
+        """
+        Returns the key of the entry for the given source (`bytes`, or `str`
+        which is encoded as UTF-8).
+        """
+        if not isinstance(source, bytes):
+            source = source.encode("utf-8")
+        return hashlib.sha256(self._salt + source).hexdigest()
+    
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:] + _SUFFIX)
+    
+    def get(self, source, path=None):
+        """
+        Returns the cached `ModuleSummary` of the source (with `path` as its path),
+        or `None`.
+        """
+        entry = self._path(self.key(source))
+        try:
+            with open(entry, "rb") as f:
+                data = marshal.loads(f.read())
+            error, blocks, names = data
+            summary = _summary.ModuleSummary(path, error, 
+                                             [_summary.BlockSummary(*b) for b in blocks],
+                                             [_summary.NameSummary(*n) for n in names])
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass # evicted by another process in the meantime
+        self.hits += 1
+        return summary
+    
+    def put(self, source, summary):
+        """
+        Stores the `ModuleSummary` of the source.
+        """
+        entry = self._path(self.key(source))
+        data = marshal.dumps((summary.error,
+                              tuple(tuple(b) for b in summary.blocks),
+                              tuple(tuple(n) for n in summary.names)))
+        
+        directory = os.path.dirname(entry)
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        import tempfile
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            _replace(tmp, entry)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        
+        # Other processes add entries too, so the size is scanned again once
+        # this process added a sixteenth of `max_bytes` since the last scan.
+        size, added = _sizes.get(self.directory, (None, 0))
+        added += len(data)
+        if size is None or added > self.max_bytes // 16:
+            size, added = self._scan_size(), 0
+        else:
+            size += len(data)
+        _sizes[self.directory] = (size, added)
+        if size > self.max_bytes:
+            self.evict()
+            
+    def summarize_source(self, source, path=None):
+        """
+        Returns the `ModuleSummary` of the source, from the cache if possible.
+        """
+        summary = self.get(source, path)
+        if summary is None:
+            summary = _summary.summarize_source(source, path)
+            self.put(source, summary)
+        return summary
+    
+    def summarize_path(self, path):
+        """
+        Returns the `ModuleSummary` of the file, from the cache if possible.
+        """
+        try:
+            with open(path, "rb") as f:
+                source = f.read()
+        except (IOError, OSError) as e:
+            return _summary.ModuleSummary(path, "%s: %s" % (type(e).__name__, e), [], [])
+        return self.summarize_source(source, path)
+    
+    def _entries(self):
+        """
+        Returns `(mtime, size, path)` for all entries.
+        """
+        entries = []
+        try:
+            shards = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for shard in shards:
+            shard = os.path.join(self.directory, shard)
+            try:
+                names = os.listdir(shard)
+            except OSError:
+                continue
+            for name in names:
+                if not name.endswith(_SUFFIX):
+                    continue
+                path = os.path.join(shard, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+    
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+    
+    def evict(self):
+        """
+        Removes least recently used entries until the cache uses no more than
+        90% of `max_bytes`.
+        """
+        entries = sorted(self._entries())
+        size = sum(size for _, size, _ in entries)
+        limit = self.max_bytes * 9 // 10
+        for _, entry_size, path in entries:
+            if size <= limit:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass # removed by another process
+            size -= entry_size
+        _sizes[self.directory] = (size, 0)
+        
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        _sizes[self.directory] = (0, 0)
@@ -0,0 +1,388 @@
+"""
+Call graph of a package, built module by module from the resolved scopes.
+"""
+import ast
+import collections
+import hashlib
+import os
+
+from lenatu._augmentation import Augmentation
+from lenatu._block import augment_blocks, _walk
+from lenatu._scope import augment_scopes
+from lenatu import _facts as facts
+
+try:
+    import builtins as _builtins
+except ImportError:
+    import __builtin__ as _builtins  # @UnresolvedImport (Python 2)
+
+
+#: A call. `caller` is the qualified name of the function (or class or module)
+#: the call is executed in, `callee` the qualified name of what is called,
+#: `None` if it is not known. `kind` tells how the callee was found:
+#:
+#: * `"local"`, `"enclosing"` or `"global"`: the name is bound to a function
+#:   or class defined in the caller, an enclosing function or the module.
+#: * `"imported"`: the name is bound by an import.
+#: * `"builtin"`: the name is not bound in the module.
+#: * `"unresolved"`: the name is bound to something else, or the callee is
+#:   not a name at all (such as `f()()`).
+CallSite = collections.namedtuple("CallSite", "caller callee kind lineno col_offset")
+
+#: The calls of one module. Only holds plain data, like `ModuleSummary`.
+#:
+#: `definitions` are the qualified names of the functions and classes defined
+#: in the module, `imports` maps the names the module binds by imports at its
+#: top-level to the qualified names they refer to, and `calls` is a list of
+#: `CallSite`.
+ModuleCalls = collections.namedtuple("ModuleCalls", "module definitions imports calls")
+
+
+def module_calls(node, module, is_package=False, augmentation=None):
+    """
+    Returns the `ModuleCalls` of an augmented module.
+    
+    :param module: Name of the module (such as `"package.module"`). It
+        prefixes the qualified names, and relative imports are resolved
+        against it.
+    
+    :param is_package: `True` if the module is the `__init__` of a package.
+    
+    :param augmentation: The `Augmentation` if the tree was augmented with
+        `inplace=False`.
+    """
+    if augmentation is None:
+        executed_in = lambda n: getattr(n, "executed_in", None)
+        name_block = lambda n, attribute: getattr(n, attribute + "_block")
+        root = node.defined_block
+    else:
+        executed_in = augmentation.executed_in
+        name_block = augmentation.name_block
+        root = augmentation.block
+    
+    package = module if is_package else module.rpartition(".")[0]
+    
+    calls = []
+    import_froms = {}
+    for n in _walk(node):
+        if isinstance(n, ast.Call):
+            calls.append(n)
+        elif isinstance(n, ast.ImportFrom):
+            for a in n.names:
+                import_froms[id(a)] = n
+    
+    # Qualified names of the blocks, as in `__qualname__`.
+    qualnames = {id(root): module}
+    prefixes = {id(root): module + "."}
+    definer_qualnames = {}
+    blocks = []
+    stack = [root]
+    while stack:
+        block = stack.pop()
+        blocks.append(block)
+        for child in block._children:
+            definer = child.defined_by
+            name = getattr(definer, "name", None) or _ANONYMOUS.get(type(definer), "<block>")
+            qualnames[id(child)] = definer_qualnames[id(definer)] = prefixes[id(block)] + name
+            if child.is_class:
+                prefixes[id(child)] = qualnames[id(child)] + "."
+            else:
+                prefixes[id(child)] = qualnames[id(child)] + ".<locals>."
+        stack.extend(reversed(block._children))
+    
+    # block -> identifier -> (kind, target) of the nodes binding it. The
+    # target is the qualified name, `None` for other assignments.
+    bindings = collections.defaultdict(lambda: collections.defaultdict(list))
+    for block in blocks:
+        for n, attribute, value, usage in block._accesses:
+            if usage != facts.ASSIGNED or isinstance(value, list):
+                continue
+            scope = name_block(n, attribute)
+            if isinstance(n, ast.alias):
+                target, value = _import_target(n, import_froms.get(id(n)), package)
+                bindings[id(scope)][value].append(("imported", target))
+            else:
+                bindings[id(scope)][value].append((None, definer_qualnames.get(id(n))))
+    
+    module_bindings = bindings.get(id(root), {})
+    definitions = tuple(qualnames[id(b)] for b in blocks[1:]
+                        if isinstance(b.defined_by, (ast.ClassDef,) + _FUNCTIONS))
+    imports = dict((identifier, targets[0][1]) for identifier, targets in module_bindings.items()
+                   if all(kind == "imported" for kind, _ in targets) and len(targets) == 1)
+    
+    sites = []
+    for call in calls:
+        caller = executed_in(call)
+        attributes = []
+        func = call.func
+        while isinstance(func, ast.Attribute):
+            attributes.append(func.attr)
+            func = func.value
+        targets = []
+        if isinstance(func, ast.Name):
+            scope = name_block(func, "id")
+            found = bindings.get(id(scope), {}).get(func.id)
+            if found is None:
+                if scope is root and hasattr(_builtins, func.id):
+                    targets.append(("builtin", "builtins." + func.id))
+            else:
+                if scope is caller:
+                    kind = "local"
+                elif scope is root:
+                    kind = "global"
+                else:
+                    kind = "enclosing"
+                for k, target in found:
+                    if target is not None:
+                        targets.append((k or kind, target))
+        suffix = "".join("." + a for a in reversed(attributes))
+        if not targets:
+            targets.append(("unresolved", None))
+        for kind, target in targets:
+            sites.append(CallSite(qualnames[id(caller)], None if target is None else target + suffix,
+                                  kind, call.lineno, call.col_offset))
+    return ModuleCalls(module, definitions, imports, sites)
+
+
+_FUNCTIONS = tuple(getattr(ast, n) for n in ("FunctionDef", "AsyncFunctionDef") if hasattr(ast, n))
+
+#: Names of the blocks without one, as in `__qualname__`.
+_ANONYMOUS = {ast.Lambda: "<lambda>", ast.GeneratorExp: "<genexpr>"}
+
+
+def _import_target(alias, import_from, package):
+    """
+    Returns the qualified name an `ast.alias` refers to, and the identifier
+    it binds.
+    """
+    if import_from is None:
+        if alias.asname is None:
+            # `import a.b` binds `a`.
+            identifier = alias.name.partition(".")[0]
+            return identifier, identifier
+        return alias.name, alias.asname
+    
+    base = import_from.module or ""
+    if import_from.level:
+        parts = package.split(".") if package else []
+        parts = parts[:len(parts) - import_from.level + 1]
+        base = ".".join(parts + ([base] if base else []))
+    target = base + "." + alias.name if base else alias.name
+    return target, alias.asname or alias.name
+
+
+class CallGraph(object):
+    """
+    Call graph of a set of modules, such as a package.
+    
+    Each module is analyzed on its own into a `ModuleCalls`. Names that refer
+    to other modules are only resolved when the graph is queried, so
+    updating one module recomputes the calls of that module only. Modules
+    added from source or from a file are skipped if they did not change.
+    
+    .. attribute:: computed
+    
+        Number of times the calls of a module were computed (rather than
+        found unchanged).
+    """
+    
+    def __init__(self):
+        self.computed = 0
+        
+        #: module name -> `ModuleCalls`
+        self._modules = {}
+        
+        #: module name -> hash of the source it was computed from
+        self._hashes = {}
+        
+        #: path -> (module name, mtime, size) of the files added with `add_path`
+        self._stats = {}
+        
+        #: resolved callee -> callers, built on demand
+        self._callers = None
+    
+    @property
+    def modules(self):
+        """
+        Names of the modules in the graph.
+        """
+        return sorted(self._modules)
+    
+    def module(self, module):
+        """
+        Returns the `ModuleCalls` of the module, `None` if it is not in the graph.
+        """
+        return self._modules.get(module)
+    
+    def add_module(self, module, node, is_package=False, augmentation=None):
+        """
+        Adds (or replaces) a module from its augmented tree. See `module_calls`.
+        """
+        self._set(module, module_calls(node, module, is_package, augmentation), None)
+    
+    def add_source(self, module, source, is_package=False, path=None):
+        """
+        Adds (or replaces) a module from its source code, unless it did not
+        change since it was last added.
+        
+        Returns `True` if the calls were computed. Raises `SyntaxError` if the
+        source cannot be parsed.
+        """
+        if not isinstance(source, bytes):
+            source = source.encode("utf-8")
+        digest = hashlib.sha256(source).digest()
+        if self._hashes.get(module) == digest:
+            return False
+        node = ast.parse(source, "<unknown>" if path is None else path)
+        augmentation = Augmentation(node)
+        augment_blocks(node, augmentation)
+        augment_scopes(augmentation.block, augmentation=augmentation)
+        self._set(module, module_calls(node, module, is_package, augmentation), digest)
+        return True
+    
+    def add_path(self, path, module, is_package=None):
+        """
+        Adds (or replaces) a module from a file. The file is not even read
+        if its modification time and size are the same as when it was last
+        added. `is_package` defaults to whether the file is an `__init__.py`.
+        
+        Returns `True` if the calls were computed.
+        """
+        stat = os.stat(path)
+        if self._stats.get(path) == (module, stat.st_mtime, stat.st_size) and module in self._modules:
+            return False
+        if is_package is None:
+            is_package = os.path.basename(path) == "__init__.py"
+        with open(path, "rb") as f:
+            source = f.read()
+        computed = self.add_source(module, source, is_package, path)
+        self._stats[path] = (module, stat.st_mtime, stat.st_size)
+        return computed
+    
+    def add_package(self, directory):
+        """
+        Adds all modules of the package in the directory, and removes the
+        modules of the package whose files are gone. The package is named
+        after the directory. Files that cannot be parsed are skipped.
+        
+        Returns the number of modules whose calls were computed.
+        """
+        directory = os.path.abspath(directory)
+        root = os.path.dirname(directory)
+        package = os.path.basename(directory)
+        found = set()
+        computed = 0
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not filename.endswith(".py"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                parts = os.path.relpath(path, root)[:-len(".py")].split(os.sep)
+                if parts[-1] == "__init__":
+                    parts.pop()
+                module = ".".join(parts)
+                found.add(module)
+                try:
+                    computed += self.add_path(path, module)
+                except (SyntaxError, ValueError, TypeError):
+                    self.remove(module)
+        for module in list(self._modules):
+            if (module == package or module.startswith(package + ".")) and module not in found:
+                self.remove(module)
+        return computed
+    
+    def remove(self, module):
+        """
+        Removes the module from the graph, if it is there.
+        """
+        if self._modules.pop(module, None) is not None:
+            self._callers = None
+        self._hashes.pop(module, None)
+        for path, stat in list(self._stats.items()):
+            if stat[0] == module:
+                del self._stats[path]
+    
+    def _set(self, module, calls, digest):
+        self._modules[module] = calls
+        if digest is None:
+            self._hashes.pop(module, None)
+        else:
+            self._hashes[module] = digest
+        self._callers = None
+        self.computed += 1
+    
+    def resolve(self, name):
+        """
+        Follows imports through the modules of the graph: returns the
+        qualified name of the definition `name` refers to. Names that
+        do not lead to a definition in the graph are returned unchanged.
+        """
+        seen = set()
+        while name is not None and name not in seen:
+            seen.add(name)
+            module, rest = self._split(name)
+            if module is None or not rest:
+                return name
+            calls = self._modules[module]
+            head, _, tail = rest.partition(".")
+            if name in calls.definitions or head not in calls.imports:
+                return name
+            name = calls.imports[head] + ("." + tail if tail else "")
+        return name
+    
+    def _split(self, name):
+        """
+        Returns the longest prefix of the name that is a module in the graph,
+        and the rest.
+        """
+        parts = name.split(".")
+        for i in range(len(parts), 0, -1):
+            module = ".".join(parts[:i])
+            if module in self._modules:
+                return module, ".".join(parts[i:])
+        return None, name
+    
+    def calls(self, caller=None):
+        """
+        Returns the `CallSite` of all calls (or only of those made by
+        `caller`), with the callees resolved across the modules.
+        """
+        if caller is None:
+            modules = self._modules.values()
+        else:
+            module, _ = self._split(caller)
+            modules = [] if module is None else [self._modules[module]]
+        result = []
+        for calls in modules:
+            for site in calls.calls:
+                if caller is not None and site.caller != caller:
+                    continue
+                if site.callee is not None:
+                    site = site._replace(callee=self.resolve(site.callee))
+                result.append(site)
+        return result
+    
+    def callees(self, caller):
+        """
+        Returns the qualified names of what `caller` calls (without
+        duplicates, unknown callees left out).
+        """
+        result = []
+        for site in self.calls(caller):
+            if site.callee is not None and site.callee not in result:
+                result.append(site.callee)
+        return result
+    
+    def callers(self, callee):
+        """
+        Returns the qualified names of the functions (or classes or modules)
+        calling `callee`.
+        """
+        if self._callers is None:
+            self._callers = collections.defaultdict(list)
+            for site in self.calls():
+                callers = self._callers[site.callee]
+                if site.callee is not None and site.caller not in callers:
+                    callers.append(site.caller)
+        return list(self._callers.get(self.resolve(callee), []))
@@ -0,0 +1,118 @@
+"""
+The `lenatu` command: analyzes files and writes the results as JSON Lines.
+
+For each file there is one record per block (in depth-first order, the
+module first), followed by one record for the file itself::
+
+    {"record": "block", "path": "m.py", "block": 1, "parent": 0, "kind": "FunctionDef", 
+     "name": "f", "line": 3, "col": 0, "locals": ["a", "b"]}
+    {"record": "file", "path": "m.py", "error": null, "blocks": 2, 
+     "names": [[3, 4, "f", "assigned", 0], ...]}
+
+`names` lists `[line, col, identifier, usage, block]` for every identifier
+referring to a variable, `block` being the index of the block the variable
+is bound to. The records of a file are written as soon as it is analyzed,
+so with `--jobs` the files come in the order they complete.
+"""
+import argparse
+import errno
+import json
+import os
+import sys
+import time
+
+from lenatu import _parallel
+from lenatu._cache import SummaryCache
+
+
+def _records(summary, names=True):
+    """
+    Yields the records of a `ModuleSummary`.
+    """
+    for b in summary.blocks:
+        yield {"record": "block", "path": summary.path, "block": b.index, "parent": b.parent, 
+               "kind": b.kind, "name": b.name, "line": b.lineno, "col": b.col_offset, 
+               "locals": list(b.local_variables)}
+    record = {"record": "file", "path": summary.path, "error": summary.error, 
+              "blocks": len(summary.blocks)}
+    if names:
+        record["names"] = [[n.lineno, n.col_offset, n.identifier, n.usage, n.block] 
+                           for n in summary.names]
+    yield record
+
+
+def _modified_after(paths, mtime):
+    """
+    Yields the paths of the files modified after `mtime`. Files that cannot
+    be found are kept, so that they are reported.
+    """
+    for path in paths:
+        try:
+            if os.stat(path).st_mtime <= mtime:
+                continue
+        except OSError:
+            pass
+        yield path
+
+
+def main(argv=None, out=None):
+    """
+    Runs the command. Returns the exit status: 1 if a file could not be 
+    analyzed, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(prog="lenatu", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", metavar="PATH", 
+                        help="file to analyze, or directory to search for .py files")
+    parser.add_argument("-j", "--jobs", type=int, default=1, 
+                        help="number of worker processes, 0 for one per CPU (default: 1)")
+    parser.add_argument("--newer", metavar="FILE", 
+                        help="only files modified after FILE (such as a stamp of the last run)")
+    parser.add_argument("--max-age", type=float, metavar="SECONDS", 
+                        help="only files modified within the last SECONDS")
+    parser.add_argument("--cache", metavar="DIR", help="cache the results in DIR")
+    parser.add_argument("--no-names", dest="names", action="store_false", 
+                        help="leave out the names of the file records")
+    args = parser.parse_args(argv)
+    if args.jobs < 0:
+        parser.error("--jobs must not be negative")
+    if args.jobs != 1:
+        try:
+            _parallel._futures()
+        except ValueError as e:
+            parser.error("--jobs: %s" % e)
+    out = sys.stdout if out is None else out
+    
+    paths = _parallel.python_files(args.paths)
+    if args.newer is not None:
+        try:
+            paths = _modified_after(paths, os.stat(args.newer).st_mtime)
+        except OSError as e:
+            parser.error("--newer: %s" % e)
+    if args.max_age is not None:
+        paths = _modified_after(paths, time.time() - args.max_age)
+    cache = None
+    if args.cache is not None:
+        cache = SummaryCache(args.cache)
+    
+    # In this process, files are analyzed one at a time so that their records
+    # are written right away. Workers get a few at once to save round trips.
+    chunksize = 1 if args.jobs == 1 else 8
+    
+    status = 0
+    try:
+        for summary in _parallel.augment_paths(paths, workers=args.jobs or None, chunksize=chunksize, 
+                                               cache=cache):
+            if summary.error:
+                status = 1
+            for record in _records(summary, args.names):
+                out.write(json.dumps(record, separators=(",", ":")))
+                out.write("\n")
+            out.flush()
+    except IOError as e:
+        # The reader went away (such as `lenatu src | head`).
+        if e.errno != errno.EPIPE:
+            raise
+        if out is sys.stdout:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    return status
@@ -0,0 +1,637 @@
+"""
+Control-flow graphs and def-use chains for the variables local to a block.
+
+Built on top of the scopes: only the names bound to the block are tracked,
+and the events of a statement are taken from the accesses the block pass
+recorded. The graph is one of basic blocks of such events, the reaching
+definitions are computed with one bitset (a Python `int`) per basic block.
+"""
+import ast
+
+from lenatu import _facts as facts
+from lenatu._block import _plan
+
+#: Kinds of events.
+DEF = "def"
+USE = "use"
+KILL = "kill"
+
+#: Pseudo-field for `_ORDER`: the target of an `ast.AugAssign` is read
+#: before it is assigned.
+_AUG_READ = object()
+
+#: Fields of nodes, in the order they are evaluated, where it differs from
+#: the order of `_fields`.
+_ORDER = {
+    ast.Assign: ("value", "targets"),
+    ast.AugAssign: (_AUG_READ, "value", "target"),
+    ast.comprehension: ("iter", "target", "ifs"),
+    ast.ListComp: ("generators", "elt"),
+    ast.SetComp: ("generators", "elt"),
+    ast.DictComp: ("generators", "key", "value"),
+}
+if hasattr(ast, "AnnAssign"):
+    _ORDER[ast.AnnAssign] = ("annotation", "value", "target")
+if hasattr(ast, "NamedExpr"):
+    _ORDER[ast.NamedExpr] = ("value", "target")
+
+_FOR = tuple(getattr(ast, n) for n in ("For", "AsyncFor") if hasattr(ast, n))
+_WITH = tuple(getattr(ast, n) for n in ("With", "AsyncWith") if hasattr(ast, n))
+_TRY = tuple(getattr(ast, n) for n in ("Try", "TryExcept", "TryFinally", "TryStar") if hasattr(ast, n))
+_MATCH = getattr(ast, "Match", None)
+_FUNCTIONS = tuple(getattr(ast, n) for n in ("FunctionDef", "AsyncFunctionDef") if hasattr(ast, n))
+
+#: Nodes whose accesses are parameters: `ast.arg` (Python 3) and `ast.arguments`
+#: for `*args` and `**kwargs` (before Python 3.4). Python 2 parameters are 
+#: `ast.Name` nodes in the `ast.Param` context.
+_PARAMETERS = tuple(getattr(ast, n) for n in ("arg", "arguments") if hasattr(ast, n))
+_PARAM = getattr(ast, "Param", None)
+
+
+class BasicBlock(object):
+    """
+    Sequence of events that are always executed together.
+    
+    .. attribute:: events
+    
+        List of `(kind, identifier, node)` tuples in the order they happen.
+        `kind` is `DEF` for an assignment, `USE` for a read and `KILL` for a
+        deletion of the variable.
+    
+    .. attribute:: successors
+    
+        Basic blocks that may be executed next.
+    
+    .. attribute:: predecessors
+    
+        Basic blocks that may have been executed before.
+    """
+    
+    __slots__ = ("events", "successors", "predecessors")
+    
+    def __init__(self):
+        self.events = []
+        self.successors = []
+        self.predecessors = []
+    
+    def __repr__(self):
+        return "BasicBlock(%r)" % [(kind, identifier) for kind, identifier, _ in self.events]
+
+
+class ControlFlowGraph(object):
+    """
+    Control-flow graph of the code executed in a block.
+    
+    An exception may leave any statement within a `try` body, so those
+    start a basic block of their own, with an edge to the handlers. Within
+    a statement, the events are in the order Python evaluates the
+    expressions, and they are all assumed to happen (conditional expressions
+    and short-circuit operators are not split). A `finally` block is shared
+    by all paths through it, so whatever reaches it on an exception or a 
+    `return` is assumed to reach the code after the `try` statement too.
+    
+    .. attribute:: block
+    
+        The `Block` of the graph.
+    
+    .. attribute:: entry
+    
+        The first basic block. Holds the definitions of the parameters.
+    
+    .. attribute:: exit
+    
+        Basic block without events that `return` (and exceptions not handled
+        in the block) lead to.
+    
+    .. attribute:: basic_blocks
+    
+        All basic blocks, `entry` first and `exit` last.
+    """
+    
+    __slots__ = ("block", "entry", "exit", "basic_blocks")
+    
+    def __init__(self, block, entry, exit, basic_blocks):
+        self.block = block
+        self.entry = entry
+        self.exit = exit
+        self.basic_blocks = basic_blocks
+
+
+class DefUse(object):
+    """
+    Def-use chains of the variables local to a block.
+    
+    Uses in nested blocks (closures) are not part of the chains, neither
+    are variables bound to other blocks.
+    
+    .. attribute:: block
+    
+        The `Block` analyzed.
+    
+    .. attribute:: cfg
+    
+        The `ControlFlowGraph` the chains were computed on.
+    
+    .. attribute:: definitions
+    
+        All `(identifier, node)` definitions in the block. Those of a variable
+        are next to each other, in the order of the graph. The node is the
+        one holding the identifier (such as an `ast.Name`, `ast.arg` or 
+        `ast.FunctionDef`).
+    """
+    
+    __slots__ = ("block", "cfg", "definitions", "_reaching", "_uses")
+    
+    def __init__(self, block, cfg, definitions):
+        self.block = block
+        self.cfg = cfg
+        self.definitions = definitions
+        
+        #: id(use node) -> definitions reaching it
+        self._reaching = {}
+        
+        #: id(definition node) -> uses it reaches
+        self._uses = {}
+    
+    def reaching(self, node):
+        """
+        Returns the definition nodes that may reach the given use (a node
+        reading a variable local to the block). Empty if the variable may
+        be unbound there.
+        """
+        return self._reaching.get(id(node), [])
+    
+    def uses(self, node):
+        """
+        Returns the nodes reading the variable the given definition may have
+        assigned.
+        """
+        return self._uses.get(id(node), [])
+    
+    def chains(self, identifier):
+        """
+        Returns `(definition, uses)` pairs for each definition of the variable.
+        """
+        return [(node, self.uses(node)) for i, node in self.definitions if i == identifier]
+
+
+def control_flow_graph(block, augmentation=None):
+    """
+    Builds the `ControlFlowGraph` of the code executed in the block.
+    
+    The scopes must have been augmented. Pass the `Augmentation` if the
+    tree was augmented with `inplace=False`.
+    """
+    return _Builder(block, augmentation).build()
+
+
+def def_use(block, augmentation=None):
+    """
+    Computes the `DefUse` chains of the variables local to the block, with
+    reaching definitions on the `control_flow_graph` of the block.
+    """
+    cfg = control_flow_graph(block, augmentation)
+    
+    # Number the definitions, those of one variable next to each other. The
+    # definitions of `identifier` are the bits `offsets[identifier]` up to
+    # `offsets[identifier] + counts[identifier]`, `masks` has those bits set.
+    by_identifier = {}
+    for bb in cfg.basic_blocks:
+        for kind, identifier, node in bb.events:
+            nodes = by_identifier.get(identifier)
+            if nodes is None:
+                nodes = by_identifier[identifier] = []
+            if kind is DEF:
+                nodes.append(node)
+    definitions = []
+    offsets = {}
+    counts = {}
+    masks = {}
+    inverse = {}
+    for identifier, nodes in by_identifier.items():
+        offsets[identifier] = len(definitions)
+        counts[identifier] = len(nodes)
+        masks[identifier] = ((1 << len(nodes)) - 1) << len(definitions)
+        inverse[identifier] = ~masks[identifier]
+        definitions.extend((identifier, node) for node in nodes)
+    
+    # gen and kill of each basic block, by position in `cfg.basic_blocks`.
+    gens = []
+    kills = []
+    numbers = dict.fromkeys(offsets, 0)
+    for bb in cfg.basic_blocks:
+        gen = kill = 0
+        for kind, identifier, _ in bb.events:
+            if kind is USE:
+                continue
+            gen &= inverse[identifier]
+            kill |= masks[identifier]
+            if kind is DEF:
+                gen |= 1 << (offsets[identifier] + numbers[identifier])
+                numbers[identifier] += 1
+        gens.append(gen)
+        kills.append(~kill)
+    
+    # Iterate in reverse post-order until nothing changes. That takes a few
+    # rounds more than the depth of the loop nesting.
+    positions = dict((id(bb), i) for i, bb in enumerate(cfg.basic_blocks))
+    order = [(positions[id(bb)], [positions[id(p)] for p in bb.predecessors])
+             for bb in _reverse_postorder(cfg)]
+    ins = [0] * len(gens)
+    outs = list(gens)
+    changed = True
+    while changed:
+        changed = False
+        for i, predecessors in order:
+            if len(predecessors) == 1:
+                state = outs[predecessors[0]]
+            else:
+                state = 0
+                for p in predecessors:
+                    state |= outs[p]
+            ins[i] = state
+            out = gens[i] | (state & kills[i])
+            if out != outs[i]:
+                outs[i] = out
+                changed = True
+    
+    # Walk each basic block again to link the uses to the definitions
+    # reaching them. Only the bits of the variable are extracted from the
+    # state, so enumerating them is cheap.
+    result = DefUse(cfg.block, cfg, definitions)
+    numbers = dict.fromkeys(offsets, 0)
+    for bb, state in zip(cfg.basic_blocks, ins):
+        for kind, identifier, node in bb.events:
+            offset = offsets[identifier]
+            if kind is USE:
+                nodes = []
+                reaching = (state >> offset) & ((1 << counts[identifier]) - 1)
+                while reaching:
+                    lowest = reaching & -reaching
+                    definition = definitions[offset + lowest.bit_length() - 1][1]
+                    nodes.append(definition)
+                    result._uses.setdefault(id(definition), []).append(node)
+                    reaching ^= lowest
+                result._reaching[id(node)] = nodes
+            else:
+                state &= inverse[identifier]
+                if kind is DEF:
+                    state |= 1 << (offset + numbers[identifier])
+                    numbers[identifier] += 1
+    return result
+
+
+def _reverse_postorder(cfg):
+    """
+    Returns the basic blocks in reverse post-order from the entry, followed
+    by the unreachable ones.
+    """
+    postorder = []
+    visited = set([id(cfg.entry)])
+    stack = [(cfg.entry, iter(cfg.entry.successors))]
+    while stack:
+        bb, successors = stack[-1]
+        for s in successors:
+            if id(s) not in visited:
+                visited.add(id(s))
+                stack.append((s, iter(s.successors)))
+                break
+        else:
+            stack.pop()
+            postorder.append(bb)
+    postorder.reverse()
+    postorder.extend(bb for bb in cfg.basic_blocks if id(bb) not in visited)
+    return postorder
+
+
+class _Builder(object):
+    """
+    Builds the `ControlFlowGraph` of a block.
+    """
+    
+    def __init__(self, block, augmentation):
+        self.block = block
+        if augmentation is None:
+            self.name_block = lambda node, attribute: getattr(node, attribute + "_block")
+        else:
+            self.name_block = augmentation.name_block
+        
+        #: id(node) -> accesses of the node recorded in the block
+        self.accesses = {}
+        for node, attribute, value, usage in block._accesses:
+            self.accesses.setdefault(id(node), []).append((node, attribute, value, usage))
+        self.covered = set()
+        
+        self.basic_blocks = []
+        self.exit = BasicBlock()
+        
+        #: (head, after) of the enclosing loops
+        self.loops = []
+        
+        #: For each enclosing `try`, the basic blocks an exception leads to
+        self.handlers = []
+        
+        #: Entries of the enclosing `finally` blocks
+        self.finally_entries = []
+    
+    def build(self):
+        entry = self.new_block()
+        start = self.new_block()
+        self.link(entry, start)
+        
+        definer = self.block.defined_by
+        if isinstance(definer, (ast.Lambda, ast.Expression)):
+            end = start
+            self.expression(definer.body, end)
+        elif isinstance(definer, ast.GeneratorExp):
+            end = start
+            for generator in definer.generators:
+                self.expression(generator, end)
+            self.expression(definer.elt, end)
+        else:
+            end = self.statements(definer.body, start)
+        if end is not None:
+            self.link(end, self.exit)
+        
+        for node, attribute, value, usage in self.block._accesses:
+            if id(node) not in self.covered and _is_parameter(node):
+                self.events(node, attribute, value, usage, entry)
+        
+        self.basic_blocks.append(self.exit)
+        return ControlFlowGraph(self.block, entry, self.exit, self.basic_blocks)
+    
+    def new_block(self):
+        bb = BasicBlock()
+        self.basic_blocks.append(bb)
+        if self.handlers:
+            for handler in self.handlers[-1]:
+                self.link(bb, handler)
+        return bb
+    
+    def link(self, a, b):
+        a.successors.append(b)
+        b.predecessors.append(a)
+    
+    def join(self, *ends):
+        ends = [e for e in ends if e is not None]
+        if not ends:
+            return None
+        bb = self.new_block()
+        for e in ends:
+            self.link(e, bb)
+        return bb
+    
+    def raise_target(self):
+        """
+        Where an exception leaving the current statement goes to, if the
+        basic block is not linked to a handler already.
+        """
+        return None if self.handlers else self.exit
+    
+    def statements(self, body, bb):
+        """
+        Adds the statements to the graph, starting in basic block `bb`.
+        Returns the basic block at the end, `None` if the end is not reachable.
+        """
+        for statement in body:
+            if bb is None:
+                bb = self.new_block() # unreachable code
+            elif self.handlers:
+                # Every statement in a `try` body may raise, so each one
+                # starts a basic block linked to the handlers.
+                nxt = self.new_block()
+                self.link(bb, nxt)
+                bb = nxt
+            bb = self.statement(statement, bb)
+        return bb
+    
+    def statement(self, node, bb):
+        if isinstance(node, ast.If):
+            self.expression(node.test, bb)
+            then = self.new_block()
+            self.link(bb, then)
+            orelse = self.new_block()
+            self.link(bb, orelse)
+            return self.join(self.statements(node.body, then), self.statements(node.orelse, orelse))
+        
+        elif isinstance(node, ast.While):
+            head = self.new_block()
+            self.link(bb, head)
+            self.expression(node.test, head)
+            return self.loop(node, head, self.new_block())
+        
+        elif isinstance(node, _FOR):
+            self.expression(node.iter, bb)
+            head = self.new_block()
+            self.link(bb, head)
+            body = self.new_block()
+            self.expression(node.target, body)
+            return self.loop(node, head, body)
+        
+        elif isinstance(node, _WITH):
+            if hasattr(node, "items"):
+                for item in node.items:
+                    self.expression(item, bb)
+            else:
+                self.expression(node.context_expr, bb)
+                if node.optional_vars is not None:
+                    self.expression(node.optional_vars, bb)
+            return self.statements(node.body, bb)
+        
+        elif isinstance(node, _TRY):
+            return self.try_statement(node, bb)
+        
+        elif _MATCH is not None and isinstance(node, _MATCH):
+            self.expression(node.subject, bb)
+            after = self.new_block()
+            for case in node.cases:
+                test = self.new_block()
+                self.link(bb, test)
+                self.expression(case.pattern, test)
+                if case.guard is not None:
+                    self.expression(case.guard, test)
+                body = self.new_block()
+                self.link(test, body)
+                end = self.statements(case.body, body)
+                if end is not None:
+                    self.link(end, after)
+                bb = test
+            self.link(bb, after)
+            return after
+        
+        elif isinstance(node, ast.Return):
+            if node.value is not None:
+                self.expression(node.value, bb)
+            self.link(bb, self.finally_entries[-1] if self.finally_entries else self.exit)
+            return None
+        
+        elif isinstance(node, ast.Break):
+            self.link(bb, self.loops[-1][1])
+            return None
+        
+        elif isinstance(node, ast.Continue):
+            self.link(bb, self.loops[-1][0])
+            return None
+        
+        elif isinstance(node, ast.Raise):
+            self.expression(node, bb)
+            if self.raise_target() is not None:
+                self.link(bb, self.raise_target())
+            return None
+        
+        else:
+            self.expression(node, bb)
+            if isinstance(node, ast.Assert) and self.raise_target() is not None:
+                self.link(bb, self.raise_target())
+            return bb
+    
+    def loop(self, node, head, body):
+        """
+        Adds the body and the `else` of a loop, given the basic block that
+        decides whether to run the body again and the first basic block of
+        the body. Returns the basic block after the loop.
+        """
+        self.link(head, body)
+        after = self.new_block()
+        self.loops.append((head, after))
+        end = self.statements(node.body, body)
+        self.loops.pop()
+        if end is not None:
+            self.link(end, head)
+        orelse = self.new_block()
+        self.link(head, orelse)
+        end = self.statements(node.orelse, orelse)
+        if end is not None:
+            self.link(end, after)
+        return after
+    
+    def try_statement(self, node, bb):
+        handlers = getattr(node, "handlers", [])
+        finalbody = getattr(node, "finalbody", [])
+        
+        handler_entries = [self.new_block() for _ in handlers]
+        final_entry = None
+        if finalbody:
+            final_entry = self.new_block()
+            self.finally_entries.append(final_entry)
+            self.handlers.append([final_entry])
+        
+        self.handlers.append(handler_entries + ([final_entry] if final_entry else []))
+        start = self.new_block()
+        self.link(bb, start)
+        end = self.statements(node.body, start)
+        self.handlers.pop()
+        
+        orelse = getattr(node, "orelse", [])
+        if end is not None:
+            ends = [self.statements(orelse, end)]
+        else:
+            # The `else` is unreachable. It is built without predecessors and
+            # does not lead to the code after the `try`.
+            self.statements(orelse, self.new_block())
+            ends = [None]
+        for handler, entry in zip(handlers, handler_entries):
+            if handler.type is not None:
+                self.expression(handler.type, entry)
+            target = isinstance(handler.name, ast.AST)
+            if target:
+                # Python 2: the name is an assignment target, which is not
+                # deleted at the end of the handler.
+                self.expression(handler.name, entry)
+            else:
+                self.own_events(handler, entry)
+            end = self.statements(handler.body, entry)
+            if end is not None and not target:
+                # The name is deleted at the end of the handler.
+                for _, attribute, value, usage in self.accesses.get(id(handler), []):
+                    if self.name_block(handler, attribute) is self.block:
+                        end.events.append((KILL, value, handler))
+            ends.append(end)
+        
+        if final_entry is None:
+            return self.join(*ends)
+        
+        self.handlers.pop()
+        self.finally_entries.pop()
+        for end in ends:
+            if end is not None:
+                self.link(end, final_entry)
+        end = self.statements(finalbody, final_entry)
+        if end is not None and self.raise_target() is not None:
+            # The exception is raised again after the `finally` block.
+            self.link(end, self.raise_target())
+        return end
+    
+    def expression(self, node, bb):
+        """
+        Adds the events of the node and the nodes below it that are executed
+        in the block, in the order they are evaluated.
+        """
+        stack = [(node, False)]
+        while stack:
+            n, done = stack.pop()
+            if done is True:
+                self.own_events(n, bb)
+                continue
+            if done is _AUG_READ:
+                for _, attribute, value, usage in self.accesses.get(id(n), []):
+                    if usage == facts.ASSIGNED and self.name_block(n, attribute) is self.block:
+                        bb.events.append((USE, value, n))
+                continue
+            
+            stack.append((n, True))
+            for field in reversed(_fields(type(n))):
+                if field is _AUG_READ:
+                    stack.append((n.target, _AUG_READ))
+                    continue
+                value = getattr(n, field, None)
+                if isinstance(value, list):
+                    for v in reversed(value):
+                        if isinstance(v, ast.AST):
+                            stack.append((v, False))
+                elif isinstance(value, ast.AST):
+                    stack.append((value, False))
+    
+    def own_events(self, node, bb):
+        accesses = self.accesses.get(id(node))
+        if accesses is None:
+            return
+        for _, attribute, value, usage in accesses:
+            self.events(node, attribute, value, usage, bb)
+    
+    def events(self, node, attribute, value, usage, bb):
+        self.covered.add(id(node))
+        if usage == facts.READ:
+            kind = USE
+        elif usage == facts.ASSIGNED:
+            kind = KILL if isinstance(getattr(node, "ctx", None), ast.Del) else DEF
+        else:
+            return # declarations
+        scope = self.name_block(node, attribute)
+        if isinstance(value, list):
+            for identifier, s in zip(value, scope):
+                if s is self.block:
+                    bb.events.append((kind, identifier, node))
+        elif scope is self.block:
+            bb.events.append((kind, value, node))
+
+
+def _is_parameter(node):
+    return isinstance(node, _PARAMETERS) or (_PARAM is not None and 
+                                             isinstance(getattr(node, "ctx", None), _PARAM))
+
+
+#: node-type -> fields `_Builder.expression` visits, in evaluation order.
+_FIELDS = {}
+
+
+def _fields(node_type):
+    fields = _FIELDS.get(node_type)
+    if fields is None:
+        # Fields belonging to a nested block are skipped.
+        fields = [field for field, kind in _plan(node_type)[2] if kind is not facts.DEFINED]
+        if node_type in _ORDER:
+            order = _ORDER[node_type]
+            fields = list(order) + [f for f in fields if f not in order]
+        fields = _FIELDS[node_type] = tuple(fields)
+    return fields
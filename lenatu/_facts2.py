@@ -62,6 +62,40 @@ if sys.version_info < (3,0):
     
     
     
+    # -------------------------------
+    # Fields that never hold children
+    # -------------------------------
+    
+    #: (node-type, attribute-name) pairs of fields that only hold identifiers,
+    #: constants, or the shared context and operator singletons. The block
+    #: pass does not descend into them.
+    LEAF_FIELDS = set([
+        (ast.Name, "id"),
+        (ast.Name, "ctx"),
+        (ast.Attribute, "attr"),
+        (ast.Attribute, "ctx"),
+        (ast.Subscript, "ctx"),
+        (ast.List, "ctx"),
+        (ast.Tuple, "ctx"),
+        (ast.BinOp, "op"),
+        (ast.UnaryOp, "op"),
+        (ast.BoolOp, "op"),
+        (ast.AugAssign, "op"),
+        (ast.Compare, "ops"),
+        (ast.Num, "n"),
+        (ast.Str, "s"),
+        (ast.Print, "nl"),
+        (ast.FunctionDef, "name"),
+        (ast.ClassDef, "name"),
+        (ast.Global, "names"),
+        (ast.ImportFrom, "module"),
+        (ast.ImportFrom, "level"),
+        (ast.alias, "name"),
+        (ast.alias, "asname"),
+        (ast.keyword, "arg"),
+    ])
+    
+    
     # -------------------------------------------------
     # Identifier that refer to variables.
     # -------------------------------------------------
@@ -92,16 +126,23 @@ if sys.version_info < (3,0):
             return [("asname", ASSIGNED, EXEC)]
             
     
+    def _arguments_fields(node):
+        # `vararg` and `kwarg` are `None` if the function has no `*args` or
+        # `**kwargs`.
+        return [(f, ASSIGNED, DEFINED) for f in ("vararg", "kwarg") if getattr(node, f) is not None]
+    
     #: Maps node-type to a function that takes the node (of that type) as
     #: a parameter. The function returns a list of (attribute-name, usage) tuples
     #: for each attribute of that node which is referring to a variable.
+    #:
+    #: `ExceptHandler.name` is missing, as it is an assignment target (such as
+    #: an `ast.Name`) or `None`. The target records its own access.
     NAME_FIELDS = {
         ast.FunctionDef: lambda n:[("name", ASSIGNED, EXEC)],
         ast.ClassDef: lambda n:[("name", ASSIGNED, EXEC)],
         ast.Global: lambda n:[("names", GLOBAL, EXEC)],
         ast.Name: _name_fields,
-        ast.ExceptHandler: lambda n:[("name", ASSIGNED, EXEC)],
-        ast.arguments: lambda n:[("vararg", ASSIGNED, DEFINED), ("kwarg", ASSIGNED, DEFINED)],
+        ast.arguments: _arguments_fields,
         ast.alias: _alias_fields
     }
     
@@ -64,6 +64,9 @@ if sys.version_info >= (3,0):
         CHILD_BLOCK[(ast.arguments, "vararg")] = MIXED
         CHILD_BLOCK[(ast.arguments, "kwarg")] = MIXED
         
+    if sys.version_info >= (3,8):
+        CHILD_BLOCK[(ast.arguments, "posonlyargs")] = MIXED
+        
     if sys.version_info >= (3,5):
         # Python 3.5+
         for (t, f), k in dict(CHILD_BLOCK).items():
@@ -72,6 +75,60 @@ if sys.version_info >= (3,0):
     
     
     
+    # -------------------------------
+    # Fields that never hold children
+    # -------------------------------
+    
+    #: (node-type, attribute-name) pairs of fields that only hold identifiers,
+    #: constants, or the shared context and operator singletons. The block
+    #: pass does not descend into them.
+    LEAF_FIELDS = set()
+    for _t, _fields in (
+            ("Name", ("id", "ctx")),
+            ("Attribute", ("attr", "ctx")),
+            ("Subscript", ("ctx", )),
+            ("Starred", ("ctx", )),
+            ("List", ("ctx", )),
+            ("Tuple", ("ctx", )),
+            ("BinOp", ("op", )),
+            ("UnaryOp", ("op", )),
+            ("BoolOp", ("op", )),
+            ("AugAssign", ("op", )),
+            ("Compare", ("ops", )),
+            ("Constant", ("value", "kind")),
+            ("Num", ("n", )),
+            ("Str", ("s", )),
+            ("Bytes", ("s", )),
+            ("NameConstant", ("value", )),
+            ("FormattedValue", ("conversion", )),
+            ("FunctionDef", ("name", "type_comment")),
+            ("AsyncFunctionDef", ("name", "type_comment")),
+            ("ClassDef", ("name", )),
+            ("Assign", ("type_comment", )),
+            ("AnnAssign", ("simple", )),
+            ("For", ("type_comment", )),
+            ("AsyncFor", ("type_comment", )),
+            ("With", ("type_comment", )),
+            ("AsyncWith", ("type_comment", )),
+            ("Global", ("names", )),
+            ("Nonlocal", ("names", )),
+            ("ImportFrom", ("module", "level")),
+            ("alias", ("name", "asname")),
+            ("arg", ("arg", "type_comment")),
+            ("keyword", ("arg", )),
+            ("ExceptHandler", ("name", )),
+            ("comprehension", ("is_async", )),
+            ("MatchSingleton", ("value", )),
+            ("MatchAs", ("name", )),
+            ("MatchStar", ("name", )),
+            ("MatchMapping", ("rest", )),
+            ("MatchClass", ("kwd_attrs", )),
+            ("TypeIgnore", ("lineno", "tag"))):
+        if hasattr(ast, _t):
+            LEAF_FIELDS.update((getattr(ast, _t), f) for f in _fields)
+    del _t, _fields
+    
+    
     # -------------------------------------------------
     # Identifier that refer to variables.
     # -------------------------------------------------
@@ -102,6 +159,15 @@ if sys.version_info >= (3,0):
             return [("asname", ASSIGNED, EXEC)]
             
     
+    def _arguments_fields(node):
+        # `vararg` and `kwarg` are `None` if the function has no `*args` or
+        # `**kwargs`.
+        return [(f, ASSIGNED, DEFINED) for f in ("vararg", "kwarg") if getattr(node, f) is not None]
+    
+    def _handler_fields(node):
+        # `name` is `None` for `except E:`.
+        return [("name", ASSIGNED, EXEC)] if node.name is not None else []
+    
     #: Maps node-type to a function that takes the node (of that type) as
     #: a parameter. The function returns a list of (attribute-name, usage) tuples
     #: for each attribute of that node which is referring to a variable.
@@ -111,12 +177,14 @@ if sys.version_info >= (3,0):
         ast.Global: lambda n:[("names", GLOBAL, EXEC)],
         ast.Nonlocal: lambda n:[("names", NONLOCAL, EXEC)],
         ast.Name: _name_fields,
-        ast.ExceptHandler: lambda n:[("name", ASSIGNED, EXEC)],
+        ast.ExceptHandler: _handler_fields,
         ast.arg: lambda n:[("arg", ASSIGNED, DEFINED)],
         ast.alias: _alias_fields
     }
+    if hasattr(ast, "AsyncFunctionDef"):
+        NAME_FIELDS[ast.AsyncFunctionDef] = NAME_FIELDS[ast.FunctionDef]
     if sys.version_info < (3,4):
-        NAME_FIELDS[ast.arguments] = lambda n:[("vararg", ASSIGNED, DEFINED), ("kwarg", ASSIGNED, DEFINED)]
+        NAME_FIELDS[ast.arguments] = _arguments_fields
     
     
     def is_local_variable(usages):
@@ -0,0 +1,148 @@
+import ast
+
+from lenatu import _block
+from lenatu import _scope
+from lenatu._scope import augment_scopes
+from lenatu._positions import PositionIndex
+
+
+def _enclosing_blocks(block):
+    enclosing = []
+    parent = block.parent
+    while parent is not None:
+        enclosing.append(parent)
+        parent = parent.parent
+    enclosing.reverse()
+    return enclosing
+
+
+def _nested_blocks(block):
+    """
+    Returns the set of the block and all blocks nested inside it.
+    """
+    nested = set()
+    stack = [block]
+    while stack:
+        b = stack.pop()
+        nested.add(b)
+        stack.extend(b._children)
+    return nested
+
+
+def _forget(nodes, augmentation):
+    """
+    Removes the entries of the nodes and all nodes below them from the tables.
+    """
+    keys = []
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        keys.append(id(node))
+        stack.extend(ast.iter_child_nodes(node))
+    _forget_keys(keys, augmentation)
+    
+    
+def _forget_executed_in(block, augmentation):
+    """
+    Removes the entries of all nodes executed in the block or its nested
+    blocks from the tables.
+    
+    Used if the body was modified in place: the removed nodes cannot be
+    reached from the tree anymore, so the table is searched instead.
+    """
+    nested = _nested_blocks(block)
+    _forget_keys([key for key, b in augmentation._executed_in.items() if b in nested], 
+                 augmentation)
+    
+    
+def _forget_keys(keys, augmentation):
+    tables = [augmentation._executed_in, augmentation._defined_block]
+    tables.extend(augmentation._name_blocks.values())
+    for key in keys:
+        for table in tables:
+            table.pop(key, None)
+
+
+def _unindex(block, augmentation):
+    """
+    Removes the nodes executed in the block and its nested blocks from the 
+    index of the enclosing blocks they refer to.
+    """
+    nested = _nested_blocks(block)
+    removed = {} # (enclosing block, usage, identifier) -> ids of nodes
+    for b in nested:
+        for node, attribute, variable, usage in b._accesses:
+            if augmentation is None:
+                scope = getattr(node, attribute + "_block", None)
+            else:
+                scope = augmentation.name_block(node, attribute)
+            if isinstance(variable, list):
+                pairs = zip(variable, scope or [])
+            else:
+                pairs = [(variable, scope)]
+            for identifier, s in pairs:
+                if s is not None and s not in nested:
+                    removed.setdefault((s, usage, identifier), set()).add(id(node))
+                    
+    for (s, usage, identifier), ids in removed.items():
+        table = _scope._index_of(s, usage)
+        nodes = [n for n in table.get(identifier, []) if id(n) not in ids]
+        if nodes:
+            table[identifier] = nodes
+        else:
+            table.pop(identifier, None)
+
+
+def reaugment(block, new_body=None, augmentation=None):
+    """
+    Updates the augmentation after the body of a block has changed.
+    
+    Only the nodes executed in `block` and in the blocks nested inside it
+    are visited, so the cost depends on the size of the block, not of the
+    whole tree. The block object itself is kept. The blocks nested in it are
+    replaced by new ones.
+    
+    The enclosing blocks are left as they are. Code executed in them cannot
+    refer to variables local to `block` or its nested blocks, so a change of
+    `block.local_variables` does not affect them. Only their `free_variables`
+    and `cell_variables` are updated, and if the scopes were augmented with
+    `index=True`, the nodes of the old body are removed from the index of
+    the enclosing blocks (and the new ones added). The `PositionIndex` of
+    the top-level block, if there is one, is built again.
+    
+    :param block: Block whose body was changed. Must be augmented already.
+    :param new_body: If not `None`, replaces `block.defined_by.body` first.
+        Otherwise the body is expected to have been modified in place.
+        `ast.GeneratorExp` has no body and must be modified in place.
+    :param augmentation: The `Augmentation` of the tree, if it was augmented 
+        with `inplace=False`. Its entries for the old body are removed. If 
+        the body was modified in place, this searches the whole table, as
+        the removed nodes are no longer part of the tree.
+    """
+    # With lazy scopes the enclosing blocks may not be resolved yet, but
+    # their local variables are needed to resolve the block.
+    if block.parent is not None:
+        _scope.resolve_pending(block.parent)
+        
+    index = block.bindings is not None
+    if index:
+        _unindex(block, augmentation)
+        
+    definer = block.defined_by
+    if new_body is not None:
+        if isinstance(definer, ast.GeneratorExp):
+            raise ValueError("%r has no body to replace" % definer)
+        if augmentation is not None:
+            _forget(_block._nodes_in(definer.body), augmentation)
+        definer.body = new_body
+    elif augmentation is not None:
+        _forget_executed_in(block, augmentation)
+        
+    _block._revisit_block(block, augmentation)
+    augment_scopes(block, _enclosing_blocks(block), augmentation, index)
+    
+    root = block
+    while root.parent is not None:
+        root = root.parent
+    if root.positions is not None:
+        root.positions = PositionIndex(root)
@@ -0,0 +1,176 @@
+import copy
+import itertools
+import os
+
+from lenatu import _summary
+
+
+def python_files(paths):
+    """
+    Yields the given files and the `.py` files found in the given directories
+    (recursively, in sorted order).
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith(".py"):
+                        yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+
+def _summarize_paths(paths, cache):
+    if cache is None:
+        return [_summary.summarize_path(path) for path in paths], 0, 0, 0
+    results = [cache.summarize_path(path) for path in paths]
+    return results, cache.hits, cache.misses, cache.evictions
+
+
+def _summarize_sources(items, cache):
+    if cache is None:
+        return [_summary.summarize_source(source, path) for path, source in items], 0, 0, 0
+    results = [cache.summarize_source(source, path) for path, source in items]
+    return results, cache.hits, cache.misses, cache.evictions
+
+
+def _futures():
+    """
+    Returns the `concurrent.futures` module. Raises `ValueError` if it is
+    missing (Python 2 without the `futures` backport), as then nothing can
+    be done in parallel.
+    """
+    try:
+        from concurrent import futures
+    except ImportError:
+        raise ValueError("Working in parallel requires concurrent.futures "
+                         "(Python 3.2+, or the 'futures' backport on Python 2)")
+    return futures
+
+
+def _cpu_count():
+    """
+    Returns the number of CPUs, 1 if unknown.
+    """
+    try:
+        return os.cpu_count() or 1
+    except AttributeError:
+        # Python 2
+        import multiprocessing
+        try:
+            return multiprocessing.cpu_count()
+        except NotImplementedError:
+            return 1
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run(task, items, workers, chunksize, max_pending, cache):
+    """
+    Applies `task` to chunks of `items` in a process pool and yields the
+    results of each chunk as soon as it completes.
+    
+    At most `max_pending` chunks are submitted but not yet yielded at any
+    time, which bounds the number of results held in memory.
+    
+    `task(chunk, cache)` returns the list of results and the hit, miss and
+    eviction counters of the cache in the worker. They are added to the
+    counters of `cache`.
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    chunks = _chunks(items, chunksize)
+    
+    if workers is not None and workers <= 1:
+        for chunk in chunks:
+            results = task(chunk, cache)[0]
+            for result in results:
+                yield result
+        return
+    
+    def unpack(future):
+        results, hits, misses, evictions = future.result()
+        if cache is not None:
+            cache.hits += hits
+            cache.misses += misses
+            cache.evictions += evictions
+        return results
+    
+    futures = _futures()
+    
+    if workers is None:
+        workers = _cpu_count()
+    if max_pending is None:
+        max_pending = 2 * workers
+    
+    with futures.ProcessPoolExecutor(workers) as executor:
+        pending = set()
+        try:
+            for chunk in chunks:
+                if len(pending) >= max_pending:
+                    done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                    for future in done:
+                        for result in unpack(future):
+                            yield result
+                pending.add(executor.submit(task, chunk, _fresh_counters(cache)))
+            for future in futures.as_completed(pending):
+                for result in unpack(future):
+                    yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _fresh_counters(cache):
+    """
+    Returns a copy of the cache with zero counters, to be sent to a worker.
+    """
+    if cache is None:
+        return None
+    cache = copy.copy(cache)
+    cache.hits = cache.misses = cache.evictions = 0
+    return cache
+
+
+def augment_paths(paths, workers=None, chunksize=8, max_pending=None, cache=None):
+    """
+    Parses and augments many files in a pool of worker processes.
+    
+    Yields a `ModuleSummary` for each file, in the order in which they
+    complete. Files that cannot be read or parsed are reported by their
+    summary's `error` and do not affect the other files.
+    
+    :param paths: Files to analyze. Directories are searched recursively 
+        for `.py` files.
+    :param workers: Number of processes, defaults to the number of CPUs.
+        With `1` (or `0`) the files are analyzed in this process. More 
+        workers raise `ValueError` on Python 2, unless the `futures` 
+        backport is installed.
+    :param chunksize: Number of files sent to a worker at once.
+    :param max_pending: Maximal number of chunks in progress (or completed
+        but not yet yielded) at any time. Bounds the memory held by results
+        the caller has not consumed yet. Defaults to twice the number of
+        workers.
+    :param cache: Optional `SummaryCache`. Files found in it are neither 
+        parsed nor augmented. The workers' hits, misses and evictions are
+        added to its counters.
+    """
+    return _run(_summarize_paths, python_files(paths), workers, chunksize, max_pending, cache)
+
+
+def augment_many(sources, workers=None, chunksize=8, max_pending=None, cache=None):
+    """
+    Like `augment_paths` but for source code that is already in memory.
+    
+    :param sources: Iterable of `(path, source)` pairs. `path` is only used
+        to name the source in the summary.
+    """
+    return _run(_summarize_sources, sources, workers, chunksize, max_pending, cache)
@@ -0,0 +1,257 @@
+"""
+Index from source positions to the blocks and the names found there.
+"""
+import ast
+import bisect
+import re
+
+from lenatu import _facts as facts
+from lenatu._block import _plan, _nodes_in
+
+
+#: Node types whose interval is the one of the name they hold. Other nodes
+#: holding a name (such as `ast.FunctionDef` or `ast.Global`) only count with
+#: their first line, from where they start.
+_NAME_NODES = frozenset(getattr(ast, t) for t in ("Name", "arg", "alias") if hasattr(ast, t))
+
+#: Positions are `lineno << _SHIFT | col_offset`, so that they compare like
+#: `(lineno, col_offset)` tuples. `_END_OF_LINE` is the last column.
+_SHIFT = 32
+_END_OF_LINE = (1 << _SHIFT) - 1
+
+#: What may come between the names of `global` and `nonlocal` on a line.
+_SEPARATOR = re.compile(br"[\s,\\]*")
+
+
+class PositionIndex(object):
+    """
+    Finds the innermost block and the name at a source position.
+    
+    Positions are given as in the `ast` module: `lineno` starts at 1, 
+    `col_offset` at 0 and counts UTF-8 bytes. The blocks and names are kept
+    as intervals sorted by their start, so a query is a binary search, 
+    O(log n) for a tree with n blocks and names.
+    
+    The index is built by `augment_blocks(node, positions=True)` and stored
+    as the `positions` of the top-level block. It relies on the end 
+    positions of the nodes (Python 3.8+). Without them, blocks are left out
+    and a name extends to the end of its identifier (`ast.Name`, `ast.arg`)
+    or of its first line, so the one starting last on the line wins. The
+    names of imports (`ast.alias`) have positions from Python 3.10 on.
+    """
+    
+    __slots__ = ("_root", "_blocks", "_names")
+    
+    def __init__(self, root):
+        """
+        Builds the index of the top-level block `root` and the blocks nested
+        in it, from the accesses collected by the block pass.
+        """
+        blocks = []
+        names = []
+        add_name = names.append
+        stack = [(root, 0)]
+        while stack:
+            block, depth = stack.pop()
+            stack.extend((child, depth + 1) for child in block._children)
+            if block is not root:
+                # A nested block wins over a part of its definer that is
+                # executed in the enclosing block, if both have the same
+                # interval (a lambda as default value).
+                _add(blocks, block.defined_by, depth, block)
+                for hole in _executed_outside(block.defined_by):
+                    _add(blocks, hole, 0, block.parent)
+            # Like `_add` (inlined as there are many accesses), but nodes 
+            # other than names only count with their first line.
+            for access in block._accesses:
+                n = access[0]
+                try:
+                    lineno = n.lineno
+                    end_lineno = n.end_lineno
+                except AttributeError:
+                    _add_without_end(names, access)
+                    continue
+                if end_lineno == lineno or (end_lineno is not None and type(n) in _NAME_NODES):
+                    add_name((lineno << _SHIFT | n.col_offset, end_lineno << _SHIFT | n.end_col_offset, 
+                              0, access))
+                elif end_lineno is not None:
+                    add_name((lineno << _SHIFT | n.col_offset, lineno << _SHIFT | _END_OF_LINE, 0, access))
+        self._root = root
+        self._blocks = _Intervals(blocks)
+        self._names = _Intervals(names)
+    
+    def block_at(self, lineno, col_offset):
+        """
+        Returns the innermost block that executes the code at the position.
+        
+        The decorators, default values, annotations and base classes of a 
+        definer are executed in the enclosing block. The rest of its header
+        (such as `def f(a):`) belongs to the block it defines.
+        """
+        block = self._blocks.find(lineno << _SHIFT | col_offset)
+        return self._root if block is None else block
+    
+    def name_at(self, lineno, col_offset):
+        """
+        Returns `(node, attribute, identifier)` of the innermost access to a 
+        variable at the position, `None` if there is none.
+        
+        `attribute` is the field of `node` holding the `identifier`, which
+        is a list for `ast.Global` and `ast.Nonlocal`. The block the variable
+        is bound to is `node.<attribute>_block`.
+        """
+        access = self._names.find(lineno << _SHIFT | col_offset)
+        return None if access is None else access[:3]
+
+
+class _Intervals(object):
+    """
+    Nested intervals sorted by their start, each with the position of the
+    interval it is nested in. Intervals that overlap without nesting are
+    cut off where the enclosing one ends.
+    """
+    
+    __slots__ = ("starts", "ends", "parents", "owners")
+    
+    def __init__(self, intervals):
+        """
+        :param intervals: `(start, end, rank, owner)` tuples. Of intervals 
+            with the same start and end, the one with the highest rank is
+            the innermost.
+        """
+        # Longer intervals first, so that they enclose the shorter ones.
+        keys = [(start << (2 * _SHIFT + 16) | (_END_OF_LINE << _SHIFT | _END_OF_LINE) - end) << 16 | rank
+                for start, end, rank, _ in intervals]
+        self.starts = starts = []
+        self.ends = ends = [_END_OF_LINE << _SHIFT | _END_OF_LINE]
+        self.parents = parents = []
+        self.owners = owners = []
+        # Positions in `ends` are shifted by one, the first entry stands for
+        # the whole source and stays at the bottom of the stack.
+        stack = [0]
+        pop = stack.pop
+        push = stack.append
+        for i in sorted(range(len(intervals)), key=keys.__getitem__):
+            start, end, _, owner = intervals[i]
+            while ends[stack[-1]] <= start:
+                pop()
+            parent = stack[-1]
+            push(len(ends))
+            starts.append(start)
+            ends.append(end if end < ends[parent] else ends[parent])
+            parents.append(parent - 1)
+            owners.append(owner)
+        del ends[0]
+    
+    def find(self, position):
+        """
+        Returns the owner of the innermost interval containing the position,
+        `None` if there is none.
+        """
+        # The last interval starting before the position contains it, or
+        # one of the intervals it is nested in does.
+        i = bisect.bisect_right(self.starts, position) - 1
+        ends, parents = self.ends, self.parents
+        while i >= 0 and ends[i] <= position:
+            i = parents[i]
+        return None if i < 0 else self.owners[i]
+
+
+def _add(intervals, node, rank, owner):
+    """
+    Adds `(start, end, rank, owner)` for the interval of the node, if it has
+    one.
+    """
+    end_lineno = getattr(node, "end_lineno", None)
+    if end_lineno is not None:
+        intervals.append((node.lineno << _SHIFT | node.col_offset, 
+                          end_lineno << _SHIFT | node.end_col_offset, rank, owner))
+
+
+def _add_without_end(names, access):
+    """
+    Adds the interval of an access whose node has no end position (before
+    Python 3.8), if it has a position at all.
+    """
+    n, _, identifier, _ = access
+    lineno = getattr(n, "lineno", None)
+    if lineno is None:
+        return
+    start = lineno << _SHIFT | n.col_offset
+    if type(n) in _NAME_NODES and not isinstance(identifier, list):
+        if not isinstance(identifier, bytes):
+            identifier = identifier.encode("utf-8")
+        names.append((start, start + len(identifier), 0, access))
+    else:
+        names.append((start, lineno << _SHIFT | _END_OF_LINE, 0, access))
+
+
+#: Maps node-type to the fields executed in the enclosing block and the
+#: MIXED fields, if the node is part of a definer.
+_OUTSIDE_FIELDS = {}
+
+
+def _outside_fields(node_type):
+    fields = _OUTSIDE_FIELDS.get(node_type)
+    if fields is None:
+        plan = _plan(node_type)[2]
+        fields = _OUTSIDE_FIELDS[node_type] = (tuple(f for f, kind in plan if kind is facts.EXEC),
+                                               tuple(f for f, kind in plan if kind is facts.MIXED))
+    return fields
+
+
+def _executed_outside(definer):
+    """
+    Returns the nodes of the definer's fields that are executed in the 
+    enclosing block (such as default values), without the nodes below them.
+    Nodes without a position (`ast.keyword` before Python 3.9) are replaced
+    by their children.
+    """
+    result = []
+    stack = [definer]
+    while stack:
+        node = stack.pop()
+        executed, mixed = _outside_fields(type(node))
+        for field in executed:
+            value = getattr(node, field, None)
+            if value:
+                for n in _nodes_in(value):
+                    if hasattr(n, "lineno"):
+                        result.append(n)
+                    else:
+                        result.extend(ast.iter_child_nodes(n))
+        for field in mixed:
+            value = getattr(node, field, None)
+            if value:
+                stack.extend(_nodes_in(value))
+    return result
+
+
+def _declared_index(node, source, lineno, col_offset):
+    """
+    Returns the index in `node.names` of the name of an `ast.Global` or
+    `ast.Nonlocal` at the position, 0 if there is none. The names have no 
+    positions of their own, so they are looked up in the `source` of the 
+    module (`bytes` or text).
+    """
+    if not isinstance(source, bytes):
+        source = source.encode("utf-8")
+    lines = source.splitlines()
+    line = node.lineno - 1
+    position = node.col_offset + len("global" if isinstance(node, ast.Global) else "nonlocal")
+    for i, name in enumerate(node.names):
+        if not isinstance(name, bytes):
+            name = name.encode("utf-8")
+        while line < len(lines):
+            position = _SEPARATOR.match(lines[line], position).end()
+            if lines[line].startswith(name, position):
+                break
+            # Continued on the next line.
+            line += 1
+            position = 0
+        else:
+            break
+        if line + 1 == lineno and position <= col_offset < position + len(name):
+            return i
+        position += len(name)
+    return 0
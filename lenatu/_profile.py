@@ -0,0 +1,120 @@
+import contextlib
+import threading
+import timeit
+
+
+#: Profiles currently collecting, see `profile`. Empty when profiling is
+#: disabled, which is all the instrumented code checks for.
+active = []
+
+#: Guards `active` and the measurements of the profiles in it, as blocks may
+#: be resolved by several threads at once.
+_lock = threading.Lock()
+
+#: Clock used for all measurements.
+timer = timeit.default_timer
+
+
+class Profile(object):
+    """
+    Measurements collected by `profile`, summed over all trees augmented 
+    while it was active.
+    
+    .. attribute:: block_seconds
+    
+        Wall time spent in the block pass (`augment_blocks`).
+        
+    .. attribute:: scope_seconds
+    
+        Wall time spent in the scope pass (`augment_scopes`, including blocks
+        that are resolved lazily).
+        
+    .. attribute:: nodes_visited
+    
+        Number of nodes visited by the block pass.
+        
+    .. attribute:: blocks_created
+    
+        Number of blocks created by the block pass.
+        
+    .. attribute:: names_resolved
+    
+        Number of identifiers whose scope was resolved.
+        
+    .. attribute:: block_times
+    
+        `(seconds, block, names)` for every block resolved, with `names` the
+        number of identifiers resolved in that block.
+    """
+    
+    def __init__(self):
+        self.block_seconds = 0.0
+        self.scope_seconds = 0.0
+        self.nodes_visited = 0
+        self.blocks_created = 0
+        self.names_resolved = 0
+        self.block_times = []
+        
+    def slowest_blocks(self, n=10):
+        """
+        Returns the `n` entries of `block_times` that took longest, slowest first.
+        """
+        return sorted(self.block_times, key=lambda entry: entry[0], reverse=True)[:n]
+    
+    def report(self, n=10):
+        """
+        Returns a human-readable summary.
+        """
+        lines = ["block pass: %.6f s, %i nodes, %i blocks" % (self.block_seconds, self.nodes_visited, self.blocks_created),
+                 "scope pass: %.6f s, %i names" % (self.scope_seconds, self.names_resolved)]
+        for seconds, block, names in self.slowest_blocks(n):
+            definer = block.defined_by
+            lines.append("  %.6f s %6i names  %s %s line %s" % (seconds, names, type(definer).__name__,
+                                                              getattr(definer, "name", ""),
+                                                              getattr(definer, "lineno", "-")))
+        return "\n".join(lines)
+        
+    def __repr__(self):
+        return "Profile(block_seconds=%r, scope_seconds=%r, nodes_visited=%r, blocks_created=%r, names_resolved=%r)" % (
+            self.block_seconds, self.scope_seconds, self.nodes_visited, self.blocks_created, self.names_resolved)
+
+
+@contextlib.contextmanager
+def profile(callback=None):
+    """
+    Context manager that collects a `Profile` of all augmentation done 
+    within it::
+    
+        with lenatu.profile() as p:
+            lenatu.augment(node)
+        print(p.report())
+        
+    :param callback: Called with the `Profile` when the context is left.
+    
+    Profiles can be nested, each one collects everything done while it is 
+    active, in any thread. When no profile is active, the only cost is a 
+    check of `active` per pass and per block.
+    """
+    p = Profile()
+    with _lock:
+        active.append(p)
+    try:
+        yield p
+    finally:
+        with _lock:
+            active.remove(p)
+        if callback is not None:
+            callback(p)
+
+
+def add(block_time=None, **counters):
+    """
+    Adds the given amounts to the attributes of all active profiles, and 
+    `block_time` to their `block_times`. Safe to call from several threads.
+    """
+    with _lock:
+        for p in active:
+            for name, amount in counters.items():
+                setattr(p, name, getattr(p, name) + amount)
+            if block_time is not None:
+                p.block_times.append(block_time)
@@ -0,0 +1,309 @@
+"""
+Resolution of names across modules, following the imports.
+"""
+import ast
+import collections
+import hashlib
+import os
+
+from lenatu import _facts as facts
+from lenatu._block import augment_blocks
+from lenatu._callgraph import _import_target
+from lenatu._positions import PositionIndex, _declared_index
+from lenatu._scope import augment_scopes
+
+
+#: A node binding a variable of a module. `identifier` is the variable
+#: (`None` if the binding is the module itself, then `node` is the
+#: `ast.Module`). `target` is the qualified name the variable refers to if
+#: `node` is an `ast.alias` of an import, otherwise `None`.
+Binding = collections.namedtuple("Binding", "module identifier node target")
+
+
+class ModuleTable(object):
+    """
+    The variables a module binds at its top-level.
+    
+    .. attribute:: module
+    
+        Name of the module.
+    
+    .. attribute:: path
+    
+        The file the module was loaded from.
+    
+    .. attribute:: node
+    
+        The augmented tree of the module.
+    
+    .. attribute:: bindings
+    
+        Maps the identifiers of the module's variables to the list of
+        `Binding` assigning them, in the order of the source.
+    """
+    
+    __slots__ = ("module", "path", "node", "bindings", "_stat", "_digest", "_source")
+    
+    def __init__(self, module, path, node, bindings, stat, digest):
+        self.module = module
+        self.path = path
+        self.node = node
+        self.bindings = bindings
+        self._stat = stat
+        self._digest = digest
+        self._source = None
+
+
+def module_table(node, module, is_package=False, path=None):
+    """
+    Returns the `ModuleTable` of a module augmented in-place.
+    """
+    package = module if is_package else module.rpartition(".")[0]
+    root = node.defined_block
+    import_froms = {}
+    for n in ast.walk(node):
+        if isinstance(n, ast.ImportFrom):
+            for a in n.names:
+                import_froms[id(a)] = n
+    
+    bindings = collections.OrderedDict()
+    stack = [root]
+    while stack:
+        block = stack.pop()
+        stack.extend(reversed(block._children))
+        for n, attribute, value, usage in block._accesses:
+            if usage != facts.ASSIGNED or isinstance(value, list):
+                continue
+            if getattr(n, attribute + "_block") is not root:
+                continue
+            target = None
+            if isinstance(n, ast.alias):
+                target, value = _import_target(n, import_froms.get(id(n)), package)
+            bindings.setdefault(value, []).append(Binding(module, value, n, target))
+    return ModuleTable(module, path, node, bindings, None, None)
+
+
+class Resolver(object):
+    """
+    Finds the nodes that names refer to, across the modules of a project.
+    
+    Modules are found in the `roots` directories, like `sys.path`. The table
+    of a module is only loaded (parsed and augmented) when a resolution
+    needs it, and kept until the file changes: a table is reused as long as
+    the modification time and size of the file stay the same, or the hash
+    of its content if they do not.
+    
+    .. attribute:: roots
+    
+        The directories modules are searched in.
+    
+    .. attribute:: loaded
+    
+        Number of times a module was parsed and augmented.
+    """
+    
+    def __init__(self, roots):
+        self.roots = list(roots)
+        self.loaded = 0
+        
+        #: module name -> `ModuleTable`
+        self._tables = {}
+        
+        #: module name -> (path, is_package), `None` if not found
+        self._found = {}
+    
+    def find(self, module):
+        """
+        Returns the path of the file of the module, `None` if there is none.
+        """
+        found = self._find(module)
+        return None if found is None else found[0]
+    
+    def _find(self, module):
+        if module not in self._found:
+            self._found[module] = None
+            parts = module.split(".")
+            for root in self.roots:
+                base = os.path.join(root, *parts)
+                if os.path.isfile(os.path.join(base, "__init__.py")):
+                    self._found[module] = (os.path.join(base, "__init__.py"), True)
+                    break
+                if os.path.isfile(base + ".py"):
+                    self._found[module] = (base + ".py", False)
+                    break
+        return self._found[module]
+    
+    def forget(self):
+        """
+        Forgets where modules were found, so that new or removed files are
+        taken into account. The tables are kept.
+        """
+        self._found.clear()
+    
+    def table(self, module):
+        """
+        Returns the `ModuleTable` of the module, loading it if it is not
+        loaded or changed since. `None` if the module is not found or cannot
+        be parsed.
+        """
+        found = self._find(module)
+        table = self._tables.get(module)
+        if found is None:
+            self._tables.pop(module, None)
+            return None
+        path, is_package = found
+        try:
+            stat = os.stat(path)
+            stat = (stat.st_mtime, stat.st_size)
+            if table is not None and table.path == path and table._stat == stat:
+                return table
+            with open(path, "rb") as f:
+                source = f.read()
+        except (IOError, OSError):
+            self._tables.pop(module, None)
+            return None
+        digest = hashlib.sha256(source).digest()
+        if table is not None and table.path == path and table._digest == digest:
+            table._stat = stat
+            return table
+        
+        try:
+            node = ast.parse(source, path)
+        except (SyntaxError, ValueError, TypeError):
+            self._tables.pop(module, None)
+            return None
+        augment_blocks(node, positions=True)
+        augment_scopes(node.defined_block)
+        self.loaded += 1
+        table = module_table(node, module, is_package, path)
+        table._stat = stat
+        table._digest = digest
+        table._source = source
+        self._tables[module] = table
+        return table
+    
+    def resolve(self, name):
+        """
+        Returns the `Binding` nodes the qualified name (such as
+        `"package.module.function"`) refers to, following imports.
+        Only the modules along the way are loaded. Bindings by an assignment
+        are returned as they are, names that lead out of the project (or
+        into a cycle of imports) are left out.
+        """
+        result = []
+        seen = set()
+        pending = [name]
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            table, rest = self._split(name)
+            if table is None:
+                continue
+            if not rest:
+                result.append(Binding(table.module, None, table.node, None))
+                continue
+            head, _, tail = rest.partition(".")
+            follow = []
+            for binding in table.bindings.get(head, []):
+                if binding.target is not None:
+                    follow.append(binding.target + ("." + tail if tail else ""))
+                elif not tail:
+                    result.append(binding)
+                else:
+                    member = _member(binding.node, tail)
+                    if member is not None:
+                        result.append(Binding(table.module, tail, member, None))
+            pending.extend(reversed(follow))
+        return result
+    
+    def _split(self, name):
+        """
+        Returns the table of the longest prefix of the name that is a module,
+        and the rest of the name.
+        """
+        parts = name.split(".")
+        for i in range(len(parts), 0, -1):
+            if self._find(".".join(parts[:i])) is not None:
+                table = self.table(".".join(parts[:i]))
+                if table is not None:
+                    return table, ".".join(parts[i:])
+        return None, name
+    
+    def definition(self, module, lineno, col_offset):
+        """
+        "Go to definition": returns the `Binding` nodes of the variable
+        whose identifier is at the given position of the module (`lineno`
+        starting at 1, `col_offset` at 0).
+        """
+        table = self.table(module)
+        if table is None:
+            return []
+        node, attribute, identifier = _at(table.node, lineno, col_offset, table._source)
+        if node is None:
+            return []
+        if isinstance(node, ast.alias):
+            is_package = os.path.basename(table.path) == "__init__.py"
+            package = module if is_package else module.rpartition(".")[0]
+            return self.resolve(_import_target(node, _import_from(table.node, node), package)[0])
+        
+        scope = getattr(node, attribute + "_block")
+        if isinstance(scope, list):
+            scope = scope[node.names.index(identifier)]
+        if scope is table.node.defined_block:
+            return self.resolve(module + "." + identifier)
+        result = []
+        stack = [scope]
+        while stack:
+            block = stack.pop()
+            stack.extend(reversed(block._children))
+            for n, a, value, usage in block._accesses:
+                if (usage == facts.ASSIGNED and value == identifier and
+                        getattr(n, a + "_block") is scope):
+                    result.append(Binding(module, identifier, n, None))
+        return result
+
+
+def _member(node, path):
+    """
+    Returns the function or class `path` (dotted) within the class `node`.
+    """
+    for name in path.split("."):
+        if not isinstance(node, ast.ClassDef):
+            return None
+        for statement in node.body:
+            if getattr(statement, "name", None) == name:
+                node = statement
+                break
+        else:
+            return None
+    return node
+
+
+def _at(node, lineno, col_offset, source=None):
+    """
+    Returns `(node, attribute, identifier)` of the innermost access at the
+    position, `(None, None, None)` if there is none. The name of a `global`
+    or `nonlocal` at the position is found with the `source`, without it the
+    first one is taken.
+    """
+    root = node.defined_block
+    found = (root.positions or PositionIndex(root)).name_at(lineno, col_offset)
+    if found is None:
+        return None, None, None
+    n, attribute, identifier = found
+    if isinstance(identifier, list):
+        i = 0 if source is None else _declared_index(n, source, lineno, col_offset)
+        identifier = identifier[i]
+    return n, attribute, identifier
+
+
+def _import_from(root, alias):
+    """
+    Returns the `ast.ImportFrom` the alias belongs to, `None` for `ast.Import`.
+    """
+    for n in ast.walk(root):
+        if isinstance(n, ast.ImportFrom) and any(a is alias for a in n.names):
+            return n
+    return None
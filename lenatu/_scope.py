@@ -1,62 +1,15 @@
 import ast
+import sys
 from lenatu import _facts as facts
+from lenatu import _profile
 import collections
 
 
-def _nodes_of_block(block):
-    """
-    Returns nodes that define or execute the given block.
-    """
-    def visit(node):
-        if getattr(node, "executed_in", block) is block or getattr(node, "defined_block", None) is block:
-            yield node
-            for child in ast.iter_child_nodes(node):
-                for n in visit(child): yield n
+#: Dict that keeps the insertion order, which `ordered_local_variables` relies
+#: on. `dict` itself does so from Python 3.7 on.
+_OrderedDict = dict if sys.version_info >= (3, 7) else collections.OrderedDict
 
-    return visit(block.defined_by)
-    
-    
-def _variable_accesses_in(block):
-    """
-    Returns (node, attribute, variable-name, usage) tuples for all
-    accesses to variables by code executed in the given block.
-    """
-    for node in _nodes_of_block(block):
-        
-        defined_block = getattr(node, "defined_block", None)
-        executed_in = getattr(node, "executed_in", None)
-        
-        f = facts.NAME_FIELDS.get(type(node), lambda _:[])
-        for attribute, usage, which_block in f(node):
-            
-            accessed_block = defined_block if which_block == facts.DEFINED else executed_in
-            if (accessed_block == block):  
-                value = getattr(node, attribute)
-                if isinstance(value, list):
-                    for v in value:
-                        yield (node, attribute, v, usage)
-                else:
-                    yield (node, attribute, value, usage)
 
-    
-def _blocks_defined_in(block):
-    """
-    Returns blocks that are directly defined in the given block.
-    """
-    def visit(node):
-        if getattr(node, "executed_in", None) is block or getattr(node, "defined_block", None) is block:
-        
-            if getattr(node, "executed_in", None) is block and getattr(node, "defined_block", block) is not block:
-                yield node.defined_block
-                # no need to look inside the children of this node. We'll only find
-                # the same block again.
-            else:
-                for child in ast.iter_child_nodes(node):
-                    for b in visit(child): yield b
-                           
-    return visit(block.defined_by)
-    
-    
 def _scope_lookup(identifier, usages, blocks):
     """
     Find the block the given identifier belongs to.
@@ -66,28 +19,25 @@ def _scope_lookup(identifier, usages, blocks):
     Blocks from classes are ignored (with the exception of `block[-1]).
     """
     
-    if not isinstance(blocks[0].defined_by, ast.Module):
-        raise ValueError("block[0] should be a module.")
-
     if facts.GLOBAL in usages:
         return blocks[0]
     
+    local_block = blocks[-1]
     for block in reversed(blocks):
-        if block == blocks[-1]:
+        if block is local_block:
             if facts.NONLOCAL in usages:
                 continue # don't look in the local block
-        else:
-            if not facts.are_locals_visible_to_childen(block):
-                continue # skip over enclosing class-blocks 
+        elif block.is_class:
+            continue # skip over enclosing class-blocks 
             
-        if identifier in block.local_variables:
+        if identifier in block._local_variables:
             return block
     else:
         # identifier is a global variable which isn't assigned directly in the module.
         return blocks[0]
 
             
-def _assign_scopes(block, enclosing_blocks):
+def _assign_scopes(block, enclosing_blocks, augmentation=None, index=False, symbols=None):
     """
     Sets `block.local_variables` and the `xyz_block` attributes of all
     nodes executed within `block`.
@@ -96,41 +46,463 @@ def _assign_scopes(block, enclosing_blocks):
         is `enclosing_blocks[0]` and the direct parent is `enclosing_blocks[-1]`.
         Empty if `block` is the module.
         All these blocks must have `local_variables` set already.
+    :param augmentation: If not `None`, the `Augmentation` the scopes are
+        stored in instead of setting the `xyz_block` attributes.
+    :param index: If `True`, `block.bindings`, `block.reads` and 
+        `block.declarations` are reset and the nodes are added to the
+        index of the block they refer to.
+    :param symbols: Optional `SymbolInfo` from the `symtable` backend. If 
+        given, the local variables and declarations are taken from it.
     """
-    
-    all_usages = collections.defaultdict(set)
-    for _, _, identifier, usage in _variable_accesses_in(block):
-        all_usages[identifier].add(usage) 
-    
-    
-    local_variables = [identifier for identifier, usages in all_usages.items() if facts.is_local_variable(usages)]
-    block.local_variables = local_variables
+    all_usages, local_variables = _classify(_usages(block, symbols), symbols)
+    block._ordered_local_variables = local_variables
+    block._local_variables = frozenset(local_variables)
+    block._pending = None
             
     # Variables used in this block are local to one of these blocks
     candidate_blocks = enclosing_blocks + [block]
+    _check_module(all_usages, candidate_blocks)
         
     # For each used variable find the block that variable is defined in.
     scope_map = {identifier : _scope_lookup(identifier, usages, candidate_blocks) for identifier, usages in all_usages.items()}
+    _own_variables(block, all_usages, scope_map, candidate_blocks[0])
+    _inject(block, scope_map, augmentation, index)
+    
+    
+def _usages(block, symbols=None):
+    """
+    Returns a dict mapping the identifiers used in the block to the set
+    of their usages. With a `SymbolInfo`, its `bound` variables are added
+    without usages if the block does not use them.
+    """
+    all_usages = _OrderedDict()
+    for _, _, value, usage in block._accesses:
+        if isinstance(value, list):
+            for identifier in value:
+                all_usages.setdefault(identifier, set()).add(usage)
+        else:
+            all_usages.setdefault(value, set()).add(usage)
+    if symbols is not None:
+        for identifier in symbols.bound:
+            all_usages.setdefault(identifier, set())
+    return all_usages
+
+
+def _classify(all_usages, symbols):
+    """
+    Returns the usages as `_scope_lookup` needs them and the tuple of the
+    local variables of the block.
+    """
+    if symbols is not None:
+        all_usages = _symbol_usages(all_usages, symbols)
+        local_variables = tuple(identifier for identifier, usages in all_usages.items() 
+                                if identifier in symbols.locals or identifier in symbols.bound 
+                                or facts.is_local_variable(usages))
+    else:
+        local_variables = tuple(identifier for identifier, usages in all_usages.items() if facts.is_local_variable(usages))
+    return all_usages, local_variables
+
 
-    # Inject scopes into the AST nodes
-    for node, attribute, _ , _ in _variable_accesses_in(block):
-        variable = getattr(node, attribute)
+def _own_variables(block, all_usages, scope_map, module):
+    """
+    Sets the global and nonlocal variables of the block and the free variables
+    it uses itself. The free and cell variables are set by `_close` later.
+    """
+    free_variables = []
+    global_variables = []
+    nonlocal_variables = []
+    NONLOCAL = facts.NONLOCAL
+    for identifier, scope in scope_map.items():
+        if scope is block:
+            continue
+        elif scope is module:
+            global_variables.append(identifier)
+        else:
+            free_variables.append(identifier)
+            if NONLOCAL in all_usages[identifier]:
+                nonlocal_variables.append(identifier)
+    block._own_free_variables = frozenset(free_variables)
+    block._global_variables = frozenset(global_variables)
+    block._nonlocal_variables = frozenset(nonlocal_variables)
+    block._free_variables = None
+    block._cell_variables = None
+    
+    
+def _close(block):
+    """
+    Sets the free and cell variables of the block and all blocks nested 
+    inside it, from the variables each of them uses itself.
+    """
+    blocks = []
+    stack = [block]
+    while stack:
+        b = stack.pop()
+        blocks.append(b)
+        stack.extend(b._children)
+    # Nested blocks come after their parent in `blocks`.
+    for b in reversed(blocks):
+        _close_block(b)
+        
+        
+def _close_block(block):
+    """
+    Sets the free and cell variables of the block, from the ones it uses 
+    itself and the free variables of the blocks directly nested in it.
+    They stay `None` if one of these is not known yet.
+    """
+    block._free_variables = None
+    block._cell_variables = None
+    if block._own_free_variables is None:
+        return
+    
+    free_variables = set(block._own_free_variables)
+    cell_variables = set()
+    for child in block._children:
+        if child._free_variables is None:
+            return
+        for identifier in child._free_variables:
+            # Class blocks are skipped by the nested blocks (see `_scope_lookup`).
+            if not block.is_class and identifier in block._local_variables:
+                cell_variables.add(identifier)
+            else:
+                free_variables.add(identifier)
+    block._free_variables = frozenset(free_variables)
+    block._cell_variables = frozenset(cell_variables)
+            
+            
+def _check_module(all_usages, candidate_blocks):
+    if all_usages and not isinstance(candidate_blocks[0].defined_by, ast.Module):
+        raise ValueError("block[0] should be a module.")
+    
+    
+def _inject(block, scope_map, augmentation, index):
+    """
+    Sets the `xyz_block` attributes (or the entries in the augmentation) of 
+    the nodes executed in the block, given the block each identifier is bound to.
+    """
+    if index:
+        block.bindings = {}
+        block.reads = {}
+        block.declarations = {}
+        
+    for node, attribute, variable, usage in block._accesses:
         if isinstance(variable, list):
             scope = [scope_map[v] for v in variable]
+            if index:
+                for v, s in zip(variable, scope):
+                    _index(s, v, usage, node)
         else:
             scope = scope_map[variable]
-        setattr(node, attribute + "_block", scope)
+            if index:
+                _index(scope, variable, usage, node)
+        if augmentation is None:
+            setattr(node, attribute + "_block", scope)
+        else:
+            # setdefault, as blocks may be resolved by several threads.
+            name_blocks = augmentation._name_blocks.get(attribute)
+            if name_blocks is None:
+                name_blocks = augmentation._name_blocks.setdefault(attribute, {})
+            name_blocks[id(node)] = scope
+        
+
+def _symbol_usages(all_usages, symbols):
+    """
+    Replaces the usages of the variables the symbol table knows about by
+    the declarations it found (which is all `_scope_lookup` needs).
+    """
+    result = _OrderedDict()
+    for identifier, usages in all_usages.items():
+        if identifier in symbols.deferred:
+            result[identifier] = usages
+        elif identifier in symbols.flags:
+            result[identifier] = symbols.flags[identifier]
+        elif identifier in symbols.locals:
+            result[identifier] = _NO_FLAGS
+        else:
+            result[identifier] = usages
+    return result
+
+
+_NO_FLAGS = frozenset()
+
+
+def _index_of(block, usage):
+    """
+    Returns the index of the block for nodes with the given usage.
+    """
+    if usage == facts.READ:
+        return block.reads
+    elif usage == facts.ASSIGNED:
+        return block.bindings
+    else:
+        return block.declarations
+
+
+def _index(block, identifier, usage, node):
+    """
+    Adds the node to the index of the block.
+    """
+    table = _index_of(block, usage)
+    nodes = table.get(identifier)
+    if nodes is None:
+        table[identifier] = [node]
+    else:
+        nodes.append(node)
         
             
-def augment_scopes(block, enclosing_blocks=[]):
+def augment_scopes(block, enclosing_blocks=[], augmentation=None, index=False, source=None,
+                   workers=None, processes=False):
     """
     Augment the block and all sub-blocks with scope information.
     
     This will set the block's `local_variables` field and adds the 
     `xyz_block` attributes to the nodes.
+    
+    Works from the accesses and child blocks `augment_blocks` collected while
+    visiting the tree, so the AST is not walked again.
+    
+    If an `Augmentation` is given, the scopes are stored in it instead and
+    the nodes are left untouched.
+    
+    With `index=True` the `bindings`, `reads` and `declarations` of each
+    block are filled in the same pass.
+    
+    If the `source` of the whole tree is given, the classification of the
+    variables is taken from the `symtable` module instead, for all blocks
+    that can be matched to a symbol table (by type, name and line number).
+    The results are the same, except where lenatu and CPython disagree 
+    about names lenatu does not track (such as the capture patterns of 
+    `match` statements), for which the symbol table is right. This is 
+    slower, as the source is compiled again.
+    
+    With more than one of `workers`, the blocks are resolved level by level:
+    all blocks nested at the same depth only depend on the blocks enclosing
+    them, so they are distributed over a pool of threads (or of processes,
+    if `processes` is true). Threads only run in parallel on free-threaded
+    builds of CPython. The process pool gets the names used in each block
+    and the local variables of the enclosing blocks, the nodes themselves
+    are updated in this process. The index cannot be built in parallel.
+    Raises `ValueError` on Python 2 without the `futures` backport.
     """
-    _assign_scopes(block, enclosing_blocks)
-    for child_block in _blocks_defined_in(block):
-        augment_scopes(child_block, enclosing_blocks + [block])
+    if workers is not None and workers > 1 and index:
+        raise ValueError("The index cannot be built in parallel")
     
-    
\ No newline at end of file
+    if _profile.active:
+        start = _profile.timer()
+        
+    infos = {}
+    if source is not None:
+        from lenatu._symtable import symbol_infos
+        infos = symbol_infos(enclosing_blocks[0] if enclosing_blocks else block, source)
+        
+    root = block
+    outer = list(enclosing_blocks)
+    if workers is not None and workers > 1:
+        _resolve_levels(block, enclosing_blocks, augmentation, infos, workers, processes)
+    else:
+        stack = [(block, list(enclosing_blocks))]
+        while stack:
+            block, enclosing_blocks = stack.pop()
+            if _profile.active:
+                _assign_scopes_profiled(block, enclosing_blocks, augmentation, index, infos.get(block))
+            else:
+                _assign_scopes(block, enclosing_blocks, augmentation, index, infos.get(block))
+            candidate_blocks = enclosing_blocks + [block]
+            for child_block in reversed(block._children):
+                stack.append((child_block, candidate_blocks))
+                
+    _close(root)
+    for b in reversed(outer):
+        _close_block(b)
+            
+    if _profile.active:
+        _profile.add(scope_seconds=_profile.timer() - start)
+            
+            
+def _resolve_levels(block, enclosing_blocks, augmentation, infos, workers, processes):
+    """
+    Resolves the block and its sub-blocks one level of nesting after the 
+    other, each level in parallel.
+    """
+    from lenatu._parallel import _futures
+    futures = _futures()
+    
+    if processes:
+        executor = futures.ProcessPoolExecutor(workers)
+    else:
+        executor = futures.ThreadPoolExecutor(workers)
+        
+    with executor:
+        level = [(block, list(enclosing_blocks))]
+        while level:
+            # Enough chunks to balance the load, few enough to keep the
+            # overhead per chunk low.
+            size = max(1, -(-len(level) // (4 * workers)))
+            chunks = [level[i:i + size] for i in range(0, len(level), size)]
+            if len(chunks) == 1:
+                _assign_chunk(level, augmentation, infos)
+            elif processes:
+                tables = [_name_tables(chunk, infos) for chunk in chunks]
+                tasks = [executor.submit(_resolve_names, chains, items) for chains, items in tables]
+                for chunk, (_, items), task in zip(chunks, tables, tasks):
+                    _apply_names(chunk, items, task.result(), augmentation)
+            else:
+                for task in [executor.submit(_assign_chunk, chunk, augmentation, infos) for chunk in chunks]:
+                    task.result()
+            level = [(child, enclosing + [b]) for b, enclosing in level for child in b._children]
+            
+            
+def _assign_chunk(chunk, augmentation, infos):
+    """
+    Resolves the `(block, enclosing_blocks)` of the chunk in this process.
+    """
+    for block, enclosing_blocks in chunk:
+        if _profile.active:
+            _assign_scopes_profiled(block, enclosing_blocks, augmentation, False, infos.get(block))
+        else:
+            _assign_scopes(block, enclosing_blocks, augmentation, False, infos.get(block))
+            
+
+class _Frame(object):
+    """
+    Stand-in for a block in `_resolve_names`, with what `_scope_lookup` needs.
+    """
+    __slots__ = ("_local_variables", "is_class")
+    
+    def __init__(self, local_variables, is_class):
+        self._local_variables = local_variables
+        self.is_class = is_class
+        
+        
+def _name_tables(chunk, infos):
+    """
+    Returns the arguments of `_resolve_names` for the `(block, enclosing_blocks)`
+    of the chunk.
+    """
+    chain_ids = {}
+    chains = []
+    items = []
+    for block, enclosing_blocks in chunk:
+        key = id(enclosing_blocks[-1]) if enclosing_blocks else None
+        chain = chain_ids.get(key)
+        if chain is None:
+            chain = chain_ids[key] = len(chains)
+            chains.append(tuple((b._local_variables, b.is_class) for b in enclosing_blocks))
+        symbols = infos.get(block)
+        items.append((chain, block.is_class, list(_usages(block, symbols).items()), symbols))
+    return chains, items
+
+
+def _resolve_names(chains, items):
+    """
+    Task of the process pool. Classifies the variables of blocks given their
+    name tables.
+    
+    :param chains: Tuples of `(local_variables, is_class)` of enclosing blocks, 
+        the module first.
+    :param items: For each block a `(chain, is_class, usages, symbols)` tuple. 
+        `chain` is the index of the block's enclosing blocks in `chains`, 
+        `usages` a list of `(identifier, usages)` pairs.
+    :returns: For each block the positions of its local variables within 
+        `usages` and for each of the `usages`, the position of the block the
+        identifier is bound to within the enclosing blocks plus the block 
+        itself. Positions instead of the identifiers themselves keep the 
+        strings of this process out of the tree.
+    """
+    frames = [[_Frame(l, c) for l, c in chain] for chain in chains]
+    results = []
+    for chain, is_class, usages, symbols in items:
+        all_usages, local_variables = _classify(_OrderedDict(usages), symbols)
+        candidates = frames[chain] + [_Frame(frozenset(local_variables), is_class)]
+        positions = dict((id(f), i) for i, f in enumerate(candidates))
+        indices = dict((identifier, i) for i, (identifier, _) in enumerate(usages))
+        results.append(([indices[identifier] for identifier in local_variables], 
+                        [positions[id(_scope_lookup(identifier, all_usages[identifier], candidates))] 
+                         for identifier, _ in usages]))
+    return results
+
+
+def _apply_names(chunk, items, results, augmentation):
+    """
+    Sets the results of `_resolve_names` on the blocks of the chunk and their nodes.
+    """
+    for (block, enclosing_blocks), item, (local_indices, positions) in zip(chunk, items, results):
+        identifiers = [identifier for identifier, _ in item[2]]
+        local_variables = tuple(identifiers[i] for i in local_indices)
+        block._ordered_local_variables = local_variables
+        block._local_variables = frozenset(local_variables)
+        block._pending = None
+        candidate_blocks = enclosing_blocks + [block]
+        _check_module(identifiers, candidate_blocks)
+        scope_map = dict((identifier, candidate_blocks[p]) for identifier, p in zip(identifiers, positions))
+        _own_variables(block, dict(item[2]), scope_map, candidate_blocks[0])
+        _inject(block, scope_map, augmentation, False)
+            
+            
+def _assign_scopes_profiled(block, enclosing_blocks, augmentation, index=False, symbols=None):
+    """
+    `_assign_scopes` that records the time and number of names of the block
+    in the active profiles.
+    """
+    start = _profile.timer()
+    _assign_scopes(block, enclosing_blocks, augmentation, index, symbols)
+    seconds = _profile.timer() - start
+    names = 0
+    for _, _, value, _ in block._accesses:
+        names += len(value) if isinstance(value, list) else 1
+    _profile.add((seconds, block, names), names_resolved=names)
+            
+
+def defer_scopes(block, augmentation):
+    """
+    Marks the block and all sub-blocks to have their scopes resolved lazily.
+    
+    A block is resolved (as by `augment_scopes`, storing the scopes in the
+    given `Augmentation`) the first time its local variables or the scope
+    of one of its names is queried. Enclosing blocks are resolved first, 
+    if they have not been already.
+    """
+    stack = [block]
+    while stack:
+        block = stack.pop()
+        block._pending = augmentation
+        stack.extend(block._children)
+        
+        
+def resolve_pending(block):
+    """
+    Resolves the block, and the enclosing blocks it depends on, if they
+    are marked by `defer_scopes`.
+    """
+    if block._pending is None:
+        return
+    
+    chain = []
+    b = block
+    while b is not None:
+        chain.append(b)
+        b = b.parent
+    chain.reverse()
+    
+    for i, b in enumerate(chain):
+        if b._pending is not None:
+            if _profile.active:
+                start = _profile.timer()
+                _assign_scopes_profiled(b, chain[:i], b._pending)
+                _profile.add(scope_seconds=_profile.timer() - start)
+            else:
+                _assign_scopes(b, chain[:i], b._pending)
+                
+                
+def resolve_closures(block):
+    """
+    Resolves the block and the blocks nested inside it, if they are marked by
+    `defer_scopes`, and sets their free and cell variables.
+    """
+    resolve_pending(block)
+    stack = list(block._children)
+    while stack:
+        b = stack.pop()
+        resolve_pending(b)
+        stack.extend(b._children)
+    _close(block)
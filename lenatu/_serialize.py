@@ -0,0 +1,281 @@
+"""
+Compact binary format for the block and scope information of a tree.
+
+The format does not contain the tree itself. The nodes are referred to by
+their position in the order `_block._walk` visits them, which is the same
+for every tree parsed from the same source (with the same version of Python).
+So the information can be sent to another process, or stored, and attached
+to a tree that was parsed there again.
+
+The data consists of a header followed by a `marshal`-ed tuple::
+
+    (identifiers, node count, blocks, executed, defined, accesses)
+
+`identifiers` is the table of all identifiers and attribute names, the
+other entries refer to them by index. `blocks`, `executed`, `defined` and
+`accesses` are arrays of integers:
+
+* `blocks`: for each block in depth-first order, the position of the definer,
+  the index of the parent block (or -1), the number of local variables
+  followed by their identifiers, and the number of accesses.
+* `executed`: `(position, block)` pairs. The nodes from that position up to
+  the next pair are executed in the block (-1 for none).
+* `defined`: `(position, block)` pairs for all nodes with a `defined_block`.
+* `accesses`: the accesses of all blocks, in the order of `blocks`. Each is
+  the position of the node, the attribute, the usage, and either -1 followed
+  by the identifier and the block it is bound to, or the number of
+  identifiers followed by the identifiers and the blocks.
+"""
+import array
+import marshal
+import struct
+import sys
+
+from lenatu import _facts as facts
+from lenatu._augmentation import Augmentation
+from lenatu._block import Block, _plan, _walk
+from lenatu import _scope
+from lenatu._scope import resolve_pending
+
+try:
+    _intern = sys.intern
+except AttributeError:
+    _intern = intern  # @UndefinedVariable (Python 2)
+
+
+_MAGIC = b"LNTU"
+
+#: Version of the format. Data of other versions is rejected.
+_FORMAT = 2
+
+#: magic, format, Python major and minor version, big-endian flag, item size
+_HEADER = struct.Struct("<4sBBBBB")
+
+_TYPECODE = "i"
+
+_USAGES = (facts.ASSIGNED, facts.READ, facts.GLOBAL, facts.NONLOCAL)
+
+
+def serialize(augmented):
+    """
+    Returns the block and scope information of an augmented tree as `bytes`.
+    
+    :param augmented: Either the root node of a tree augmented in-place, or
+        an `Augmentation`.
+    """
+    if isinstance(augmented, Augmentation):
+        node = augmented.node
+        executed_in = augmented.executed_in
+        defined_block = augmented.defined_block
+        name_block = augmented.name_block
+    else:
+        node = augmented
+        executed_in = lambda n: getattr(n, "executed_in", None)
+        defined_block = lambda n: getattr(n, "defined_block", None)
+        name_block = lambda n, attribute: getattr(n, attribute + "_block")
+    
+    nodes = list(_walk(node))
+    positions = dict((id(n), i) for i, n in enumerate(nodes))
+    
+    identifiers = []
+    identifier_ids = {}
+    def identifier(value):
+        i = identifier_ids.get(value)
+        if i is None:
+            i = identifier_ids[value] = len(identifiers)
+            identifiers.append(value)
+        return i
+    
+    blocks = []
+    stack = [defined_block(node)]
+    while stack:
+        block = stack.pop()
+        resolve_pending(block)
+        blocks.append(block)
+        stack.extend(reversed(block._children))
+    block_ids = dict((id(b), i) for i, b in enumerate(blocks))
+    
+    block_data = array.array(_TYPECODE)
+    access_data = array.array(_TYPECODE)
+    for block in blocks:
+        block_data.append(positions[id(block.defined_by)])
+        block_data.append(-1 if block.parent is None else block_ids[id(block.parent)])
+        block_data.append(len(block._ordered_local_variables))
+        block_data.extend(identifier(v) for v in block._ordered_local_variables)
+        block_data.append(len(block._accesses))
+        
+        for n, attribute, value, usage in block._accesses:
+            access_data.append(positions[id(n)])
+            access_data.append(identifier(attribute))
+            access_data.append(_USAGES.index(usage))
+            scope = name_block(n, attribute)
+            if isinstance(value, list):
+                access_data.append(len(value))
+                access_data.extend(identifier(v) for v in value)
+                access_data.extend(block_ids[id(s)] for s in scope)
+            else:
+                access_data.append(-1)
+                access_data.append(identifier(value))
+                access_data.append(block_ids[id(scope)])
+    
+    executed_data = array.array(_TYPECODE)
+    defined_data = array.array(_TYPECODE)
+    current = -1
+    for i, n in enumerate(nodes):
+        block = executed_in(n)
+        b = -1 if block is None else block_ids[id(block)]
+        if b != current or i == 0:
+            executed_data.append(i)
+            executed_data.append(b)
+            current = b
+        block = defined_block(n)
+        if block is not None:
+            defined_data.append(i)
+            defined_data.append(block_ids[id(block)])
+    
+    header = _HEADER.pack(_MAGIC, _FORMAT, sys.version_info[0], sys.version_info[1],
+                          sys.byteorder == "big", block_data.itemsize)
+    return header + marshal.dumps((tuple(identifiers), len(nodes),
+                                   _to_bytes(block_data), _to_bytes(executed_data),
+                                   _to_bytes(defined_data), _to_bytes(access_data)))
+
+
+def deserialize(data, node, inplace=True):
+    """
+    Attaches the information returned by `serialize` to a tree parsed from
+    the same source.
+    
+    The result is the same as `lenatu.augment(node, inplace)`: the attributes
+    are set on the nodes, or an `Augmentation` is returned if `inplace` is
+    false.
+    
+    Raises `ValueError` if the data is not in a supported format, or if it
+    does not match the tree.
+    """
+    identifiers, count, block_data, executed_data, defined_data, access_data = _decode(data)
+    
+    nodes = list(_walk(node))
+    if len(nodes) != count:
+        raise ValueError("The tree does not match the serialized data")
+    
+    augmentation = None if inplace else Augmentation(node)
+    
+    blocks = []
+    access_counts = []
+    i = 0
+    while i < len(block_data):
+        definer = nodes[block_data[i]]
+        if not _plan(type(definer))[0]:
+            raise ValueError("The tree does not match the serialized data")
+        parent = None if block_data[i + 1] < 0 else blocks[block_data[i + 1]]
+        block = Block(definer, parent)
+        if parent is not None:
+            parent._children.append(block)
+        n = block_data[i + 2]
+        local_variables = tuple(identifiers[v] for v in block_data[i + 3:i + 3 + n])
+        block._ordered_local_variables = local_variables
+        block._local_variables = frozenset(local_variables)
+        access_counts.append(block_data[i + 3 + n])
+        blocks.append(block)
+        i += n + 4
+    
+    i = 0
+    for block, accesses in zip(blocks, access_counts):
+        all_usages = _scope._OrderedDict()
+        scope_map = {}
+        for _ in range(accesses):
+            n = nodes[access_data[i]]
+            attribute = identifiers[access_data[i + 1]]
+            usage = _USAGES[access_data[i + 2]]
+            length = access_data[i + 3]
+            value = getattr(n, attribute, None)
+            if length < 0:
+                expected = identifiers[access_data[i + 4]]
+                scope = blocks[access_data[i + 5]]
+                i += 6
+            else:
+                expected = [identifiers[v] for v in access_data[i + 4:i + 4 + length]]
+                scope = [blocks[b] for b in access_data[i + 4 + length:i + 4 + 2 * length]]
+                i += 4 + 2 * length
+            if value != expected:
+                raise ValueError("The tree does not match the serialized data")
+            block._accesses.append((n, attribute, value, usage))
+            if length < 0:
+                all_usages.setdefault(value, set()).add(usage)
+                scope_map[value] = scope
+            else:
+                for v, b in zip(value, scope):
+                    all_usages.setdefault(v, set()).add(usage)
+                    scope_map[v] = b
+            if augmentation is None:
+                setattr(n, attribute + "_block", scope)
+            else:
+                name_blocks = augmentation._name_blocks.get(attribute)
+                if name_blocks is None:
+                    name_blocks = augmentation._name_blocks[attribute] = {}
+                name_blocks[id(n)] = scope
+        _scope._own_variables(block, all_usages, scope_map, blocks[0])
+    _scope._close(blocks[0])
+    
+    for j in range(0, len(executed_data), 2):
+        b = executed_data[j + 1]
+        if b < 0:
+            continue
+        block = blocks[b]
+        end = executed_data[j + 2] if j + 2 < len(executed_data) else len(nodes)
+        for n in nodes[executed_data[j]:end]:
+            if augmentation is None:
+                n.executed_in = block
+            else:
+                augmentation._executed_in[id(n)] = block
+    
+    for j in range(0, len(defined_data), 2):
+        n = nodes[defined_data[j]]
+        if augmentation is None:
+            n.defined_block = blocks[defined_data[j + 1]]
+        else:
+            augmentation._defined_block[id(n)] = blocks[defined_data[j + 1]]
+    
+    return augmentation
+
+
+def _decode(data):
+    """
+    Checks the header and returns the entries of the data, with the arrays
+    converted to lists (which are faster to index).
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("Not serialized lenatu data")
+    magic, version, major, minor, big_endian, itemsize = _HEADER.unpack(data[:_HEADER.size])
+    if magic != _MAGIC:
+        raise ValueError("Not serialized lenatu data")
+    if version != _FORMAT:
+        raise ValueError("Unsupported format version %i" % version)
+    if (major, minor) != sys.version_info[:2]:
+        raise ValueError("Serialized for the AST of Python %i.%i" % (major, minor))
+    
+    identifiers, count, block_data, executed_data, defined_data, access_data = marshal.loads(data[_HEADER.size:])
+    identifiers = tuple(_intern(i) for i in identifiers)
+    
+    swap = bool(big_endian) != (sys.byteorder == "big")
+    arrays = []
+    for raw in (block_data, executed_data, defined_data, access_data):
+        a = array.array(_TYPECODE)
+        if a.itemsize != itemsize:
+            raise ValueError("Serialized with %i byte integers" % itemsize)
+        _from_bytes(a, raw)
+        if swap:
+            a.byteswap()
+        arrays.append(a.tolist())
+    return (identifiers, count) + tuple(arrays)
+
+
+def _to_bytes(a):
+    return a.tobytes() if hasattr(a, "tobytes") else a.tostring()
+
+
+def _from_bytes(a, raw):
+    if hasattr(a, "frombytes"):
+        a.frombytes(raw)
+    else:
+        a.fromstring(raw)
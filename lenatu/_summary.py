@@ -0,0 +1,95 @@
+import ast
+import collections
+
+from lenatu._augmentation import Augmentation
+from lenatu._block import augment_blocks
+from lenatu._scope import augment_scopes
+
+
+#: Scope information of one file. Only holds plain data, so it can be pickled
+#: and sent between processes without the tree.
+#:
+#: `path` is the file (or whatever name the source was given), `error` is
+#: `None` or a message if the file could not be analyzed. `blocks` and `names`
+#: are lists of `BlockSummary` and `NameSummary` (empty on error).
+ModuleSummary = collections.namedtuple("ModuleSummary", "path error blocks names")
+
+#: A block of the file. `index` is the position in `ModuleSummary.blocks`
+#: (blocks are in depth-first order, so the module is 0) and `parent` the
+#: index of the enclosing block (`None` for the module). `kind` is the
+#: name of the definer's type and `name` its name, if it has one.
+BlockSummary = collections.namedtuple("BlockSummary", 
+                                      "index parent kind name lineno col_offset local_variables")
+
+#: An identifier referring to a variable. `kind` is the name of the type of
+#: the node, `attribute` the attribute of that node holding the identifier,
+#: `usage` one of the usages of `lenatu._facts` and `block` the index of the block
+#: the variable is bound to.
+NameSummary = collections.namedtuple("NameSummary", 
+                                     "lineno col_offset kind attribute identifier usage block")
+
+
+def summarize(node, path=None):
+    """
+    Augments the tree (without modifying it) and returns a `ModuleSummary`.
+    """
+    augmentation = Augmentation(node)
+    augment_blocks(node, augmentation)
+    augment_scopes(augmentation.block, augmentation=augmentation)
+    
+    # Depth-first numbering of the blocks.
+    blocks = []
+    indices = {}
+    stack = [(augmentation.block, None)]
+    while stack:
+        block, parent = stack.pop()
+        indices[block] = len(blocks)
+        blocks.append((block, parent))
+        for child in reversed(block._children):
+            stack.append((child, indices[block]))
+    
+    block_summaries = []
+    name_summaries = []
+    for index, (block, parent) in enumerate(blocks):
+        definer = block.defined_by
+        block_summaries.append(BlockSummary(index, parent, type(definer).__name__,
+                                            getattr(definer, "name", None),
+                                            getattr(definer, "lineno", None),
+                                            getattr(definer, "col_offset", None),
+                                            block.ordered_local_variables))
+        
+        for n, attribute, value, usage in block._accesses:
+            scope = augmentation.name_block(n, attribute)
+            if not isinstance(value, list):
+                value, scope = [value], [scope]
+            for identifier, s in zip(value, scope):
+                name_summaries.append(NameSummary(getattr(n, "lineno", None),
+                                                  getattr(n, "col_offset", None),
+                                                  type(n).__name__, attribute, identifier, 
+                                                  usage, indices[s]))
+    return ModuleSummary(path, None, block_summaries, name_summaries)
+
+
+def summarize_source(source, path=None):
+    """
+    Parses and summarizes the source. Errors while parsing are reported
+    in the returned `ModuleSummary` instead of being raised.
+    """
+    try:
+        node = ast.parse(source, "<unknown>" if path is None else path)
+    except (SyntaxError, ValueError, TypeError, RuntimeError) as e:
+        return ModuleSummary(path, "%s: %s" % (type(e).__name__, e), [], [])
+    return summarize(node, path)
+
+
+def summarize_path(path):
+    """
+    Reads, parses and summarizes the file. Errors are reported in the
+    returned `ModuleSummary` instead of being raised.
+    """
+    try:
+        with open(path, "rb") as f:
+            source = f.read()
+    except (IOError, OSError) as e:
+        return ModuleSummary(path, "%s: %s" % (type(e).__name__, e), [], [])
+    return summarize_source(source, path)
@@ -0,0 +1,176 @@
+"""
+Scope backend that takes the classification of variables from the 
+`symtable` module, so that it agrees with CPython. It is slower than the
+pure scope pass, as the source is compiled again.
+"""
+import ast
+import collections
+import symtable
+
+from lenatu import _facts as facts
+
+
+#: Types of the symbol tables of comprehensions. Lenatu does not treat them
+#: as blocks, their variables belong to the enclosing block.
+_COMPREHENSIONS = ("listcomp", "setcomp", "dictcomp")
+
+#: Compile mode for the types of top-level nodes.
+_MODES = {ast.Module: "exec", ast.Expression: "eval", ast.Interactive: "single"}
+
+
+#: What the symbol table says about the variables used in one block.
+#:
+#: `locals` are the variables local to the block, `flags` maps the variables 
+#: declared `global` or `nonlocal` to a usage set (as used by `_scope_lookup`)
+#: and `deferred` are names on which lenatu and the symbol table may
+#: disagree. For those, and for names the table does not know (such as the
+#: dotted name in `import a.b`), the block's own usages are used instead.
+#: `bound` are the targets of assignment expressions in the generator 
+#: expressions nested in the block, which bind in the block even if it does
+#: not use them itself.
+SymbolInfo = collections.namedtuple("SymbolInfo", "locals flags deferred bound")
+
+_GLOBAL = frozenset([facts.GLOBAL])
+_NONLOCAL = frozenset([facts.NONLOCAL])
+_NO_FLAGS = frozenset()
+
+
+def _key(block):
+    """
+    Returns the key the symbol table of the block's definer is matched by.
+    """
+    definer = block.defined_by
+    if isinstance(definer, ast.ClassDef):
+        return ("class", definer.name, definer.lineno)
+    elif isinstance(definer, ast.Lambda):
+        return ("function", "lambda", definer.lineno)
+    elif isinstance(definer, ast.GeneratorExp):
+        return ("function", "genexpr", definer.lineno)
+    else:
+        return ("function", definer.name, definer.lineno)
+    
+
+def _info(tables):
+    """
+    Returns the `SymbolInfo` for a table, merged with the tables of the
+    comprehensions executed in it.
+    """
+    local_variables = set()
+    flags = {}
+    deferred = set()
+    for table in tables:
+        comprehension = table.get_type() == "function" and table.get_name() in _COMPREHENSIONS
+        for symbol in table.get_symbols():
+            name = symbol.get_name()
+            if name.startswith("."):
+                continue # implicit parameter of comprehensions
+            if symbol.is_imported():
+                # The table knows `a` for `import a.b`, lenatu `a.b`.
+                deferred.add(name)
+            elif symbol.is_declared_global() and table.get_type() != "module":
+                # Checked before `is_local`, which Python 2 also reports for 
+                # assigned globals.
+                if not comprehension:
+                    flags[name] = _GLOBAL
+            elif getattr(symbol, "is_nonlocal", lambda: False)():
+                # In a comprehension, this is the target of an assignment
+                # expression. The enclosing table has it as well.
+                if not comprehension:
+                    flags[name] = _NONLOCAL
+            elif symbol.is_local() and not symbol.is_free():
+                # Before `is_nonlocal` (Python 3.7), assigned nonlocal 
+                # variables are local and free. They are deferred below.
+                local_variables.add(name)
+            elif symbol.is_assigned() and not comprehension:
+                # Assignment expressions in generator expressions bind in the
+                # enclosing function, lenatu binds them in the generator.
+                deferred.add(name)
+    # A variable of a comprehension is also one of the enclosing block
+    # for lenatu, including its declaration there.
+    local_variables.difference_update(deferred, flags)
+    return SymbolInfo(frozenset(local_variables), flags, frozenset(deferred), ())
+
+
+def _children(table):
+    """
+    Returns the child tables that are blocks for lenatu and the comprehension
+    tables whose variables belong to `table`.
+    """
+    children = []
+    comprehensions = []
+    stack = list(reversed(table.get_children()))
+    while stack:
+        child = stack.pop()
+        if child.get_type() == "function" and child.get_name() in _COMPREHENSIONS:
+            comprehensions.append(child)
+            stack.extend(reversed(child.get_children()))
+        else:
+            children.append(child)
+    return children, comprehensions
+
+
+def symbol_infos(block, source, filename="<unknown>"):
+    """
+    Compiles the symbol table of the source and matches it to the given
+    top-level block and its sub-blocks.
+    
+    Returns a dict mapping blocks to their `SymbolInfo`. Blocks (and their
+    sub-blocks) that could not be matched to a table are missing. The dict 
+    is empty if the compiler rejects the source, which it does for some 
+    code `ast.parse` accepts (such as an unknown `__future__` feature).
+    """
+    try:
+        top = symtable.symtable(source, filename, _MODES.get(type(block.defined_by), "exec"))
+    except SyntaxError:
+        return {}
+    
+    infos = {}
+    top_block = block
+    stack = [(block, top)]
+    while stack:
+        block, table = stack.pop()
+        children, comprehensions = _children(table)
+        infos[block] = _info([table] + comprehensions)
+        
+        by_key = collections.defaultdict(collections.deque)
+        for child in children:
+            by_key[(child.get_type(), child.get_name(), child.get_lineno())].append(child)
+        for child_block in block._children:
+            candidates = by_key.get(_key(child_block))
+            if candidates:
+                stack.append((child_block, candidates.popleft()))
+    _bind_generator_targets(top_block, infos)
+    return infos
+
+
+def _bind_generator_targets(block, infos):
+    """
+    Adds the targets of assignment expressions in generator expressions to
+    the `bound` variables of the block they bind in: the closest enclosing
+    block that is not a generator expression.
+    
+    The table of a generator expression has them as `nonlocal`, or as 
+    `global` if they bind in the module. Generator expressions cannot 
+    declare variables, so there is no other source of these.
+    """
+    bound = collections.defaultdict(list)
+    stack = [block]
+    while stack:
+        block = stack.pop()
+        stack.extend(reversed(block._children))
+        info = infos.get(block)
+        if info is None or not isinstance(block.defined_by, ast.GeneratorExp):
+            continue
+        target = block.parent
+        while target is not None and isinstance(target.defined_by, ast.GeneratorExp):
+            target = target.parent
+        target_info = infos.get(target)
+        if target_info is None:
+            continue
+        module = isinstance(target.defined_by, ast.Module)
+        for name, usages in info.flags.items():
+            if usages is _GLOBAL and module or usages is _NONLOCAL and name in target_info.locals:
+                if name not in bound[target]:
+                    bound[target].append(name)
+    for target, names in bound.items():
+        infos[target] = infos[target]._replace(bound=tuple(names))
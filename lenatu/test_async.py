@@ -0,0 +1,92 @@
+import unittest
+import ast
+import sys
+import lenatu
+from lenatu import tools
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from concurrent import futures
+
+
+class TestAugmentAsync(unittest.TestCase):
+
+    src = tools.unindent("""
+    import os
+    x = 1
+    def f(a, *b):
+        y = a
+        def g():
+            return [y for y in b] + list(z for z in x)
+        return lambda z=y: z
+    class C(object):
+        m = 1
+    """) * 20
+    
+    def setUp(self):
+        if sys.version_info >= (3, 5):
+            self.loop = asyncio.new_event_loop()
+    
+    def tearDown(self):
+        if sys.version_info >= (3, 5):
+            self.loop.close()
+    
+    @tools.version("3.5+")
+    def test_inplace(self):
+        node = ast.parse(self.src)
+        self.assertIsNone(self.loop.run_until_complete(lenatu.augment_async(node, slice_size=10)))
+        self.assertEqual(tools.scopes(self.expected()), tools.scopes(node))
+    
+    @tools.version("3.5+")
+    def test_augmentation(self):
+        node = ast.parse(self.src)
+        augmentation = self.loop.run_until_complete(lenatu.augment_async(node, inplace=False))
+        self.assertEqual(self.untouched(), tools.scopes(node))
+        augmentation.apply()
+        self.assertEqual(tools.scopes(self.expected()), tools.scopes(node))
+    
+    @tools.version("3.5+")
+    def test_executor(self):
+        node = ast.parse(self.src)
+        with futures.ThreadPoolExecutor(1) as executor:
+            self.loop.run_until_complete(lenatu.augment_async(node, executor=executor))
+        self.assertEqual(tools.scopes(self.expected()), tools.scopes(node))
+    
+    @tools.version("3.5+")
+    def test_process_executor(self):
+        node = ast.parse(self.src)
+        with futures.ProcessPoolExecutor(1) as executor:
+            self.assertRaises(ValueError, self.loop.run_until_complete,
+                              lenatu.augment_async(node, executor=executor))
+        self.assertEqual(self.untouched(), tools.scopes(node))
+    
+    @tools.version("3.5+")
+    def test_cancel(self):
+        node = ast.parse(self.src)
+        task = self.loop.create_task(lenatu.augment_async(node, slice_size=10))
+        for _ in range(20):
+            self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertFalse(task.done())
+        task.cancel()
+        self.assertRaises(asyncio.CancelledError, self.loop.run_until_complete, task)
+        self.assertEqual(self.untouched(), tools.scopes(node))
+    
+    @tools.version("3.5+")
+    def test_timeout(self):
+        node = ast.parse(self.src)
+        self.assertRaises(asyncio.TimeoutError, self.loop.run_until_complete,
+                          lenatu.augment_async(node, slice_size=1, timeout=0.001))
+        self.assertEqual(self.untouched(), tools.scopes(node))
+    
+    @tools.version("3.5+")
+    def test_not_a_module(self):
+        self.assertRaises(ValueError, self.loop.run_until_complete,
+                          lenatu.augment_async(ast.parse("x").body[0]))
+    
+    def expected(self):
+        node = ast.parse(self.src)
+        lenatu.augment(node)
+        return node
+    
+    def untouched(self):
+        return tools.scopes(ast.parse(self.src))
@@ -0,0 +1,95 @@
+import unittest
+from lenatu import tools
+import ast
+import lenatu
+
+
+class TestAugmentation(unittest.TestCase):
+    
+    src = tools.unindent("""
+    import os
+    x = 1
+    def f(a, *b, **c):
+        global x
+        y = a
+        def g():
+            nonlocal y
+            return y + x
+        return lambda z: z
+    class C():
+        m = 1
+    """)
+    
+    @tools.version("3.0+")
+    def test_tree_untouched(self):
+        node = ast.parse(self.src)
+        lenatu.augment(node, inplace=False)
+        for n in ast.walk(node):
+            for attribute in vars(n):
+                self.assertFalse(attribute == "executed_in" or 
+                                 attribute == "defined_block" or 
+                                 attribute.endswith("_block"), 
+                                 "%r has %r" % (n, attribute))
+    
+    @tools.version("3.0+")
+    def test_same_as_inplace(self):
+        self.assertSameAsInplace(lazy=False)
+        
+    @tools.version("3.0+")
+    def test_lazy_same_as_inplace(self):
+        self.assertSameAsInplace(lazy=True)
+        
+    @tools.version("3.0+")
+    def test_lazy_resolves_on_demand(self):
+        node = ast.parse(self.src)
+        augmentation = lenatu.augment(node, inplace=False, lazy=True)
+        f = tools.npath(node, ".**{name=f}")
+        g = tools.npath(node, ".**{name=g}")
+        c = tools.npath(node, ".**{name=C}")
+        
+        y = tools.npath(g, ".**{id=y}")
+        self.assertIs(augmentation.defined_block(f), augmentation.name_block(y, "id"))
+        
+        self.assertIsNotNone(augmentation.defined_block(c)._pending)
+        self.assertIsNone(augmentation.defined_block(f)._pending)
+        self.assertIsNone(augmentation.block._pending)
+        
+        self.assertEqual(frozenset(["m"]), augmentation.defined_block(c).local_variables)
+        self.assertIsNone(augmentation.defined_block(c)._pending)
+        
+    @tools.version("3.0+")
+    def test_lazy_requires_tables(self):
+        self.assertRaises(ValueError, lenatu.augment, ast.parse(self.src), lazy=True)
+        
+    def assertSameAsInplace(self, lazy):
+        inplace = ast.parse(self.src)
+        lenatu.augment(inplace)
+        node = ast.parse(self.src)
+        augmentation = lenatu.augment(node, inplace=False, lazy=lazy)
+        
+        blocks = {}
+        def same(a, b):
+            if isinstance(a, list):
+                self.assertEqual(len(a), len(b))
+                for x, y in zip(a, b):
+                    same(x, y)
+            elif a is None:
+                self.assertIsNone(b)
+            else:
+                self.assertIs(blocks.setdefault(a, b), b)
+                self.assertEqual(a.local_variables, b.local_variables)
+        
+        for a, b in zip(ast.walk(inplace), ast.walk(node)):
+            same(getattr(a, "executed_in", None), augmentation.executed_in(b))
+            same(getattr(a, "defined_block", None), augmentation.defined_block(b))
+            for attribute, _ in ast.iter_fields(a):
+                same(getattr(a, attribute + "_block", None), augmentation.name_block(b, attribute))
+        self.assertIs(blocks[inplace.defined_block], augmentation.block)
+                
+    @tools.version("3.0+")
+    def test_apply(self):
+        node = ast.parse(self.src)
+        augmentation = lenatu.augment(node, inplace=False)
+        augmentation.apply()
+        self.assertIs(augmentation.block, node.defined_block)
+        self.assertIs(augmentation.block, tools.npath(node, ".**{name=g}.**{id=x}.id_block"))
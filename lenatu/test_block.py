@@ -281,6 +281,40 @@ class BlockDetector(unittest.TestCase):
 
         
         
+    @tools.version("3.8+")
+    def test_deep_expression(self):
+        depth = 20000
+        expr = ast.Name(id="a", ctx=ast.Load())
+        for _ in range(depth):
+            expr = ast.BinOp(left=expr, op=ast.Add(), right=ast.Name(id="a", ctx=ast.Load()))
+        node = ast.Module(body=[ast.Expr(value=expr)], type_ignores=[])
+        lenatu.augment(node)
+        
+        innermost = expr
+        while isinstance(innermost, ast.BinOp):
+            innermost = innermost.left
+        self.assertIs(node.defined_block, innermost.executed_in)
+        self.assertIs(node.defined_block, innermost.id_block)
+        
+    @tools.version("3.8+")
+    def test_deep_functions(self):
+        depth = 5000
+        body = [ast.Expr(value=ast.Name(id="x", ctx=ast.Load()))]
+        for i in range(depth):
+            func = ast.FunctionDef(name="f%i" % i, args=_no_arguments(), body=body,
+                                   decorator_list=[], returns=None, type_comment=None)
+            body = [func]
+        body.insert(0, ast.Assign(targets=[ast.Name(id="x", ctx=ast.Store())], 
+                                  value=ast.Name(id="y", ctx=ast.Load()), type_comment=None))
+        outer = ast.FunctionDef(name="outer", args=_no_arguments(), body=body,
+                                decorator_list=[], returns=None, type_comment=None)
+        node = ast.Module(body=[outer], type_ignores=[])
+        lenatu.augment(node)
+        
+        innermost = outer.body[1]
+        while isinstance(innermost.body[0], ast.FunctionDef):
+            innermost = innermost.body[0]
+        self.assertIs(outer.defined_block, innermost.body[0].value.id_block)
               
     def get(self, src, path):
         node = self.parse(src)
@@ -306,4 +340,9 @@ class BlockDetector(unittest.TestCase):
             self.cache[src] = node
         else:
             node = self.cache[src]
-        return node
\ No newline at end of file
+        return node
+
+
+def _no_arguments():
+    return ast.arguments(posonlyargs=[], args=[], vararg=None, kwonlyargs=[], 
+                         kw_defaults=[], kwarg=None, defaults=[])
@@ -0,0 +1,87 @@
+import os
+import lenatu
+from lenatu import tools, _summary
+
+
+class TestSummaryCache(tools.FilesTestCase):
+    
+    def setUp(self):
+        super(TestSummaryCache, self).setUp()
+        self.cache = lenatu.SummaryCache(self.directory)
+        
+    def test_miss_then_hit(self):
+        src = b"x = 1\ndef f(y):\n    return x + y\n"
+        first = self.cache.summarize_source(src, "a.py")
+        self.assertEqual((0, 1), (self.cache.hits, self.cache.misses))
+        second = self.cache.summarize_source(src, "b.py")
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+        self.assertEqual(first._replace(path="b.py"), second)
+        
+    def test_error_cached(self):
+        src = b"def (:"
+        first = self.cache.summarize_source(src, "a.py")
+        self.assertEqual(first, self.cache.summarize_source(src, "a.py"))
+        self.assertEqual(1, self.cache.hits)
+        
+    def test_key_depends_on_source(self):
+        self.assertNotEqual(self.cache.key(b"x=1"), self.cache.key(b"x=2"))
+        self.assertEqual(self.cache.key(b"x=1"), lenatu.SummaryCache(self.directory).key("x=1"))
+        
+    def test_corrupt_entry_is_miss(self):
+        src = b"x = 1"
+        self.cache.summarize_source(src)
+        entry = self.cache._path(self.cache.key(src))
+        with open(entry, "wb") as f:
+            f.write(b"garbage")
+        self.assertIsNone(self.cache.get(src))
+        self.assertEqual(2, self.cache.misses)
+        
+    def test_eviction(self):
+        sources = [("v%i = %i\n" % (i, i)).encode("ascii") for i in range(20)]
+        self.cache.summarize_source(sources[0])
+        entry_size = os.path.getsize(self.cache._path(self.cache.key(sources[0])))
+        self.cache.max_bytes = 5 * entry_size
+        for i, src in enumerate(sources[1:]):
+            self.cache.summarize_source(src)
+            os.utime(self.cache._path(self.cache.key(src)), (i + 1, i + 1))
+        self.assertTrue(self.cache.evictions > 0)
+        self.assertTrue(self.cache._scan_size() <= self.cache.max_bytes)
+        self.assertIsNotNone(self.cache.get(sources[-1]))
+        
+    def test_eviction_sees_other_processes(self):
+        self.cache.max_bytes = 16 * 1024
+        for i in range(2):
+            self.cache.summarize_source(("v%i = %i\n" % (i, i)).encode("ascii"))
+        # Entries written by another process, which this one does not know of.
+        os.makedirs(os.path.join(self.directory, "zz"))
+        for i in range(4):
+            with open(os.path.join(self.directory, "zz", "%i.lenatu" % i), "wb") as f:
+                f.write(b"x" * 4096)
+        for i in range(2, 200):
+            self.cache.summarize_source(("v%i = %i\n" % (i, i)).encode("ascii"))
+        self.assertTrue(self.cache.evictions > 0)
+        self.assertTrue(self.cache._scan_size() <= self.cache.max_bytes * 17 // 16)
+        
+    @tools.version("3.2+")
+    def test_augment_paths(self):
+        path = os.path.join(self.directory, "m.py")
+        with open(path, "w") as f:
+            f.write("import os\n")
+        first, = lenatu.augment_paths([path], workers=1, cache=self.cache)
+        second, = lenatu.augment_paths([path], workers=2, cache=self.cache)
+        self.assertEqual(first, second)
+        self.assertEqual(_summary.summarize_path(path), first)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+        
+    @tools.version("3.2+")
+    def test_evictions_of_workers(self):
+        directory = os.path.join(self.directory, "src")
+        os.makedirs(directory)
+        for i in range(20):
+            with open(os.path.join(directory, "m%i.py" % i), "w") as f:
+                f.write("v%i = %i\n" % (i, i))
+        lenatu.augment_paths([directory], workers=1, cache=self.cache)
+        self.cache.max_bytes = self.cache._scan_size() // 4
+        self.cache.clear()
+        list(lenatu.augment_paths([directory], workers=2, chunksize=5, cache=self.cache))
+        self.assertTrue(self.cache.evictions > 0)
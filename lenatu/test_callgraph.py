@@ -0,0 +1,117 @@
+import unittest
+import ast
+import os
+import lenatu
+from lenatu import tools
+
+
+class TestModuleCalls(unittest.TestCase):
+
+    def test_kinds(self):
+        src = """
+        import os.path
+        from . import sibling as s
+        def f():
+            def g():
+                pass
+            g()
+            h()
+            len(f)
+            os.path.join()
+            s.run()
+            f()()
+        def h():
+            pass
+        """
+        calls = self.calls(src, "pkg.mod")
+        self.assertEqual([("pkg.mod.f", "pkg.mod.f.<locals>.g", "local"),
+                          ("pkg.mod.f", "pkg.mod.h", "global"),
+                          ("pkg.mod.f", "builtins.len", "builtin"),
+                          ("pkg.mod.f", "os.path.join", "imported"),
+                          ("pkg.mod.f", "pkg.sibling.run", "imported"),
+                          ("pkg.mod.f", None, "unresolved"),
+                          ("pkg.mod.f", "pkg.mod.f", "global")],
+                         [(c.caller, c.callee, c.kind) for c in calls.calls])
+        self.assertEqual(("pkg.mod.f", "pkg.mod.f.<locals>.g", "pkg.mod.h"), calls.definitions)
+        self.assertEqual({"os": "os", "s": "pkg.sibling"}, calls.imports)
+    
+    def test_enclosing(self):
+        src = """
+        class C(object):
+            def m(self):
+                def helper():
+                    pass
+                return [lambda: helper()]
+        """
+        calls = self.calls(src, "mod")
+        self.assertEqual([("mod.C.m.<locals>.<lambda>", "mod.C.m.<locals>.helper", "enclosing")],
+                         [(c.caller, c.callee, c.kind) for c in calls.calls])
+    
+    def test_relative_import_in_package(self):
+        src = """
+        from .a import b
+        from ..c import d as e
+        b()
+        e()
+        """
+        calls = self.calls(src, "pkg.sub", is_package=True)
+        self.assertEqual(["pkg.sub.a.b", "pkg.c.d"], [c.callee for c in calls.calls])
+    
+    def test_augmentation(self):
+        src = "def f():\n    f()\n"
+        node = ast.parse(src)
+        augmentation = lenatu.augment(node, inplace=False)
+        self.assertEqual(self.calls(src, "m"), lenatu.module_calls(node, "m", augmentation=augmentation))
+    
+    def calls(self, src, module, is_package=False):
+        node = ast.parse(tools.unindent(src))
+        lenatu.augment(node)
+        return lenatu.module_calls(node, module, is_package)
+
+
+class TestCallGraph(tools.FilesTestCase):
+
+    def setUp(self):
+        super(TestCallGraph, self).setUp()
+        self.package = os.path.join(self.directory, "pkg")
+        self.write("pkg/__init__.py", "from .util import helper\n")
+        self.write("pkg/util.py", "def helper():\n    return 1\n")
+        self.write("pkg/main.py", "from pkg import helper\ndef run():\n    return helper()\n")
+    
+    def test_package(self):
+        graph = lenatu.CallGraph()
+        self.assertEqual(3, graph.add_package(self.package))
+        self.assertEqual(["pkg", "pkg.main", "pkg.util"], graph.modules)
+        self.assertEqual(["pkg.util.helper"], graph.callees("pkg.main.run"))
+        self.assertEqual(["pkg.main.run"], graph.callers("pkg.util.helper"))
+        self.assertEqual(["pkg.main.run"], graph.callers("pkg.helper"))
+    
+    def test_incremental(self):
+        graph = lenatu.CallGraph()
+        graph.add_package(self.package)
+        self.assertEqual(0, graph.add_package(self.package))
+        
+        self.write("pkg/main.py", "from pkg import helper\ndef run():\n    return helper()\ndef again():\n    run()\n")
+        self.assertEqual(1, graph.add_package(self.package))
+        self.assertEqual(4, graph.computed)
+        self.assertEqual(["pkg.main.again"], graph.callers("pkg.main.run"))
+        
+        os.remove(os.path.join(self.package, "util.py"))
+        graph.add_package(self.package)
+        self.assertEqual(["pkg", "pkg.main"], graph.modules)
+        self.assertEqual(["pkg.util.helper"], graph.callees("pkg.main.run"))
+    
+    def test_unchanged_source(self):
+        graph = lenatu.CallGraph()
+        self.assertTrue(graph.add_source("m", "def f():\n    f()\n"))
+        self.assertFalse(graph.add_source("m", b"def f():\n    f()\n"))
+        self.assertEqual(1, graph.computed)
+        self.assertEqual(["m.f"], graph.callers("m.f"))
+        graph.remove("m")
+        self.assertEqual([], graph.callers("m.f"))
+    
+    def test_import_cycle(self):
+        graph = lenatu.CallGraph()
+        graph.add_source("a", "from b import x\nx()\n")
+        graph.add_source("b", "from a import x\n")
+        self.assertEqual(["b.x"], graph.callees("a"))
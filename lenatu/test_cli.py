@@ -0,0 +1,84 @@
+import json
+import os
+from lenatu import tools, _cli, _summary
+
+try:
+    from StringIO import StringIO # Python 2, where json writes `str`
+except ImportError:
+    from io import StringIO
+
+
+class TestCommandLine(tools.FilesTestCase):
+
+    def setUp(self):
+        super(TestCommandLine, self).setUp()
+        # Old enough for `--max-age`.
+        self.write("a.py", "import os\ndef f(x):\n    return x + y\n", mtime=1000000)
+        self.write("sub/b.py", "y = [z for z in ()]\n", mtime=1000000)
+        self.write("broken.py", "def (:\n", mtime=1000000)
+        self.write("notes.txt", "not python\n", mtime=1000000)
+    
+    def run_main(self, *args):
+        return self.run_main_to(StringIO(), *args)
+    
+    def run_main_to(self, out, *args):
+        status = _cli.main(list(args), out)
+        return status, [json.loads(line) for line in out.getvalue().splitlines()]
+    
+    def test_file(self):
+        status, records = self.run_main(os.path.join(self.directory, "a.py"))
+        self.assertEqual(0, status)
+        module, f, summary = records
+        self.assertEqual(("block", 0, None, "Module", ["os", "f"]),
+                         (module["record"], module["block"], module["parent"], module["kind"], module["locals"]))
+        self.assertEqual(("FunctionDef", "f", 2, 0, 0, ["x"]),
+                         (f["kind"], f["name"], f["line"], f["col"], f["parent"], f["locals"]))
+        self.assertEqual(("file", None, 2), (summary["record"], summary["error"], summary["blocks"]))
+        self.assertIn([3, 15, "y", "read", 0], summary["names"])
+        self.assertIn([3, 11, "x", "read", 1], summary["names"])
+    
+    def test_directory(self):
+        status, records = self.run_main(self.directory, "--no-names")
+        self.assertEqual(1, status)
+        files = [r for r in records if r["record"] == "file"]
+        self.assertEqual(["a.py", "broken.py", os.path.join("sub", "b.py")],
+                         [os.path.relpath(r["path"], self.directory) for r in files])
+        self.assertTrue(files[1]["error"].startswith("SyntaxError"))
+        self.assertNotIn("names", files[0])
+    
+    def test_streaming(self):
+        # The records of a file are written before the next one is analyzed.
+        out = StringIO()
+        written = []
+        summarize_path = _summary.summarize_path
+        def summarize(path):
+            written.append(len(out.getvalue().splitlines()))
+            return summarize_path(path)
+        _summary.summarize_path = summarize
+        try:
+            self.run_main_to(out, self.directory, "--no-names")
+        finally:
+            _summary.summarize_path = summarize_path
+        self.assertEqual([0, 3, 4], written)
+    
+    @tools.version("3.2+")
+    def test_jobs(self):
+        _, serial = self.run_main(self.directory)
+        _, parallel = self.run_main(self.directory, "--jobs", "2")
+        key = lambda r: (r["path"], r["record"], r.get("block"))
+        self.assertEqual(sorted(serial, key=key), sorted(parallel, key=key))
+    
+    def test_newer(self):
+        stamp = self.write("stamp", "", mtime=2000000)
+        self.write("a.py", "x = 1\n", mtime=3000000)
+        _, records = self.run_main(self.directory, "--newer", stamp)
+        self.assertEqual([os.path.join(self.directory, "a.py")], 
+                         [r["path"] for r in records if r["record"] == "file"])
+        _, records = self.run_main(self.directory, "--max-age", "60")
+        self.assertEqual([], records)
+    
+    def test_cache(self):
+        cache = os.path.join(self.directory, "cache")
+        path = os.path.join(self.directory, "a.py")
+        self.assertEqual(self.run_main(path), self.run_main(path, "--cache", cache))
+        self.assertEqual(self.run_main(path), self.run_main(path, "--cache", cache))
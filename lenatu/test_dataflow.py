@@ -0,0 +1,248 @@
+import unittest
+from lenatu import tools
+import ast
+import lenatu
+
+
+class TestDefUse(unittest.TestCase):
+
+    def test_straight(self):
+        src = """
+        def f(a):
+            x = a
+            x = x + 1
+            return x
+        """
+        self.assertEqual({("a", 1): [2], ("x", 2): [3], ("x", 3): [4]}, self.chains(src))
+    
+    def test_branches(self):
+        src = """
+        def f(a):
+            if a:
+                x = 1
+            else:
+                x = 2
+            return x
+        """
+        self.assertEqual({("a", 1): [2], ("x", 3): [6], ("x", 5): [6]}, self.chains(src))
+    
+    def test_loop(self):
+        src = """
+        def f(a):
+            x = 0
+            for i in a:
+                x = x + i
+            return x
+        """
+        self.assertEqual({("a", 1): [3], ("x", 2): [4, 5], ("i", 3): [4], ("x", 4): [4, 5]},
+                         self.chains(src))
+    
+    def test_while_break(self):
+        src = """
+        def f():
+            x = 0
+            while x:
+                if x:
+                    x = 1
+                    break
+                x = 2
+            return x
+        """
+        self.assertEqual({("x", 2): [3, 4, 8], ("x", 5): [8], ("x", 7): [3, 4, 8]}, self.chains(src))
+    
+    def test_return(self):
+        src = """
+        def f(a):
+            x = 1
+            if a:
+                x = 2
+                return x
+            return x
+        """
+        self.assertEqual({("a", 1): [3], ("x", 2): [6], ("x", 4): [5]}, self.chains(src))
+    
+    def test_augmented(self):
+        src = """
+        def f():
+            x = 1
+            x += 1
+            return x
+        """
+        self.assertEqual({("x", 2): [3], ("x", 3): [4]}, self.chains(src))
+    
+    def test_delete(self):
+        src = """
+        def f(x):
+            del x
+            x = 1
+            return x
+        """
+        self.assertEqual({("x", 1): [], ("x", 3): [4]}, self.chains(src))
+    
+    def test_try(self):
+        src = """
+        def f():
+            x = 1
+            try:
+                x = 2
+                x = 3
+            except Exception as e:
+                return x, e
+            finally:
+                y = x
+            return x
+        """
+        # The exceptional paths through `finally` continue after it too.
+        self.assertEqual({("x", 2): [7, 9, 10], ("x", 4): [7, 9, 10], ("x", 5): [7, 9, 10],
+                          ("e", 6): [7], ("y", 9): []},
+                         self.chains(src))
+    
+    def test_unreachable_else(self):
+        src = """
+        def f():
+            try:
+                return 1
+            except Exception:
+                pass
+            else:
+                y = 1
+            return y
+        """
+        self.assertEqual({("y", 7): []}, self.chains(src))
+    
+    def test_except_without_name(self):
+        src = """
+        def f():
+            try:
+                x = 1
+            except Exception:
+                x = 2
+            return x
+        """
+        self.assertEqual({("x", 3): [6], ("x", 5): [6]}, self.chains(src))
+    
+    def test_nested_blocks(self):
+        src = """
+        def f(a):
+            x = 1
+            g = lambda y=x: x + y
+            def h(b=a):
+                return x
+            return g, h
+        """
+        self.assertEqual({("a", 1): [4], ("x", 2): [3], ("g", 3): [6], ("h", 4): [6]},
+                         self.chains(src))
+    
+    def test_not_local(self):
+        src = """
+        x = 1
+        def f():
+            global x
+            x = 2
+            return x + len(x)
+        """
+        self.assertEqual({}, self.chains(src))
+    
+    def test_module(self):
+        src = """
+        import os
+        x = os.path
+        """
+        self.assertEqual({("os", 1): [2], ("x", 2): []}, self.chains(src, module=True))
+    
+    def test_lambda(self):
+        src = """
+        lambda a, b: a
+        """
+        node = ast.parse(tools.unindent(src))
+        lenatu.augment(node)
+        result = lenatu.def_use(node.body[0].value.defined_block)
+        self.assertEqual(["a", "b"], [identifier for identifier, _ in result.definitions])
+        self.assertEqual(1, len(result.uses(result.definitions[0][1])))
+    
+    def test_reaching(self):
+        src = """
+        def f(a):
+            if a:
+                x = 1
+            return x
+        """
+        node = ast.parse(tools.unindent(src))
+        lenatu.augment(node)
+        result = lenatu.def_use(node.body[0].defined_block)
+        use = node.body[0].body[1].value
+        self.assertEqual([node.body[0].body[0].body[0].targets[0]], result.reaching(use))
+        self.assertEqual(1, len(result.chains("x")))
+    
+    def test_augmentation(self):
+        src = """
+        def f(a):
+            x = a
+            return x
+        """
+        node = ast.parse(tools.unindent(src))
+        augmentation = lenatu.augment(node, inplace=False)
+        result = lenatu.def_use(augmentation.defined_block(node.body[0]), augmentation)
+        self.assertEqual({("a", 1): [2], ("x", 2): [3]}, self.describe(result, node))
+    
+    def test_cfg(self):
+        src = """
+        def f(a):
+            while a:
+                pass
+        """
+        node = ast.parse(tools.unindent(src))
+        lenatu.augment(node)
+        cfg = lenatu.control_flow_graph(node.body[0].defined_block)
+        self.assertEqual([("def", "a")], [(k, i) for k, i, _ in cfg.entry.events])
+        self.assertEqual([], cfg.exit.successors)
+        self.assertTrue(cfg.exit.predecessors)
+        for bb in cfg.basic_blocks:
+            for s in bb.successors:
+                self.assertIn(bb, s.predecessors)
+    
+    @tools.version("3.8+")
+    def test_walrus(self):
+        src = """
+        def f(a):
+            if (x := a):
+                return x
+        """
+        self.assertEqual({("a", 1): [2], ("x", 2): [3]}, self.chains(src))
+    
+    @tools.version("3.10+")
+    def test_match(self):
+        src = """
+        def f(a):
+            x = 1
+            match a:
+                case 1:
+                    x = 2
+                case _:
+                    pass
+            return x
+        """
+        self.assertEqual({("a", 1): [3], ("x", 2): [8], ("x", 5): [8]}, self.chains(src))
+    
+    def chains(self, src, module=False):
+        node = ast.parse(tools.unindent(src))
+        lenatu.augment(node)
+        block = node.defined_block if module else node.body[-1].defined_block
+        return self.describe(lenatu.def_use(block), node)
+    
+    def describe(self, result, root):
+        """
+        Returns the lines of the uses for each definition, by identifier and
+        line of the definition (the first line of the source is 0).
+        """
+        # Nodes without a line number (`ast.alias` before Python 3.10) get
+        # the one of their parent.
+        lines = {}
+        stack = [(root, 0)]
+        while stack:
+            node, line = stack.pop()
+            line = getattr(node, "lineno", line)
+            lines[id(node)] = line - 1
+            stack.extend((child, line) for child in ast.iter_child_nodes(node))
+        return dict(((identifier, lines[id(node)]), sorted(lines[id(u)] for u in result.uses(node)))
+                    for identifier, node in result.definitions)
@@ -0,0 +1,164 @@
+import unittest
+from lenatu import tools
+import ast
+import lenatu
+
+
+class TestReaugment(unittest.TestCase):
+    
+    src = tools.unindent("""
+    x = 1
+    def f(a, b=lambda: x):
+        y = a
+        def g():
+            return y
+    def h():
+        return x
+    """)
+    
+    new_body = tools.unindent("""
+    z = a + x
+    def k():
+        return z + b
+    """)
+    
+    def test_inplace(self):
+        node = ast.parse(self.src)
+        lenatu.augment(node)
+        f = tools.npath(node, ".**{name=f}")
+        h = tools.npath(node, ".**{name=h}")
+        module_block = node.defined_block
+        h_block = h.defined_block
+        lambda_block = tools.npath(f, ".args.defaults[0].defined_block")
+        
+        lenatu.reaugment(f.defined_block, ast.parse(self.new_body).body)
+        
+        self.assertIs(f, node.body[1])
+        self.assertEqual(frozenset(["a", "b", "z", "k"]), f.defined_block.local_variables)
+        self.assertEqual(("a", "b", "z", "k"), f.defined_block.ordered_local_variables)
+        self.assertIs(module_block, node.defined_block)
+        self.assertIs(h_block, h.defined_block)
+        self.assertIs(lambda_block, tools.npath(f, ".args.defaults[0].defined_block"))
+        self.assertIs(module_block, tools.npath(f, ".body[0].value.right.id_block"))
+        self.assertIs(f.defined_block, tools.npath(f, ".body[0].targets[0].executed_in"))
+        k = tools.npath(f, ".body[1]")
+        self.assertIs(f.defined_block, k.defined_block.parent)
+        self.assertIs(f.defined_block, tools.npath(k, ".**{id=z}.id_block"))
+        self.assertIs(f.defined_block, tools.npath(k, ".**{id=b}.id_block"))
+        self.assertEqual([k.defined_block], f.defined_block._children)
+        
+    def test_closure_variables(self):
+        node = ast.parse(self.src)
+        lenatu.augment(node)
+        module = node.defined_block
+        f = tools.npath(node, ".**{name=f}")
+        self.assertEqual(frozenset(["y"]), f.defined_block.cell_variables)
+        
+        outer = ast.parse(tools.unindent("""
+        def outer(a):
+            def f():
+                pass
+        """)).body[0]
+        node.body.append(outer)
+        lenatu.reaugment(module)
+        outer_f = outer.body[0]
+        
+        lenatu.reaugment(outer_f.defined_block, ast.parse("def k():\n    return a").body)
+        self.assertEqual(frozenset(["a"]), outer_f.defined_block.free_variables)
+        self.assertEqual(frozenset(["a"]), outer.defined_block.cell_variables)
+        
+        lenatu.reaugment(outer_f.defined_block, ast.parse("pass").body)
+        self.assertEqual(frozenset(), outer_f.defined_block.free_variables)
+        self.assertEqual(frozenset(), outer.defined_block.cell_variables)
+        
+    def test_matches_full_augmentation(self):
+        node = ast.parse(self.src)
+        lenatu.augment(node)
+        f = tools.npath(node, ".**{name=f}")
+        lenatu.reaugment(f.defined_block, ast.parse(self.new_body).body)
+        
+        expected = ast.parse(self.src)
+        expected.body[1].body = ast.parse(self.new_body).body
+        lenatu.augment(expected)
+        self.assertEqual(tools.scopes(expected), tools.scopes(node))
+        
+    def test_augmentation(self):
+        node = ast.parse(self.src)
+        augmentation = lenatu.augment(node, inplace=False)
+        f = tools.npath(node, ".**{name=f}")
+        f_block = augmentation.defined_block(f)
+        old_body = f.body
+        
+        lenatu.reaugment(f_block, ast.parse(self.new_body).body, augmentation)
+        
+        self.assertIsNone(augmentation.executed_in(old_body[0]))
+        self.assertIs(f_block, augmentation.executed_in(f.body[0]))
+        self.assertIs(augmentation.block, augmentation.name_block(f.body[0].value.right, "id"))
+        self.assertEqual(frozenset(["a", "b", "z", "k"]), f_block.local_variables)
+        self.assertFalse(hasattr(f.body[0], "executed_in"))
+        
+    def test_augmentation_modified_in_place(self):
+        node = ast.parse(self.src)
+        augmentation = lenatu.augment(node, inplace=False)
+        f = tools.npath(node, ".**{name=f}")
+        f_block = augmentation.defined_block(f)
+        old_body = f.body[:]
+        
+        f.body[:] = ast.parse(self.new_body).body
+        lenatu.reaugment(f_block, augmentation=augmentation)
+        
+        for old in old_body:
+            self.assertIsNone(augmentation.executed_in(old))
+            self.assertIsNone(augmentation.defined_block(old))
+        self.assertIs(f_block, augmentation.executed_in(f.body[0]))
+        expected = ast.parse(self.src)
+        expected.body[1].body = ast.parse(self.new_body).body
+        expected = lenatu.augment(expected, inplace=False)
+        self.assertEqual(len(expected._executed_in), len(augmentation._executed_in))
+        self.assertEqual(len(expected._defined_block), len(augmentation._defined_block))
+        augmentation.apply()
+        
+    def test_lazy(self):
+        node = ast.parse(self.src)
+        augmentation = lenatu.augment(node, inplace=False, lazy=True)
+        f = tools.npath(node, ".**{name=f}")
+        f_block = augmentation.defined_block(f)
+        
+        lenatu.reaugment(f_block, ast.parse(self.new_body).body, augmentation)
+        
+        self.assertEqual(frozenset(["a", "b", "z", "k"]), f_block.local_variables)
+        self.assertIs(augmentation.block, augmentation.name_block(f.body[0].value.right, "id"))
+        k = f.body[1]
+        self.assertIs(f_block, augmentation.name_block(tools.npath(k, ".**{id=b}"), "id"))
+        h = tools.npath(node, ".**{name=h}")
+        self.assertIs(augmentation.block, augmentation.name_block(h.body[0].value, "id"))
+        
+    def test_index(self):
+        node = ast.parse(tools.unindent("""
+        x = 1
+        def f(a, b=lambda: x):
+            def g():
+                return x
+            return x
+        """))
+        lenatu.augment(node, index=True)
+        f = tools.npath(node, ".**{name=f}")
+        lambda_x = tools.npath(f, ".args.defaults[0].body")
+        self.assertEqual(3, len(node.defined_block.reads["x"]))
+        
+        lenatu.reaugment(f.defined_block, ast.parse(self.new_body).body)
+        
+        x = f.body[0].value.right
+        self.assertEqual([lambda_x, x], node.defined_block.reads["x"])
+        self.assertEqual([f.body[0].targets[0]], f.defined_block.bindings["z"])
+        self.assertNotIn("g", f.defined_block.bindings)
+        k = f.body[1]
+        self.assertEqual(2, len(f.defined_block.reads["a"]) + len(f.defined_block.reads["b"]))
+        self.assertIs(f.defined_block, k.defined_block.parent)
+        self.assertEqual({}, k.defined_block.bindings)
+        
+    def test_generator_without_body(self):
+        node = ast.parse("(x for x in y)")
+        lenatu.augment(node)
+        block = tools.npath(node, ".**{GeneratorExp}.defined_block")
+        self.assertRaises(ValueError, lenatu.reaugment, block, [])
@@ -0,0 +1,102 @@
+import unittest
+import ast
+import os
+import pickle
+import lenatu
+from lenatu import tools
+
+
+class TestAugmentPaths(tools.FilesTestCase):
+    
+    def setUp(self):
+        super(TestAugmentPaths, self).setUp()
+        self.write("a.py", "x = 1\ndef f(y):\n    return x + y\n")
+        self.write("b.py", "def broken(:\n")
+        self.write("pkg/c.py", "class C():\n    z = 1\n")
+        self.write("pkg/notes.txt", "not python")
+        
+    def summaries(self, **kwargs):
+        results = lenatu.augment_paths([self.directory], **kwargs)
+        return dict((os.path.relpath(s.path, self.directory), s) for s in results)
+    
+    def test_in_process(self):
+        summaries = self.summaries(workers=1)
+        self.assertEqual(set(["a.py", "b.py", os.path.join("pkg", "c.py")]), set(summaries))
+        
+        a = summaries["a.py"]
+        self.assertIsNone(a.error)
+        self.assertEqual(["Module", "FunctionDef"], [b.kind for b in a.blocks])
+        self.assertEqual(("x", "f"), a.blocks[0].local_variables)
+        x = [n for n in a.names if n.identifier == "x" and n.usage == "read"]
+        self.assertEqual([0], [n.block for n in x])
+        
+        self.assertIn("SyntaxError", summaries["b.py"].error)
+        self.assertEqual([], summaries["b.py"].blocks)
+        
+    @tools.version("3.2+")
+    def test_pool(self):
+        self.assertEqual(self.summaries(workers=1), 
+                         self.summaries(workers=2, chunksize=1, max_pending=1))
+        
+    def test_missing_file(self):
+        missing = os.path.join(self.directory, "missing.py")
+        summary, = lenatu.augment_paths([missing], workers=1)
+        self.assertTrue(summary.error)
+        
+    def test_picklable(self):
+        summary = self.summaries(workers=1)["a.py"]
+        self.assertEqual(summary, pickle.loads(pickle.dumps(summary)))
+        
+    @tools.version("3.2+")
+    def test_augment_many(self):
+        sources = [("s%i" % i, "v%i = %i" % (i, i)) for i in range(20)]
+        summaries = list(lenatu.augment_many(sources, workers=2, chunksize=3))
+        self.assertEqual(sorted(p for p, _ in sources), sorted(s.path for s in summaries))
+        
+        
+class TestParallelScopes(unittest.TestCase):
+    
+    src = "\n".join([
+        "import os",
+        "x = 1",
+        "def f%i(a, *b):",
+        "    global x",
+        "    y = a",
+        "    def g():",
+        "        nonlocal y",
+        "        return [y for y in b] + list(z for z in os.path)",
+        "    return lambda z=y: z + x",
+        "class C%i(object):",
+        "    m = 1",
+        "    def h(self):",
+        "        return m",
+        ""])
+    
+    def source(self):
+        return "".join(self.src % (i, i) for i in range(10))
+    
+    @tools.version("3.2+")
+    def test_threads(self):
+        self.assertSameAsSerial(workers=3)
+        
+    @tools.version("3.2+")
+    def test_processes(self):
+        self.assertSameAsSerial(workers=2, processes=True)
+        
+    @tools.version("3.2+")
+    def test_augmentation(self):
+        self.assertSameAsSerial(workers=2, processes=True, inplace=False)
+        
+    @tools.version("3.2+")
+    def test_no_index(self):
+        node = ast.parse(self.source())
+        self.assertRaises(ValueError, lenatu.augment, node, index=True, workers=2)
+        
+    def assertSameAsSerial(self, inplace=True, **kwargs):
+        expected = ast.parse(self.source())
+        lenatu.augment(expected)
+        actual = ast.parse(self.source())
+        augmentation = lenatu.augment(actual, inplace=inplace, **kwargs)
+        if not inplace:
+            augmentation.apply()
+        self.assertEqual(lenatu.serialize(expected), lenatu.serialize(actual))
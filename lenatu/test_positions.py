@@ -0,0 +1,131 @@
+import unittest
+import ast
+import lenatu
+from lenatu import tools, _positions
+
+
+class TestPositionIndex(unittest.TestCase):
+
+    src = tools.unindent("""
+    import os.path as p
+    @decorate(x)
+    def f(a, b=lambda: y, *c: int) -> str:
+        global g
+        try:
+            return (z for z in a)
+        except E as e:
+            return e
+    class C(Base, metaclass=M):
+        attr = [v for v in range(3)]
+        def m(self): return self
+    """).lstrip()
+    
+    @tools.version("3.8+")
+    def test_blocks(self):
+        node, positions = self.index()
+        f, C = node.body[1], node.body[2]
+        module = node.defined_block
+        self.assertIs(module, positions.block_at(1, 0))
+        self.assertIs(module, positions.block_at(2, 11))         # decorator
+        self.assertIs(f.defined_block, positions.block_at(3, 0))  # def
+        self.assertIs(f.defined_block, positions.block_at(3, 6))  # a
+        self.assertIs(f.defined_block, positions.block_at(3, 9))  # b
+        self.assertIs(f.args.defaults[0].defined_block, positions.block_at(3, 11))
+        self.assertIs(f.args.defaults[0].defined_block, positions.block_at(3, 19))
+        self.assertIs(module, positions.block_at(3, 27))         # annotation
+        self.assertIs(module, positions.block_at(3, 36))         # return annotation
+        self.assertIs(f.defined_block, positions.block_at(5, 8))
+        genexp = f.body[1].body[0].value
+        self.assertIs(genexp.defined_block, positions.block_at(6, 20))
+        self.assertIs(f.defined_block, positions.block_at(7, 8))
+        self.assertIs(module, positions.block_at(9, 8))          # base class
+        self.assertIs(C.defined_block, positions.block_at(10, 4))
+        self.assertIs(C.body[1].defined_block, positions.block_at(11, 24))
+        self.assertIs(module, positions.block_at(100, 0))
+    
+    @tools.version("3.8+")
+    def test_names(self):
+        node, positions = self.index()
+        f = node.body[1]
+        self.assertEqual(("id", "x"), self.name(positions, 2, 10))
+        self.assertEqual(("name", "f"), self.name(positions, 3, 4))
+        self.assertEqual(("arg", "a"), self.name(positions, 3, 6))
+        self.assertEqual(("id", "y"), self.name(positions, 3, 19))
+        self.assertEqual(("names", ["g"]), self.name(positions, 4, 11))
+        self.assertEqual(("id", "E"), self.name(positions, 7, 11))
+        self.assertEqual(("name", "e"), self.name(positions, 7, 16))
+        self.assertEqual(("id", "e"), self.name(positions, 8, 15))
+        self.assertEqual(("name", "C"), self.name(positions, 9, 2))
+        self.assertEqual(("name", "m"), self.name(positions, 11, 5))
+        self.assertIsNone(positions.name_at(6, 8))              # return
+        self.assertIsNone(positions.name_at(5, 4))              # try
+        n, attribute, _ = positions.name_at(3, 6)
+        self.assertIs(f.defined_block, getattr(n, attribute + "_block"))
+    
+    @tools.version("3.10+")
+    def test_alias(self):
+        node, positions = self.index()
+        self.assertEqual(("asname", "p"), self.name(positions, 1, 18))
+    
+    @tools.version("3.8+")
+    def test_all_names(self):
+        """
+        Every name is found at its own position, in the block it is executed in.
+        """
+        src = self.src * 3
+        node = ast.parse(src)
+        augmentation = lenatu.augment(node, inplace=False, positions=True)
+        positions = augmentation.block.positions
+        for n in ast.walk(node):
+            if isinstance(n, ast.Name):
+                for col in range(n.col_offset, n.end_col_offset):
+                    self.assertIs(n, positions.name_at(n.lineno, col)[0])
+                    self.assertIs(augmentation.executed_in(n), positions.block_at(n.lineno, col))
+    
+    @tools.version("3.8+")
+    def test_reaugment(self):
+        node, positions = self.index()
+        f = node.body[1]
+        lenatu.reaugment(f.defined_block, ast.parse("return (w for w in a)").body)
+        positions = node.defined_block.positions
+        self.assertEqual(("id", "a"), self.name(positions, 1, 19))
+        self.assertIs(f.body[0].value.defined_block, positions.block_at(1, 8))
+        self.assertIsNone(positions.name_at(6, 19))
+    
+    @tools.version("3.8+")
+    def test_except_without_name(self):
+        node = ast.parse("try:\n    pass\nexcept E:\n    pass\n")
+        lenatu.augment(node, positions=True)
+        self.assertIsNone(node.defined_block.positions.name_at(3, 0))
+        self.assertEqual("E", node.defined_block.positions.name_at(3, 7)[2])
+    
+    def test_any_version(self):
+        node = ast.parse("x = 1\ndef f(a):\n    return a + x\n")
+        lenatu.augment(node, positions=True)
+        positions = node.defined_block.positions
+        self.assertEqual("a", positions.name_at(3, 11)[2])
+        self.assertEqual("x", positions.name_at(3, 15)[2])
+        self.assertEqual("f", positions.name_at(2, 4)[2])
+        self.assertIsNone(positions.name_at(3, 4))              # return
+        self.assertIsNone(positions.name_at(3, 13))             # +
+    
+    def test_declared_index(self):
+        src = "def f():\n    global ab,  a, \\\n        c\n"
+        node = ast.parse(src).body[0].body[0]
+        for lineno, col_offset, expected in ((2, 11, 0), (2, 12, 0), (2, 16, 1), (3, 8, 2),
+                                             (2, 13, 0), (2, 4, 0)):
+            self.assertEqual(expected, _positions._declared_index(node, src, lineno, col_offset))
+    
+    def test_not_requested(self):
+        node = ast.parse("x = 1")
+        lenatu.augment(node)
+        self.assertIsNone(node.defined_block.positions)
+    
+    def index(self):
+        node = ast.parse(self.src)
+        lenatu.augment(node, positions=True)
+        return node, node.defined_block.positions
+    
+    def name(self, positions, lineno, col_offset):
+        n, attribute, identifier = positions.name_at(lineno, col_offset)
+        return attribute, identifier
@@ -0,0 +1,72 @@
+import unittest
+from lenatu import tools
+import ast
+import lenatu
+
+
+class TestProfile(unittest.TestCase):
+    
+    src = tools.unindent("""
+    x = 1
+    def f(a):
+        return a + x
+    class C():
+        y = [x for x in range(3)]
+    """)
+    
+    def test_counts(self):
+        node = ast.parse(self.src)
+        with lenatu.profile() as p:
+            lenatu.augment(node)
+        self.assertEqual(3, p.blocks_created)
+        self.assertEqual(3, len(p.block_times))
+        self.assertEqual(10, p.names_resolved)
+        self.assertTrue(p.nodes_visited > 10)
+        self.assertTrue(p.block_seconds > 0)
+        self.assertTrue(p.scope_seconds > 0)
+        self.assertEqual(set([node.defined_block, node.body[1].defined_block, node.body[2].defined_block]),
+                         set(block for _, block, _ in p.block_times))
+        self.assertTrue(p.report())
+        
+    def test_slowest_blocks(self):
+        node = ast.parse(self.src)
+        with lenatu.profile() as p:
+            lenatu.augment(node)
+        slowest = p.slowest_blocks(2)
+        self.assertEqual(2, len(slowest))
+        self.assertTrue(slowest[0][0] >= slowest[1][0])
+        
+    def test_lazy(self):
+        node = ast.parse(self.src)
+        with lenatu.profile() as p:
+            augmentation = lenatu.augment(node, inplace=False, lazy=True)
+            augmentation.defined_block(node.body[1]).local_variables
+        self.assertEqual(2, len(p.block_times))
+        
+    def test_callback(self):
+        profiles = []
+        with lenatu.profile(callback=profiles.append) as p:
+            lenatu.augment(ast.parse(self.src))
+        self.assertEqual([p], profiles)
+        
+    def test_disabled(self):
+        with lenatu.profile() as p:
+            pass
+        lenatu.augment(ast.parse(self.src))
+        self.assertEqual(0, p.nodes_visited)
+        self.assertEqual([], p.block_times)
+        
+    def test_threads(self):
+        import threading
+        def run():
+            for _ in range(20):
+                lenatu.augment(ast.parse(self.src))
+        with lenatu.profile() as p:
+            threads = [threading.Thread(target=run) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(4 * 20 * 3, p.blocks_created)
+        self.assertEqual(4 * 20 * 10, p.names_resolved)
+        self.assertEqual(4 * 20 * 3, len(p.block_times))
@@ -0,0 +1,81 @@
+import ast
+import os
+import lenatu
+from lenatu import tools
+
+
+class TestResolver(tools.FilesTestCase):
+
+    def setUp(self):
+        super(TestResolver, self).setUp()
+        self.write("pkg/__init__.py", "from .core import Engine as Engine\nfrom . import util\n")
+        self.write("pkg/core.py", "import os\nclass Engine(object):\n    def start(self):\n        pass\n")
+        self.write("pkg/util.py", "def helper():\n    return 1\nhelper = helper\n")
+        self.write("app.py", "from pkg import Engine, util\nimport pkg.util as u\n"
+                             "def main():\n    e = Engine()\n    return u.helper(e)\n")
+        self.write("unused.py", "x = 1\n")
+        self.resolver = lenatu.Resolver([self.directory])
+    
+    def test_find(self):
+        self.assertEqual(os.path.join(self.directory, "pkg", "__init__.py"), self.resolver.find("pkg"))
+        self.assertEqual(os.path.join(self.directory, "app.py"), self.resolver.find("app"))
+        self.assertIsNone(self.resolver.find("os"))
+    
+    def test_resolve_through_reexport(self):
+        engine, = self.resolver.resolve("app.Engine")
+        self.assertEqual(("pkg.core", "Engine"), (engine.module, engine.identifier))
+        self.assertIsInstance(engine.node, ast.ClassDef)
+        
+        start, = self.resolver.resolve("pkg.Engine.start")
+        self.assertEqual("start", start.node.name)
+    
+    def test_resolve_module(self):
+        util, = self.resolver.resolve("app.util")
+        self.assertEqual(("pkg.util", None), (util.module, util.identifier))
+        self.assertIsInstance(util.node, ast.Module)
+    
+    def test_multiple_bindings(self):
+        bindings = self.resolver.resolve("pkg.util.helper")
+        self.assertEqual([ast.FunctionDef, ast.Name], [type(b.node) for b in bindings])
+    
+    def test_out_of_project(self):
+        self.assertEqual([], self.resolver.resolve("pkg.core.os.path"))
+        self.assertEqual([], self.resolver.resolve("missing.name"))
+    
+    def test_lazy(self):
+        self.resolver.resolve("pkg.util.helper")
+        self.assertEqual(1, self.resolver.loaded) # only pkg.util
+    
+    def test_definition(self):
+        # `Engine` in `e = Engine()`
+        engine, = self.resolver.definition("app", 4, 9)
+        self.assertEqual(("pkg.core", "Engine"), (engine.module, engine.identifier))
+        # `e` in `u.helper(e)`
+        e, = self.resolver.definition("app", 5, 20)
+        self.assertEqual(("app", "e", 4), (e.module, e.identifier, e.node.lineno))
+        self.assertEqual([], self.resolver.definition("app", 100, 0))
+    
+    def test_definition_global(self):
+        self.write("glob.py", "helper = 1\nother = 2\ndef f():\n    global helper, other\n")
+        other, = self.resolver.definition("glob", 4, 20)
+        self.assertEqual(("other", 2), (other.identifier, other.node.lineno))
+        helper, = self.resolver.definition("glob", 4, 11)
+        self.assertEqual(("helper", 1), (helper.identifier, helper.node.lineno))
+    
+    def test_memoized(self):
+        self.resolver.resolve("app.Engine")
+        loaded = self.resolver.loaded
+        self.resolver.resolve("app.Engine")
+        self.assertEqual(loaded, self.resolver.loaded)
+        
+        # Same content, different mtime: the hash matches.
+        path = os.path.join(self.directory, "app.py")
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+        self.resolver.resolve("app.Engine")
+        self.assertEqual(loaded, self.resolver.loaded)
+        
+        self.write("pkg/core.py", "Engine = None\n")
+        engine, = self.resolver.resolve("app.Engine")
+        self.assertIsInstance(engine.node, ast.Name)
+        self.assertEqual(loaded + 1, self.resolver.loaded)
@@ -120,6 +120,31 @@ class TestScope(unittest.TestCase):
                         ".**{FunctionDef}.defined_block", 
                         ".**{arg=x}.arg_block")
         
+    @tools.version("3.8+")
+    def test_positional_only(self):
+        src = """
+        def f(x, /):
+            return x
+        """
+        self.assertSame(src, 
+                        ".**{FunctionDef}.defined_block", 
+                        ".**{Return}.value.id_block")
+        
+    @tools.version("3.5+")
+    def test_async_function(self):
+        src = """
+        def f():
+            async def g():
+                pass
+            return g
+        """
+        self.assertSame(src, 
+                        ".**{name=f}.defined_block", 
+                        ".**{AsyncFunctionDef}.name_block")
+        self.assertSame(src, 
+                        ".**{name=f}.defined_block", 
+                        ".**{Return}.value.id_block")
+        
     def test_default(self):
         src = """
         def foo(x=y):
@@ -256,6 +281,20 @@ class TestScope(unittest.TestCase):
                         ".**{name=f}.defined_block", 
                         ".**{alias}.asname_block")
         
+    @tools.version("2.0+")
+    def test_except_P2(self):
+        src = """
+        def f():
+            try:
+                pass
+            except ValueError as e:
+                pass
+        """
+        self.assertSame(src, 
+                        ".**{name=f}.defined_block", 
+                        ".**{ExceptHandler}.name.id_block")
+        
+    @tools.version("3.0+")
     def test_except(self):
         src = """
         def f():
@@ -268,6 +307,16 @@ class TestScope(unittest.TestCase):
                         ".**{name=f}.defined_block", 
                         ".**{ExceptHandler}.name_block")
         
+    def test_except_without_name(self):
+        src = """
+        def f():
+            try:
+                pass
+            except ValueError:
+                pass
+        """
+        self.assertEqual(frozenset(), self.get(src, ".**{name=f}.defined_block").local_variables)
+        
     @tools.version("3.0+")
     def test_except_nonlocal(self):
         src = """
@@ -314,6 +363,137 @@ class TestScope(unittest.TestCase):
                         ".**{id=x}.id_block")
         
         
+    def test_lambda_in_default(self):
+        src = """
+        def f(x=lambda y: y):
+            pass
+        """
+        self.assertSame(src, 
+                        ".**{Lambda}.defined_block", 
+                        ".**{Lambda}.body.id_block")
+        
+    def test_local_variables(self):
+        src = """
+        def f(a):
+            b = 1
+            global c
+            c = a
+            b = 2
+        """
+        block = self.get(src, ".**{FunctionDef}.defined_block")
+        self.assertEqual(frozenset(["a", "b"]), block.local_variables)
+        self.assertEqual(("a", "b"), block.ordered_local_variables)
+        self.assertFalse(block.is_class)
+        
+    def test_ordered_local_variables(self):
+        src = """
+        def f(zeta, alpha):
+            mu = 1
+            def k(): pass
+            beta = gamma = 2
+        """
+        block = self.get(src, ".**{name=f}.defined_block")
+        self.assertEqual(("zeta", "alpha", "mu", "k", "beta", "gamma"), block.ordered_local_variables)
+        
+    def test_class_block(self):
+        src = """
+        class C():
+            pass
+        """
+        self.assertTrue(self.get(src, ".**{ClassDef}.defined_block").is_class)
+        self.assertFalse(self.get(src, ".defined_block").is_class)
+        
+    @tools.version("3.0+")
+    def test_closure_variables(self):
+        src = """
+        x = 1
+        def f(a, b):
+            c = 1
+            def g():
+                nonlocal c
+                c = a + x
+                def h():
+                    return b + print
+            class C():
+                m = a
+        """
+        module = self.get(src, ".defined_block")
+        f = self.get(src, ".**{name=f}.defined_block")
+        g = self.get(src, ".**{name=g}.defined_block")
+        h = self.get(src, ".**{name=h}.defined_block")
+        c = self.get(src, ".**{name=C}.defined_block")
+        self.assertEqual(frozenset(), module.free_variables)
+        self.assertEqual(frozenset(), module.global_variables)
+        self.assertEqual(frozenset(), f.free_variables)
+        self.assertEqual(frozenset(["a", "b", "c"]), f.cell_variables)
+        self.assertEqual(frozenset(["a", "b", "c"]), g.free_variables)
+        self.assertEqual(frozenset(), g.cell_variables)
+        self.assertEqual(frozenset(["x"]), g.global_variables)
+        self.assertEqual(frozenset(["c"]), g.nonlocal_variables)
+        self.assertEqual(frozenset(["b"]), h.free_variables)
+        self.assertEqual(frozenset(["print"]), h.global_variables)
+        self.assertEqual(frozenset(["a"]), c.free_variables)
+        
+    def test_class_cell_variables(self):
+        src = """
+        def f():
+            m = 1
+            class C():
+                m = 2
+                def g(self):
+                    return m
+        """
+        f = self.get(src, ".**{name=f}.defined_block")
+        c = self.get(src, ".**{name=C}.defined_block")
+        self.assertEqual(frozenset(["m"]), f.cell_variables)
+        self.assertEqual(frozenset(["m"]), c.free_variables)
+        self.assertEqual(frozenset(), c.cell_variables)
+        
+    def test_lazy_closure_variables(self):
+        src = tools.unindent("""
+        def f(a):
+            def g():
+                return lambda: a
+        """)
+        node = ast.parse(src)
+        augmentation = lenatu.augment(node, inplace=False, lazy=True)
+        f = augmentation.defined_block(node.body[0])
+        self.assertEqual(frozenset(["a"]), f.cell_variables)
+        g = f._children[0]
+        self.assertEqual(frozenset(["a"]), g.free_variables)
+        
+    def test_index(self):
+        src = tools.unindent("""
+        x = 1
+        def f():
+            global x
+            x = x + 1
+            def g():
+                return x
+        def h():
+            x = 2
+            return x
+        """)
+        node = ast.parse(src)
+        lenatu.augment(node, index=True)
+        module = node.defined_block
+        self.assertEqual([node.body[0].targets[0], tools.npath(node, ".body[1].body[1].targets[0]")], 
+                         module.bindings["x"])
+        self.assertEqual([tools.npath(node, ".body[1].body[1].value.left"), 
+                          tools.npath(node, ".**{name=g}.**{Return}.value")], 
+                         module.reads["x"])
+        self.assertEqual([node.body[1].body[0]], module.declarations["x"])
+        self.assertEqual(5, len(module.references("x")))
+        
+        h = node.body[2].defined_block
+        self.assertEqual(1, len(h.bindings["x"]))
+        self.assertEqual(1, len(h.reads["x"]))
+        self.assertEqual({}, h.declarations)
+        
+    def test_no_index(self):
+        node = self.parse("x = 1")
+        self.assertIsNone(node.defined_block.bindings)
+        
     def get(self, src, path):
         node = self.parse(src)
         return tools.npath(node, path)
@@ -0,0 +1,90 @@
+import unittest
+from lenatu import tools
+import ast
+import lenatu
+import pickle
+
+
+class TestSerialize(unittest.TestCase):
+
+    src = tools.unindent("""
+    import os.path
+    x = 1
+    def f(a, *b, **c):
+        global x
+        y = a
+        def g():
+            nonlocal y
+            return [y for y in b] + list(z for z in c)
+        return lambda z=y: z
+    class C(object):
+        m = 1
+    try:
+        pass
+    except Exception:
+        pass
+    """)
+    
+    @tools.version("3.0+")
+    def test_inplace(self):
+        expected = ast.parse(self.src)
+        lenatu.augment(expected)
+        
+        actual = ast.parse(self.src)
+        lenatu.deserialize(lenatu.serialize(expected), actual)
+        self.assertEqual(tools.scopes(expected), tools.scopes(actual))
+    
+    @tools.version("3.0+")
+    def test_augmentation(self):
+        expected = ast.parse(self.src)
+        lenatu.augment(expected)
+        
+        node = ast.parse(self.src)
+        data = lenatu.serialize(lenatu.augment(node, inplace=False, lazy=True))
+        self.assertEqual(lenatu.serialize(expected), data)
+        
+        actual = ast.parse(self.src)
+        augmentation = lenatu.deserialize(data, actual, inplace=False)
+        self.assertEqual([], [n for n in ast.walk(actual) if hasattr(n, "executed_in")])
+        augmentation.apply()
+        self.assertEqual(tools.scopes(expected), tools.scopes(actual))
+    
+    @tools.version("3.0+")
+    def test_blocks_usable(self):
+        node = ast.parse(self.src)
+        lenatu.augment(node)
+        actual = ast.parse(self.src)
+        lenatu.deserialize(lenatu.serialize(node), actual)
+        
+        module = actual.defined_block
+        self.assertEqual(node.defined_block.ordered_local_variables, module.ordered_local_variables)
+        self.assertIs(module, actual.body[2].defined_block.parent)
+        self.assertTrue(actual.body[3].defined_block.is_class)
+        for b, e in ((module, node.defined_block), 
+                     (actual.body[2].defined_block, node.body[2].defined_block)):
+            self.assertEqual(e.free_variables, b.free_variables)
+            self.assertEqual(e.cell_variables, b.cell_variables)
+            self.assertEqual(e.global_variables, b.global_variables)
+            self.assertEqual(e.nonlocal_variables, b.nonlocal_variables)
+        
+        lenatu.reaugment(actual.body[2].defined_block)
+        self.assertEqual(tools.scopes(node), tools.scopes(actual))
+    
+    @tools.version("3.0+")
+    def test_smaller_than_pickle(self):
+        node = ast.parse(self.src)
+        lenatu.augment(node)
+        self.assertLess(len(lenatu.serialize(node)), len(pickle.dumps(node, -1)))
+    
+    @tools.version("3.0+")
+    def test_different_tree(self):
+        node = ast.parse(self.src)
+        lenatu.augment(node)
+        data = lenatu.serialize(node)
+        self.assertRaises(ValueError, lenatu.deserialize, data, ast.parse("x = 1"))
+        self.assertRaises(ValueError, lenatu.deserialize, data,
+                          ast.parse(self.src.replace("y = a", "w = a")))
+    
+    def test_invalid_data(self):
+        self.assertRaises(ValueError, lenatu.deserialize, b"", ast.parse("x"))
+        self.assertRaises(ValueError, lenatu.deserialize, b"PICKLE" * 4, ast.parse("x"))
@@ -0,0 +1,158 @@
+import os
+import socket
+import sys
+import threading
+import lenatu
+from lenatu import tools
+
+
+class TestModuleStore(tools.FilesTestCase):
+    
+    src = tools.unindent("""
+    import os
+    x = 1
+    class C(object):
+        def m(self, a):
+            b = a + x
+            return lambda: b
+    """)
+    
+    def setUp(self):
+        super(TestModuleStore, self).setUp()
+        self.path = self.write("m.py", self.src)
+        self.store = lenatu.ModuleStore()
+        
+    def test_name(self):
+        # `x` in `b = a + x`
+        result = self.store.name(self.path, 6, 16)
+        self.assertEqual("x", result["identifier"])
+        self.assertEqual({"kind": "Module", "name": None, "line": None, "col": None}, result["block"])
+        # `b` in `lambda: b`
+        result = self.store.name(self.path, 7, 23)
+        self.assertEqual(("b", "m", 5), (result["identifier"], result["block"]["name"], 
+                                         result["block"]["line"]))
+        self.assertIsNone(self.store.name(self.path, 6, 0))
+        
+    def test_global(self):
+        path = self.write("g.py", "a = b = 1\ndef f():\n    global a, b\n    b = 2\n")
+        self.assertEqual("a", self.store.name(path, 3, 11)["identifier"])
+        result = self.store.name(path, 3, 14)
+        self.assertEqual("b", result["identifier"])
+        self.assertEqual("Module", result["block"]["kind"])
+        
+    def test_locals(self):
+        self.assertEqual([["self", "a", "b"]], [r["locals"] for r in self.store.locals(self.path, "C.m")])
+        self.assertEqual(["os", "x", "C"], self.store.locals(self.path, None)[0]["locals"])
+        self.assertEqual([], self.store.locals(self.path, "missing"))
+        self.assertEqual(["C", "C.m", "C.m.<lambda>"], self.store.blocks(self.path))
+        
+    def test_reload(self):
+        self.store.locals(self.path, "C.m")
+        self.store.locals(self.path, "C.m")
+        self.assertEqual(1, self.store.loads)
+        self.write("m.py", self.src.replace("b = a + x", "c = a + x"))
+        self.assertEqual(["self", "a", "c"], self.store.locals(self.path, "C.m")[0]["locals"])
+        self.assertEqual(2, self.store.loads)
+        
+    def test_eviction(self):
+        self.store.get(self.path)
+        self.store.max_bytes = self.store.size * 2
+        paths = [self.write("m%i.py" % i, self.src) for i in range(3)]
+        for path in paths:
+            self.store.get(path)
+        self.assertEqual(2, len(self.store))
+        self.assertEqual(2, self.store.evictions)
+        self.assertTrue(self.store.size <= self.store.max_bytes)
+        self.store.get(paths[-1])
+        self.assertEqual(4, self.store.loads)
+        
+    def test_load_outside_lock(self):
+        self.store.get(self.path)
+        other = self.write("o.py", self.src)
+        started = threading.Event()
+        release = threading.Event()
+        load = lenatu._server._load
+        def slow_load(path, stat):
+            started.set()
+            release.wait()
+            return load(path, stat)
+        lenatu._server._load = slow_load
+        try:
+            thread = threading.Thread(target=self.store.get, args=(other,))
+            thread.start()
+            started.wait()
+            # Served while the other file is being loaded.
+            self.assertEqual(["os", "x", "C"], self.store.locals(self.path, None)[0]["locals"])
+            release.set()
+            thread.join()
+        finally:
+            release.set()
+            lenatu._server._load = load
+        self.assertEqual(2, len(self.store))
+        self.assertEqual(2, self.store.loads)
+        
+    def test_errors(self):
+        store = self.store
+        self.assertIn("error", lenatu._server.handle(store, {"op": "missing"}))
+        self.assertIn("error", lenatu._server.handle(store, {"op": "blocks", "path": "/does/not/exist"}))
+        self.assertIn("error", lenatu._server.handle(store, {"op": "blocks", 
+                                                             "path": self.write("bad.py", "def (:")}))
+        
+    def test_invalid_requests(self):
+        for request in ([], {}, {"op": "missing"}, {"op": ["name"]}, {"op": "blocks"}, 
+                        {"op": "name", "path": self.path, "line": "6", "col": 16}):
+            self.assertTrue(lenatu._server.handle(self.store, request)["error"].startswith("Invalid request"),
+                            request)
+        self.assertEqual({"result": ["C", "C.m", "C.m.<lambda>"]}, 
+                         lenatu._server.handle(self.store, {"op": "blocks", "path": self.path}))
+        self.assertEqual(1, lenatu._server.handle(self.store, {"op": "stats"})["result"]["modules"])
+        
+    def test_internal_error(self):
+        def broken(path):
+            raise KeyError(path)
+        self.store.blocks = broken
+        self.assertRaises(KeyError, lenatu._server.handle, self.store, {"op": "blocks", "path": self.path})
+        
+        
+class TestServer(tools.FilesTestCase):
+    
+    @tools.version("3.0+")
+    def test_round_trip(self):
+        if sys.platform == "win32":
+            return
+        path = self.write("m.py", "def f(a):\n    return a\n")
+        server = lenatu.Server(os.path.join(self.directory, "socket"))
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            with lenatu.Client(os.path.join(self.directory, "socket")) as client:
+                self.assertEqual(["a"], client.locals(path, "f")[0]["locals"])
+                self.assertEqual("f", client.name(path, 2, 11)["block"]["name"])
+                self.assertEqual(1, client.request("stats")["modules"])
+                self.assertRaises(ValueError, client.request, "missing")
+                # An internal error is reported and the connection stays usable.
+                server.store.blocks = lambda path: {}[path]
+                self.assertRaises(ValueError, client.request, "blocks", path=path)
+                self.assertEqual(1, client.request("stats")["modules"])
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        
+    def test_socket_path(self):
+        if sys.platform == "win32":
+            return
+        path = self.write("socket", "not a socket")
+        self.assertRaises(ValueError, lenatu.Server, path)
+        self.assertTrue(os.path.isfile(path))
+        os.remove(path)
+        
+        # Left behind by a server that is gone.
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        server = lenatu.Server(path)
+        try:
+            self.assertRaises(ValueError, lenatu.Server, path)
+        finally:
+            server.server_close()
@@ -0,0 +1,135 @@
+import unittest
+from lenatu import tools
+import ast
+import lenatu
+
+
+class TestSymtable(unittest.TestCase):
+
+    src = tools.unindent("""
+    import os.path
+    from sys import argv as args
+    x = 1
+    def f(a, *b, **c):
+        global x
+        y = a
+        def g():
+            nonlocal y
+            y = x
+            return [y for y in b] + list(z for z in c)
+        return lambda z=y: z
+    class C(object):
+        m = 1
+        def h(self):
+            return m
+    try:
+        pass
+    except Exception as e:
+        del e
+    """)
+
+    @tools.version("3.0+")
+    def test_same_as_pure(self):
+        self.assertSameAsPure(self.src)
+
+    def test_same_as_pure_for_modules(self):
+        self.assertSameAsPure(tools.unindent("""
+        x = 1
+        def f():
+            global x
+            x = 2
+        """))
+
+    @tools.version("3.5+")
+    def test_same_as_pure_async(self):
+        self.assertSameAsPure(tools.unindent("""
+        async def f(a):
+            async def g():
+                async with a as b:
+                    async for c in b:
+                        await c
+            return g
+        """))
+
+    def test_same_as_pure_repeated_lambdas(self):
+        self.assertSameAsPure(tools.unindent("""
+        f = lambda a: a; g = lambda b: (lambda c: b + c)
+        h = (x for x in f(1)), (y for y in g(2))
+        """))
+
+    @tools.version("3.0+")
+    def test_inplace_false(self):
+        node = ast.parse(self.src)
+        augmentation = lenatu.augment(node, inplace=False, source=self.src)
+        augmentation.apply()
+
+        expected = ast.parse(self.src)
+        lenatu.augment(expected)
+        self.assertEqual(tools.scopes(expected), tools.scopes(node))
+
+    @tools.version("3.8+")
+    def test_named_expression_in_generator(self):
+        src = tools.unindent("""
+        def f(xs):
+            return any((d := x) for x in xs), d
+        """)
+        node = ast.parse(src)
+        lenatu.augment(node, source=src)
+        function = node.body[0].defined_block
+        generator = tools.npath(node, ".**{GeneratorExp}.defined_block")
+        self.assertIn("d", function.local_variables)
+        self.assertNotIn("d", generator.local_variables)
+
+    @tools.version("3.8+")
+    def test_named_expression_only_in_generator(self):
+        src = tools.unindent("""
+        def f(x):
+            s = sum((d := v) * d for v in x)
+            g = (((e := v) for v in w) for w in x)
+        """)
+        node = ast.parse(src)
+        lenatu.augment(node, source=src)
+        function = node.body[0].defined_block
+        self.assertEqual(("x", "s", "g", "d", "e"), function.ordered_local_variables)
+        self.assertTrue(frozenset(["d", "e"]) <= function.cell_variables)
+        for name in tools.npath(node, ".**{id=d}") + [tools.npath(node, ".**{id=e}")]:
+            self.assertIs(function, name.id_block)
+            
+    @tools.version("3.8+")
+    def test_named_expression_in_module_generator(self):
+        src = "s = sum((d := v) * d for v in x)"
+        node = ast.parse(src)
+        lenatu.augment(node, source=src)
+        self.assertEqual(("s", "d"), node.defined_block.ordered_local_variables)
+        for name in tools.npath(node, ".**{id=d}"):
+            self.assertIs(node.defined_block, name.id_block)
+        
+    @tools.version("3.10+")
+    def test_match_capture(self):
+        src = tools.unindent("""
+        def f(a):
+            match a:
+                case [b]:
+                    return b
+        """)
+        node = ast.parse(src)
+        lenatu.augment(node, source=src)
+        function = node.body[0].defined_block
+        self.assertEqual(frozenset(["a", "b"]), function.local_variables)
+        ret = tools.npath(node, ".**{Return}.value")
+        self.assertIs(function, ret.id_block)
+
+    def test_rejected_by_compiler(self):
+        src = tools.unindent("""
+        from __future__ import rested_snopes
+        def f(a):
+            return a
+        """)
+        self.assertSameAsPure(src)
+
+    def assertSameAsPure(self, src):
+        expected = ast.parse(src)
+        lenatu.augment(expected)
+        actual = ast.parse(src)
+        lenatu.augment(actual, source=src)
+        self.assertEqual(tools.scopes(expected), tools.scopes(actual))
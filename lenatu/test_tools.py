@@ -84,11 +84,79 @@ class TestNPath(unittest.TestCase):
         f.body = [e1, e2]
         e1.value = a1
         e2.value = a2
+        a1.ctx = a2.ctx = None  # Python 3.13+ defaults to `Load()`
         
         expected = [f, e1, a1, e2, a2]
         actual =  tools.npath(n, ".**")
         self.assertEqual(expected, actual)
         
+    def test_flatten_filter(self):
+        n = ast.parse("def f():\n    return a + b")
+        self.assertEqual(["a", "b"], [x.id for x in tools.npath(n, ".**{Name}")])
+        self.assertEqual("b", tools.npath(n, ".**{Name}[1].id"))
+        self.assertEqual("b", tools.npath(n, ".**{id=b}.id"))
+        
+    def test_flatten_subscript(self):
+        n = ast.parse("x = y")
+        self.assertEqual("x", tools.npath(n, ".**[1].id"))
+        self.assertRaises(IndexError, tools.npath, n, ".**[100]")
+        
+    def test_filter_no_match(self):
+        n = ast.parse("x = y")
+        self.assertRaises(ValueError, tools.npath, n, ".**{Return}")
+        
+    def test_compile(self):
+        query = tools.compile_npath(".body[0].targets[0].id")
+        self.assertIs(query, tools.compile_npath(".body[0].targets[0].id"))
+        self.assertEqual("x", query(ast.parse("x = 1")))
+        self.assertEqual("y", tools.npath(ast.parse("y = 1"), query))
+        
+    def test_compile_invalid(self):
+        self.assertRaises(ValueError, tools.compile_npath, ".body[x]")
+        self.assertRaises(ValueError, tools.compile_npath, ".body!")
+        
+class TestTypeIndex(unittest.TestCase):
+    
+    src = tools.unindent("""
+    def f(a):
+        def g(b):
+            return a + b
+        return g
+    class C(object):
+        def h(self):
+            return 1
+    """)
+    
+    def test_same_as_scan(self):
+        n = ast.parse(self.src)
+        index = tools.TypeIndex(n)
+        for path in (".**{FunctionDef}", ".**{Name}", ".**{Return}", 
+                     ".body[0].**{Name}", ".body[1].**{FunctionDef}.name",
+                     ".**{FunctionDef}[1].**{Return}"):
+            self.assertEqual(tools.npath(n, path), tools.npath(n, path, index), path)
+        
+    def test_descendants(self):
+        n = ast.parse(self.src)
+        index = tools.TypeIndex(n)
+        f = n.body[0]
+        self.assertEqual([f.body[0]], index.descendants(f, "FunctionDef"))
+        self.assertEqual([], index.descendants(f.body[0], "FunctionDef"))
+        self.assertEqual([], index.descendants(f, "Yield"))
+        
+    def test_not_in_tree(self):
+        index = tools.TypeIndex(ast.parse(self.src))
+        self.assertRaises(ValueError, index.descendants, ast.parse("x"), "Name")
+        
+    def test_no_match(self):
+        n = ast.parse(self.src)
+        self.assertRaises(ValueError, tools.npath, n, ".**{Yield}", tools.TypeIndex(n))
+        
+    def test_compiled(self):
+        n = ast.parse(self.src)
+        query = tools.compile_npath(".body[0].**{FunctionDef}.name")
+        self.assertEqual("g", query(n, tools.TypeIndex(n)))
+        
+        
 class TestVersion(unittest.TestCase):
     
     def test_exact(self):
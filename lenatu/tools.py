@@ -1,6 +1,12 @@
 import re
 import ast
+import os
+import shutil
 import sys
+import tempfile
+import unittest
+import bisect
+import collections
 
 def unindent(source):
     """
@@ -51,133 +57,351 @@ def unindent(source):
     indent = min_indent(lines)    
     return "\n".join(trim(line, indent) for line in lines)
 
+def scopes(node):
+    """
+    Returns the blocks of all nodes of an augmented tree, to compare trees
+    augmented in different ways. A block is given as the position of its
+    definer in `ast.walk(node)` and its local variables.
+    
+    Use for testing only.
+    """
+    nodes = list(ast.walk(node))
+    position = dict((id(n), i) for i, n in enumerate(nodes))
+    
+    def block(b):
+        if isinstance(b, list):
+            return [block(x) for x in b]
+        return position[id(b.defined_by)], b.ordered_local_variables
+    
+    result = []
+    for n in nodes:
+        result.append(sorted((attribute, block(value)) for attribute, value in vars(n).items()
+                             if attribute.endswith("_block") or attribute == "executed_in"))
+    return result
+
 id_pattern = re.compile(r"\s*[a-zA-Z0-9_]+\s*")
 subscript_pattern = re.compile(r"\[(\s*[0-9]+)\s*\]")
 filter_pattern = re.compile(r"\{(\s*[a-zA-Z0-9_=]+)\s*\}")
 
-def npath(node, path):
+# Kinds of the steps of a compiled path.
+_FLATTEN = "flatten"
+_FLATTEN_TYPE = "flatten-type"
+_ATTRIBUTE = "attribute"
+_SUBSCRIPT = "subscript"
+_FILTER_TYPE = "filter-type"
+_FILTER_ATTRIBUTE = "filter-attribute"
+
+
+class NPath(object):
     """
-    XPath inspired utility to find a specific node or attribute within
-    an AST.
+    Pre-parsed `npath` expression, as returned by `compile_npath`.
     
-    The path is an expression that is applied to the given node.
+    Calling it with a node evaluates the path, the same as `npath(node, path)`.
     
-    Attribute access and indexing in case of lists works like in Python:
+    .. attribute:: path
     
-     * `.name`
-     * `[42]`
-     
-    It is also possible to filter for a specific expression or statement:
-     
-     * `[=]`
-     * `[+]`
-     * ...
-     
-     If there is only one node that matches, the result is a node, otherwise
-     a list of nodes.
-     
-     A single `*` returns all nodes reachable from the current node in
-     depth-first order.
+        The path expression.
+        
+    .. attribute:: steps
+    
+        Tuple of `(kind, argument, remainder)` tuples, one for each step of
+        the path. `remainder` is the part of the path starting with that step.
+        `.**{Type}` is a single step, which can be answered by a `TypeIndex`.
     """
     
-    def check_empty(node, path):
-        if path:
-            return None, None
-        return 0, node
+    __slots__ = ("path", "steps")
     
-    def check_flatten(node, path):
-        if not path.startswith(".**"):
-            return None, None
+    def __init__(self, path):
+        self.path = path
+        self.steps = tuple(_parse(path))
         
-        flat = []
+    def __call__(self, node, index=None):
+        """
+        Evaluates the path for the given node. `index` is as for `npath`.
+        """
+        # `stream` is true while `value` is an iterator over the nodes found
+        # by `.**`. Filters and subscripts consume it directly, so the 
+        # subtree is never collected into a list unless the path ends there.
+        value = node
+        stream = False
+        for kind, argument, remainder in self.steps:
+            if kind is _FLATTEN_TYPE and index is not None and not stream:
+                nodes = value if isinstance(value, list) else [value]
+                result = []
+                for n in nodes:
+                    result.extend(index.descendants(n, argument))
+                value = _select(result, argument, "descendants")
+                
+            elif kind is _FLATTEN or kind is _FLATTEN_TYPE:
+                value = _descendants(value if stream or isinstance(value, list) else [value])
+                if kind is _FLATTEN:
+                    stream = True
+                else:
+                    value = _select([n for n in value if n.__class__.__name__ == argument],
+                                    argument, "descendants")
+                    stream = False
+                
+            elif kind is _FILTER_TYPE or kind is _FILTER_ATTRIBUTE:
+                if not stream and not isinstance(value, list):
+                    value = [value]
+                if kind is _FILTER_TYPE:
+                    result = [n for n in value if n.__class__.__name__ == argument]
+                    criteria = argument
+                else:
+                    attr, expected = argument
+                    result = [n for n in value if str(getattr(n, attr, None)) == expected]
+                    criteria = "=".join(argument)
+                value = _select(result, criteria, "descendants" if stream else value)
+                stream = False
+                
+            elif kind is _SUBSCRIPT and stream:
+                for i, n in enumerate(value):
+                    if i == argument:
+                        value = n
+                        break
+                else:
+                    raise IndexError("list index out of range")
+                stream = False
+                
+            elif kind is _SUBSCRIPT:
+                value = value[argument]
+                
+            else:
+                if stream:
+                    value = list(value)
+                    stream = False
+                if not hasattr(value, argument):
+                    raise ValueError("%r has no attribute %r. Path is %r" %(value, argument, remainder))
+                value = getattr(value, argument)
+                
+        return list(value) if stream else value
+        
+    def __repr__(self):
+        return "NPath(%r)" % self.path
         
-        class Traverser(ast.NodeVisitor):
-            def __init__(self, first):
-                self.first = first
-            def visit(self, node):
-                if node is not self.first:
-                    flat.append(node)
-                return ast.NodeVisitor.visit(self, node)
+
+def _select(result, criteria, nodes):
+    """
+    Returns the result of a filter: the node if there is only one, 
+    otherwise the list.
+    """
+    if not result:
+        raise ValueError("No node of type %r found. Nodes: %s" %(criteria, nodes))
+    return result[0] if len(result) == 1 else result
+
+
+def _parse(path):
+    """
+    Returns the `(kind, argument, remainder)` steps of the path.
+    """
+    steps = []
+    for step in _tokenize(path):
+        if (step[0] is _FILTER_TYPE and steps and steps[-1][0] is _FLATTEN):
+            steps[-1] = (_FLATTEN_TYPE, step[1], steps[-1][2])
+        else:
+            steps.append(step)
+    return steps
         
-        if not isinstance(node, list):
-            node = [node]
+
+def _tokenize(path):
+    """
+    Yields the `(kind, argument, remainder)` for each step in the path.
+    """
+    pos = 0
+    while pos < len(path):
+        remainder = path[pos:]
+        if path.startswith(".**", pos):
+            yield _FLATTEN, None, remainder
+            pos += len(".**")
             
-        for n in node:
-            Traverser(n).visit(n)
-        
-        return len(".**"), flat
-    
-    def check_attribute(node, path):
-        if not path.startswith("."):
-            return None, None
-        match = id_pattern.match(path, 1)
-        if not match:
-            raise ValueError("Invalid attribute name %r" % path)
-        name = match.group(0).strip()
-        
-        if not hasattr(node, name):
-            raise ValueError("%r has no attribute %r. Path is %r" %(node, name, path))
-        
-        return match.end(0), getattr(node, name)
-    
-    def check_subscript(node, path):
-        if not path.startswith("["):
-            return None, None
-        match = subscript_pattern.match(path)
-        if not match:
-            raise ValueError("Invalid subscript %r" % path)
-        index = int(match.group(1).strip())
-
-        return match.end(0), node[index]
-    
-    def check_filter(node, path):
-        if not path.startswith("{"):
-            return None, None
-        match = filter_pattern.match(path)
-        if not match:
-            raise ValueError("Invalid filter %r" % path)
-        criteria = match.group(1).strip()
-        
-        if not isinstance(node, list):
-            node = [node]
+        elif path.startswith(".", pos):
+            match = id_pattern.match(path, pos + 1)
+            if not match:
+                raise ValueError("Invalid attribute name %r" % remainder)
+            yield _ATTRIBUTE, match.group(0).strip(), remainder
+            pos = match.end(0)
             
-        if "=" in criteria:
-            attr, value = criteria.split("=")
-            result = [n for n in node if str(getattr(n, attr, None)) == value]
-        else:
-            result = [n for n in node if n.__class__.__name__ == criteria]
+        elif path.startswith("[", pos):
+            match = subscript_pattern.match(path, pos)
+            if not match:
+                raise ValueError("Invalid subscript %r" % remainder)
+            yield _SUBSCRIPT, int(match.group(1).strip()), remainder
+            pos = match.end(0)
+            
+        elif path.startswith("{", pos):
+            match = filter_pattern.match(path, pos)
+            if not match:
+                raise ValueError("Invalid filter %r" % remainder)
+            criteria = match.group(1).strip()
+            if "=" in criteria:
+                yield _FILTER_ATTRIBUTE, tuple(criteria.split("=")), remainder
+            else:
+                yield _FILTER_TYPE, criteria, remainder
+            pos = match.end(0)
             
-        if not result:
-            raise ValueError("No node of type %r found. Nodes: %s" %(criteria, node))
+        else:
+            raise ValueError("Invalid npath: %r" % remainder)
         
-        if len(result) == 1:
-            result = result[0]
         
-        return match.end(0), result
-    
+def _descendants(nodes):
+    """
+    Yields the nodes below each of the given nodes, in the depth-first order
+    of `ast.NodeVisitor` (without the given nodes themselves).
+    """
+    AST = ast.AST
+    for node in nodes:
+        stack = [node]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            n = pop()
+            if n is not node:
+                yield n
+            # Push the children in reverse, so they are popped in field order.
+            fields = n._fields
+            for i in range(len(fields) - 1, -1, -1):
+                value = getattr(n, fields[i], None)
+                if isinstance(value, list):
+                    for j in range(len(value) - 1, -1, -1):
+                        if isinstance(value[j], AST):
+                            push(value[j])
+                elif isinstance(value, AST):
+                    push(value)
+
 
+class TypeIndex(object):
+    """
+    Index of the nodes in a tree by type, to answer `.**{Type}` in time 
+    proportional to the number of matches.
+    
+    The nodes are numbered in the order `.**` returns them. The descendants
+    of a node are those numbered from the node's number up to the end of 
+    its subtree, so the descendants of a type are found by bisecting the 
+    sorted numbers of the nodes of that type.
+    
+    The index is a snapshot of the tree. It has to be built again after the
+    tree was modified.
+    
+    .. attribute:: node
+    
+        The root of the indexed tree.
+    """
+    
+    __slots__ = ("node", "_nodes", "_intervals", "_by_type")
+    
+    def __init__(self, node):
+        self.node = node
+        
+        #: All nodes in depth-first order.
+        self._nodes = []
         
-    pos, nxt = check_empty(node, path)
-    if pos is not None:
-        return nxt
+        #: Maps id(node) to `(first, end)`. The descendants of the node are 
+        #: `_nodes[first + 1:end]`.
+        self._intervals = {}
         
-    if pos is None:
-        pos, nxt = check_flatten(node, path)
+        #: Maps the name of a node-type to the sorted numbers of its nodes.
+        self._by_type = collections.defaultdict(list)
         
-    if pos is None:
-        pos, nxt = check_attribute(node, path)
+        # `None` entries mark the end of the subtree of the node below them.
+        AST = ast.AST
+        nodes = self._nodes
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            if n is None:
+                n = stack.pop()
+                self._intervals[id(n)] = (self._intervals[id(n)][0], len(nodes))
+                continue
+            self._intervals[id(n)] = (len(nodes), None)
+            self._by_type[n.__class__.__name__].append(len(nodes))
+            nodes.append(n)
+            stack.append(n)
+            stack.append(None)
+            fields = n._fields
+            for i in range(len(fields) - 1, -1, -1):
+                value = getattr(n, fields[i], None)
+                if isinstance(value, list):
+                    for j in range(len(value) - 1, -1, -1):
+                        if isinstance(value[j], AST):
+                            stack.append(value[j])
+                elif isinstance(value, AST):
+                    stack.append(value)
+        self._by_type = dict(self._by_type)
         
-    if pos is None:
-        pos, nxt = check_subscript(node, path)
+    def descendants(self, node, type_name):
+        """
+        Returns the nodes below `node` (which must be in the tree) whose type 
+        is called `type_name`, in depth-first order.
+        """
+        interval = self._intervals.get(id(node))
+        if interval is None:
+            raise ValueError("%r is not in the indexed tree" % node)
+        first, end = interval
+        numbers = self._by_type.get(type_name)
+        if not numbers:
+            return []
+        lo = bisect.bisect_right(numbers, first)
+        hi = bisect.bisect_left(numbers, end)
+        nodes = self._nodes
+        return [nodes[i] for i in numbers[lo:hi]]
     
-    if pos is None:
-        pos, nxt = check_filter(node, path)
     
-    if pos is None:
-        raise ValueError("Invalid npath: %r" % path)
+#: Maximal number of compiled paths kept by `compile_npath`.
+NPATH_CACHE_SIZE = 1024
+
+_compiled = collections.OrderedDict()
+
+
+def compile_npath(path):
+    """
+    Returns the `NPath` for the given path expression (see `npath`).
+    
+    The most recently used paths are cached, so compiling a path 
+    again is cheap.
+    """
+    try:
+        query = _compiled.pop(path)
+    except KeyError:
+        query = NPath(path)
+        if len(_compiled) >= NPATH_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    _compiled[path] = query
+    return query
+
+
+def npath(node, path, index=None):
+    """
+    XPath inspired utility to find a specific node or attribute within
+    an AST.
+    
+    The path is an expression that is applied to the given node.
     
+    Attribute access and indexing in case of lists works like in Python:
     
-    return npath(nxt, path[pos:])
+     * `.name`
+     * `[42]`
+     
+    It is also possible to filter for a specific expression or statement:
+     
+     * `[=]`
+     * `[+]`
+     * ...
+     
+     If there is only one node that matches, the result is a node, otherwise
+     a list of nodes.
+     
+     A single `*` returns all nodes reachable from the current node in
+     depth-first order.
+     
+     The path may also be an `NPath` returned by `compile_npath`.
+     
+     `.**{Type}` is answered from `index` if a `TypeIndex` of the tree is 
+     given. This is only correct if the tree has not changed since the
+     index was built.
+    """
+    if isinstance(path, NPath):
+        return path(node, index)
+    return compile_npath(path)(node, index)
         
 
 def version(supported_versions, version=sys.version_info):
@@ -216,6 +440,39 @@ def version(supported_versions, version=sys.version_info):
             return None
         
     return wrapper_factory
+
+
+class FilesTestCase(unittest.TestCase):
+    """
+    Test case with a temporary directory (`self.directory`) that is removed
+    after each test.
+    
+    Use for testing only.
+    """
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        shutil.rmtree(self.directory)
         
+    def write(self, filename, source, mtime=None):
+        """
+        Writes a file, given its `/`-separated path within the directory, and
+        returns its path. Missing directories are created.
         
-    
\ No newline at end of file
+        The modification time is set to `mtime` if given. Otherwise it is 
+        moved forward by the length of the source, so that a change is seen
+        even if the clock did not move since the last write.
+        """
+        path = os.path.join(self.directory, *filename.split("/"))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(source)
+        if mtime is None:
+            stat = os.stat(path)
+            os.utime(path, (stat.st_atime, stat.st_mtime + len(source)))
+        else:
+            os.utime(path, (mtime, mtime))
+        return path
@@ -17,6 +17,9 @@ setup(
     author='Stefan C. Mueller',
     author_email='stefan.mueller@fhnw.ch',
     url='https://github.com/smurn/lenatu',
-    packages = find_packages(),
+    packages = find_packages(exclude=['benchmarks', 'benchmarks.*']),
     install_requires = [],
+    entry_points = {
+        'console_scripts': ['lenatu = lenatu._cli:main'],
+    },
 )
\ No newline at end of file